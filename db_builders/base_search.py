@@ -1,11 +1,14 @@
+import asyncio
 import os
 import warnings
-from asyncio import sleep
-from typing import ClassVar
+from typing import AsyncIterator, ClassVar, Optional
 
-import aiohttp
 from dotenv import load_dotenv
 
+from db_builders.cache import SearchCache, SEARCH_CACHE
+from db_builders.rate_limit import CSE_LIMITER
+from db_builders.retry import RetryPolicy, RetryableHTTPError, SEARCH_RETRY_POLICY, parse_retry_after
+from db_builders.session import SESSION_POOL
 from db_builders.typedefs import SearchResultItem
 
 load_dotenv()
@@ -25,78 +28,140 @@ class BaseSearchHandler:
     """ Base class for search handlers.
 
     This class contains a method for performing a search using the Google custom search API.
+
+    All handlers share the connection pool in `db_builders.session.SESSION_POOL`. Result pages are cached on disk in
+    `cache`, which may be set to `None` to always query the API.
     """
     HEADERS: ClassVar[dict] = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
                                              'AppleWebKit/537.36 (KHTML, like Gecko) '
                                              'Chrome/120.0.0.0 Safari/537.36'
                                }
-    retry_count: int
-    MAX_RETRY_COUNT: ClassVar[int] = 5
+    MAX_CONCURRENT_PAGES: ClassVar[int] = 5
+    cache: ClassVar[Optional[SearchCache]] = SEARCH_CACHE
+    retry_policy: ClassVar[RetryPolicy] = SEARCH_RETRY_POLICY
 
-    def __init__(self):
-        self.retry_count = 0
+    async def _request_page(self, url: str) -> list[SearchResultItem]:
+        """ Make a single request to the Google custom search API.
 
-    async def perform_search(self, query: str, num_results: int = 100) -> list[SearchResultItem]:
-        """ Perform a search using the Google custom search API
+        Raises:
+            RetryableHTTPError: If a 429 or 5XX status code is returned.
+            RuntimeError: If any other unexpected status code is returned.
+        """
+        await CSE_LIMITER.acquire()
+        async with SESSION_POOL.get().get(url, headers=self.HEADERS) as resp:
+            if 500 <= resp.status < 600 or resp.status == 429:
+                raise RetryableHTTPError(resp.status, parse_retry_after(resp.headers))
+            if resp.status != 200:
+                print(await resp.text())
+                raise RuntimeError(f"Got status code {resp.status} from Google API.")
 
-        # Status code handlers:
-        - If the status code is 4XX or 5XX, the search will be retried up to 3 times.
-        - If the status code is not 200, 4XX, or 5XX, the status code will be printed and the search will be skipped.
+            data = await resp.json()
+
+        results = []
+        try:
+            for item in data['items']:
+                results.append(
+                    SearchResultItem(
+                        title=item['title'],
+                        link=item['link'],
+                        snippet=item['snippet']
+                    ))
+        except KeyError:
+            # no results
+            pass
+        return results
+
+    async def _fetch_page(self, query: str, start: int, num: Optional[int] = None) -> list[SearchResultItem]:
+        """ Fetch a single page of results from the Google custom search API.
+
+        Transient errors are retried according to `retry_policy`.
 
         Parameters:
             `query`: The query string which will be used to search.
-            `num_results`: The number of results to return. Defaults to 100.
+            `start`: The 1-based index of the first result on the page.
+            `num`: The number of results on the page. If `None`, the API default of 10 is used.
 
         Returns:
-            A list of `SearchResultItem` objects.
-
-            However, if an error occurs and cannot be resolved, an empty list will be returned. Errors include
-            4XX or 5XX status codes (after a retry limit has been hit), or if the response does not contain the expected
-            data.
+            A list of `SearchResultItem` objects. An empty list is returned if the page contains no results.
         """
-        results = []
+        if self.cache is not None:
+            cached = self.cache.get_page(query, start, num)
+            if cached is not None:
+                return cached
+
+        # doc: https://developers.google.com/custom-search/v1/using_rest
+        url = f"{BASE_URL}?key={API_KEY}&cx={SEARCH_ENGINE_ID}&q={query}&start={start}"
+        if num is not None:
+            url += f"&num={num}"
+
+        results = await self.retry_policy.call(self._request_page, url)
+        if self.cache is not None:
+            self.cache.set_page(query, start, num, results)
+        return results
+
+    async def stream_search(self, query: str, num_results: int = 100) -> AsyncIterator[SearchResultItem]:
+        """ Perform a search, yielding results in rank order as soon as their page has been fetched.
 
+        Pages are fetched concurrently, with at most `MAX_CONCURRENT_PAGES` requests in flight. Once a page returns
+        no results, no further pages are requested. See `perform_search` for how errors are handled.
+
+        Parameters:
+            `query`: The query string which will be used to search.
+            `num_results`: The number of results to return. Defaults to 100.
+        """
         # if `num_results` is less than 10, force one page
         if num_results > 10:
             pages = num_results // 10
+            num = None
         else:
             pages = 1
+            num = num_results if num_results < 10 else None
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_PAGES)
+        # index of the first page known to be empty. Pages at or past this index are not requested.
+        end = pages
+
+        async def fetch(page: int) -> list[SearchResultItem]:
+            nonlocal end
+            async with semaphore:
+                if page >= end:
+                    return []
+                items = await self._fetch_page(query, page * 10 + 1, num)
+            if not items:
+                end = min(end, page)
+            return items
+
+        tasks = [asyncio.create_task(fetch(page)) for page in range(pages)]
+        try:
+            for page, task in enumerate(tasks):
+                items = await task
+                if page >= end:
+                    break
+                for item in items:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-        async with aiohttp.ClientSession(headers=self.HEADERS) as session:
-            for page in range(pages):
-                start = page * 10 + 1
-                # doc: https://developers.google.com/custom-search/v1/using_rest
-                url = f"{BASE_URL}?key={API_KEY}&cx={SEARCH_ENGINE_ID}&q={query}&start={start}"
-
-                if num_results < 10:
-                    url += f"&num={num_results}"
-
-                async with session.get(url, verify_ssl=False) as resp:
-                    # repeat search if 429 or 5XX error is returned
-                    if 500 <= resp.status < 600 or resp.status == 429:
-                        if self.retry_count >= self.MAX_RETRY_COUNT:
-                            print(await resp.text())
-                            raise RuntimeError(f"Got status code {resp.status} from Google API. "
-                                               f"Retried {self.retry_count} times. Skipping...")
-                        self.retry_count += 1
-                        await sleep(15)
-                        await self.perform_search(query, num_results)
-                    if resp.status != 200:
-                        raise RuntimeError(f"Got status code {resp.status} from Google API.")
-
-                    self.retry_count = 0
-
-                    data = await resp.json()
-                    try:
-                        items = data['items']
-                        for item in items:
-                            results.append(
-                                SearchResultItem(
-                                    title=item['title'],
-                                    link=item['link'],
-                                    snippet=item['snippet']
-                                ))
-                    except KeyError:
-                        # no results
-                        pass
-        return results
+    async def perform_search(self, query: str, num_results: int = 100) -> list[SearchResultItem]:
+        """ Perform a search using the Google custom search API
+
+        Pages are fetched concurrently, with at most `MAX_CONCURRENT_PAGES` requests in flight. Once a page returns
+        no results, no further pages are requested.
+
+        # Status code handlers:
+        - If the status code is 429 or 5XX, the page will be retried according to `retry_policy`. Once the retries
+          are exhausted, `RetryableHTTPError` is raised.
+        - If any other status code is returned, a `RuntimeError` is raised.
+
+        Parameters:
+            `query`: The query string which will be used to search.
+            `num_results`: The number of results to return. Defaults to 100.
+
+        Returns:
+            A list of `SearchResultItem` objects in rank order.
+
+            However, if the response does not contain the expected data, an empty list will be returned.
+        """
+        return [item async for item in self.stream_search(query, num_results)]
@@ -0,0 +1,6 @@
+""" Persistent caches used to avoid paying for the same API call twice. """
+from .base import SQLiteCache, CACHE_DIR
+from .search import SearchCache, SEARCH_CACHE
+from .llm import LLMResponseCache, LLM_CACHE
+from .domain_index import DomainIndex, DOMAIN_INDEX
+from .values import ParameterValueIndex, VALUE_INDEX, normalize_parameter
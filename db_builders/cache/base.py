@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+CACHE_DIR = Path('data/cache')
+
+
+class SQLiteCache:
+    """ Persistent key-value store backed by a single SQLite table.
+
+    Entries expire after `ttl` seconds and the least recently used entries are evicted once more than `max_entries`
+    are stored. Hits and misses are counted for reporting.
+
+    The connection is opened lazily so that simply importing a module which defines a cache does not touch the disk.
+    Access is serialized with a lock, so a single cache may be shared between threads (LangChain may perform cache
+    lookups in an executor).
+    """
+    EVICT_INTERVAL: int = 100
+
+    path: Path
+    ttl: Optional[float]
+    max_entries: Optional[int]
+    hits: int
+    misses: int
+
+    def __init__(self, path: Path, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """ Create a cache.
+
+        Parameters:
+            path: Path of the SQLite database file. Parent directories are created when the cache is first used.
+            ttl: Number of seconds an entry is valid for. If `None`, entries never expire.
+            max_entries: Maximum number of entries to keep. If `None`, the cache is unbounded.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                         "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._conn = conn
+        return self._conn
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """ Get a value from the cache.
+
+        Parameters:
+            key: Key of the entry.
+
+        Returns:
+            The stored value, or `None` if there is no valid entry.
+        """
+        value = self.peek(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return value
+
+    def peek(self, key: str) -> Optional[str]:
+        """ Get a value without counting a hit or miss, or marking the entry as recently used. """
+        with self._lock:
+            conn = self._connection
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._is_expired(row[1], time.time()):
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """ Store a value, replacing any existing entry.
+
+        Parameters:
+            key: Key of the entry.
+            value: Value to store.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO entries (key, value, created, accessed) "
+                                     "VALUES (?, ?, ?, ?)", (key, value, now, now))
+            self._writes += 1
+            evict = self._writes % self.EVICT_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        """ Remove a single entry. """
+        with self._lock:
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """ Remove every entry. """
+        with self._lock:
+            self._connection.execute("DELETE FROM entries")
+
+    def evict(self) -> int:
+        """ Remove expired entries, then the least recently used entries over `max_entries`.
+
+        This is called automatically every `EVICT_INTERVAL` writes.
+
+        Returns:
+            The number of entries removed.
+        """
+        removed = 0
+        with self._lock:
+            conn = self._connection
+            if self.ttl is not None:
+                removed += conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            if self.max_entries is not None:
+                removed += conn.execute("DELETE FROM entries WHERE key IN ("
+                                        "SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                                        (self.max_entries,)).rowcount
+        return removed
+
+    def __bool__(self) -> bool:
+        # an empty cache is still a cache (LangChain checks the global cache for truthiness)
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of lookups which were served from the cache. """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> str:
+        """ Human-readable summary of cache usage. """
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate)"
+
+    def close(self) -> None:
+        """ Close the underlying connection. It is reopened if the cache is used again. """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
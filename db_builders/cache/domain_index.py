@@ -0,0 +1,55 @@
+import os
+import time
+from typing import Optional
+
+from db_builders.typedefs import DomainVerdict
+from .base import SQLiteCache, CACHE_DIR
+
+
+class DomainIndex(SQLiteCache):
+    """ Persistent index of manufacturer verification verdicts, keyed by domain.
+
+    Domains are keyed by the output of `normalize_domain` (ie: "example.com"). The index records the
+    `SiteChecker` verdict, the name found by `NameExtractor` and the `SiteDoubleChecker` verdict, so that domains which
+    have already been checked in a previous omniclass or run do not cost any more API calls. Verdicts expire after
+    `ttl` seconds and may be removed with `invalidate`.
+    """
+
+    def lookup(self, domain: str) -> Optional[DomainVerdict]:
+        """ Get the recorded verdict for a domain.
+
+        Returns:
+            The verdict, or `None` if the domain has not been checked or the verdict has expired.
+        """
+        value = self.get(domain)
+        if value is None:
+            return None
+        return DomainVerdict.model_validate_json(value)
+
+    def record(self, domain: str, **fields) -> DomainVerdict:
+        """ Record the results of a verification stage for a domain.
+
+        Fields which are not given keep their previously recorded value.
+
+        Parameters:
+            domain: The domain to record results for.
+            fields: Any of `is_manufacturer`, `company_name`, `verified` and `confidence`.
+
+        Returns:
+            The updated verdict.
+        """
+        value = self.peek(domain)
+        verdict = DomainVerdict.model_validate_json(value) if value else DomainVerdict(domain=domain)
+        verdict = verdict.model_copy(update={**fields, 'updated': time.time()})
+        self.set(domain, verdict.model_dump_json())
+        return verdict
+
+    def invalidate(self, domain: str) -> None:
+        """ Forget everything recorded for a domain so that it is checked again. """
+        self.delete(domain)
+
+
+DOMAIN_INDEX = DomainIndex(
+    CACHE_DIR.joinpath('domains.sqlite3'),
+    ttl=float(os.getenv('DOMAIN_INDEX_TTL', 90 * 24 * 60 * 60)),
+)
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+from .base import SQLiteCache, CACHE_DIR
+
+_REFRESH: ContextVar[bool] = ContextVar('_REFRESH', default=False)
+
+
+class LLMResponseCache(SQLiteCache, BaseCache):
+    """ On-disk LangChain cache for chat model responses.
+
+    Entries are content-addressed by a hash of the LLM string (which contains the model name, temperature and other
+    parameters) and the fully rendered prompt. This is installed as the global LangChain cache in `db_builders.llm`,
+    so it is shared by every chain built from those models. Models created with `cache=False` bypass it.
+    """
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode()).hexdigest()
+
+    @contextmanager
+    def refresh(self) -> Iterator[None]:
+        """ Ignore cached responses within this context, while still storing new ones.
+
+        This is used when a cached response has been rejected (ie: the list did not contain 20 values) and
+        retrying would otherwise return the same response forever.
+        """
+        token = _REFRESH.set(True)
+        try:
+            yield
+        finally:
+            _REFRESH.reset(token)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if _REFRESH.get():
+            return None
+        value = self.get(self.make_key(prompt, llm_string))
+        if value is None:
+            return None
+        return [loads(generation) for generation in json.loads(value)]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.set(self.make_key(prompt, llm_string), json.dumps([dumps(generation) for generation in return_val]))
+
+    def clear(self, **kwargs: Any) -> None:
+        super().clear()
+
+    # lookups are cheap, so avoid the executor used by `BaseCache`. This also keeps `refresh()` in effect.
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.update(prompt, llm_string, return_val)
+
+
+LLM_CACHE = LLMResponseCache(
+    CACHE_DIR.joinpath('llm.sqlite3'),
+    ttl=None,
+    max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', 200_000)),
+)
@@ -0,0 +1,49 @@
+import json
+import os
+from typing import Optional
+
+from db_builders.typedefs import SearchResultItem
+from .base import SQLiteCache, CACHE_DIR
+
+
+class SearchCache(SQLiteCache):
+    """ Cache of Google custom search API result pages.
+
+    Pages are keyed by the normalized query, the start offset and the number of results so that identical queries
+    across runs never hit the API twice. Empty pages are cached as well, which lets pagination stop early.
+    """
+
+    @staticmethod
+    def make_key(query: str, start: int, num: Optional[int] = None) -> str:
+        """ Build the cache key for a page of results.
+
+        The query is case-folded and whitespace is collapsed.
+
+        Examples:
+            >>> SearchCache.make_key('  Acme   Manufacturers ', 11)
+            'acme manufacturers|11|10'
+        """
+        normalized = ' '.join(query.casefold().split())
+        return f"{normalized}|{start}|{num or 10}"
+
+    def get_page(self, query: str, start: int, num: Optional[int] = None) -> Optional[list[SearchResultItem]]:
+        """ Get a cached page of results.
+
+        Returns:
+            The list of results, or `None` if the page is not cached.
+        """
+        value = self.get(self.make_key(query, start, num))
+        if value is None:
+            return None
+        return [SearchResultItem(**item) for item in json.loads(value)]
+
+    def set_page(self, query: str, start: int, num: Optional[int], items: list[SearchResultItem]) -> None:
+        """ Store a page of results. """
+        self.set(self.make_key(query, start, num), json.dumps([item.model_dump() for item in items]))
+
+
+SEARCH_CACHE = SearchCache(
+    CACHE_DIR.joinpath('search.sqlite3'),
+    ttl=float(os.getenv('SEARCH_CACHE_TTL', 30 * 24 * 60 * 60)),
+    max_entries=int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 100_000)),
+)
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+from typing import Optional
+
+from db_builders.typedefs import Parameter
+from .base import SQLiteCache, CACHE_DIR
+
+# parameter names which are used interchangeably. Keys and values are normalized names.
+PARAMETER_SYNONYMS = {
+    'colour': 'color',
+    'color finish': 'finish',
+    'surface finish': 'finish',
+    'finish type': 'finish',
+    'material type': 'material',
+    'construction material': 'material',
+    'fire resistance': 'fire rating',
+    'fire resistance rating': 'fire rating',
+    'fire rated': 'fire rating',
+    'dimension': 'size',
+    'overall dimension': 'size',
+    'thickness dimension': 'thickness',
+    'mass': 'weight',
+    'manufacturer name': 'manufacturer',
+    'brand name': 'brand',
+}
+
+# words ending in "s" which are not plural
+_SINGULAR_ENDINGS = ('ss', 'us', 'is', 'ics')
+
+
+def _singular(word: str) -> str:
+    """ Naively remove the plural from a word.
+
+    Examples:
+        >>> [_singular(word) for word in ['finishes', 'properties', 'dimensions', 'glass', 'acoustics']]
+        ['finish', 'property', 'dimension', 'glass', 'acoustics']
+    """
+    if len(word) <= 3 or not word.endswith('s') or word.endswith(_SINGULAR_ENDINGS):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'xes', 'sses')):
+        return word[:-2]
+    return word[:-1]
+
+
+def normalize_parameter(name: str) -> str:
+    """ Normalize a parameter name so that the same parameter generated for different omniclasses compares equal.
+
+    The name is casefolded, units in parentheses and punctuation are removed, each word is made singular, and
+    synonyms are replaced according to `PARAMETER_SYNONYMS`.
+
+    Examples:
+        >>> normalize_parameter('Colour')
+        'color'
+        >>> normalize_parameter('Fire-Resistance Rating (hours)')
+        'fire rating'
+        >>> normalize_parameter('Surface Finishes')
+        'finish'
+    """
+    name = re.sub(r'\(.*?\)', ' ', name.casefold())
+    words = [_singular(word) for word in re.split(r'[^\w]+', name) if word]
+    normalized = ' '.join(words)
+    return PARAMETER_SYNONYMS.get(normalized, normalized)
+
+
+class ParameterValueIndex(SQLiteCache):
+    """ Persistent index of generated parameter values, keyed by scope and normalized parameter name.
+
+    Generic parameters (ie: "Material" or "Color") are generated for many omniclasses. Values recorded for one
+    omniclass are reused for another omniclass in the same scope, where a scope is a group of similar omniclasses
+    (see `db_builders.omniclass.hierarchy.value_scope`). Only the first values recorded for a parameter are kept, so
+    reused values do not drift as they are adapted for other omniclasses.
+    """
+
+    @staticmethod
+    def make_key(scope: str, parameter: str) -> str:
+        return f"{scope}|{normalize_parameter(parameter)}"
+
+    def lookup(self, scope: str, parameter: str) -> Optional[list[str]]:
+        """ Get the values recorded for a parameter.
+
+        Returns:
+            The values, or `None` if no values have been recorded for the parameter in `scope`.
+        """
+        value = self.get(self.make_key(scope, parameter))
+        if value is None:
+            return None
+        return json.loads(value)['values']
+
+    def record(self, scope: str, parameter: Parameter, product: str = '') -> None:
+        """ Record the values generated for a parameter, unless values have already been recorded for it.
+
+        Parameters:
+            scope: The scope of the omniclass which the values were generated for.
+            parameter: The generated parameter.
+            product: The product which the values were generated for, which is kept for reference.
+        """
+        key = self.make_key(scope, parameter.name)
+        if self.peek(key) is None:
+            self.set(key, json.dumps({'name': parameter.name, 'product': product, 'values': parameter.values}))
+
+
+VALUE_INDEX = ParameterValueIndex(
+    CACHE_DIR.joinpath('values.sqlite3'),
+    max_entries=int(os.getenv('VALUE_INDEX_MAX_ENTRIES', 100_000)),
+)
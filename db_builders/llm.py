@@ -1,7 +1,34 @@
+from typing import Any, List, Optional
+
 from dotenv import load_dotenv
 from langchain_community.chat_models import ChatOpenAI
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from db_builders.cache import LLM_CACHE
+from db_builders.rate_limit import OPENAI_LIMITER, estimate_tokens
 
 load_dotenv()
 
-GPT3_LOW_T = ChatOpenAI(model_name='gpt-3.5-turbo', temperature=0.3)
-GPT3_HIGH_T = ChatOpenAI(model_name='gpt-3.5-turbo', temperature=0.9)
+# every chain built from these models shares the on-disk response cache
+set_llm_cache(LLM_CACHE)
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """ `ChatOpenAI` which acquires from `OPENAI_LIMITER` before sending each request.
+
+    Responses served from the cache never reach `_agenerate`, so they are not throttled.
+    """
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        prompt = "".join(str(message.content) for message in messages)
+        await OPENAI_LIMITER.acquire(estimate_tokens(prompt, self.max_tokens or 500))
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+GPT3_LOW_T = RateLimitedChatOpenAI(model_name='gpt-3.5-turbo', temperature=0.3)
+# high temperature responses are meant to vary between calls, so they are never cached
+GPT3_HIGH_T = RateLimitedChatOpenAI(model_name='gpt-3.5-turbo', temperature=0.9, cache=False)
@@ -1,4 +1,5 @@
 import csv
+import os
 from pathlib import Path
 
 from db_builders.typedefs import Omniclass
@@ -34,6 +35,8 @@ def parse_remaining(path: Path) -> list[Omniclass]:
 def _load_completed(path: Path) -> set[str]:
     """ Load the set of completed omniclasses from the given file.
 
+    A missing file means that nothing has been completed yet.
+
     Parameters
     ----------
     path : Path
@@ -42,17 +45,19 @@ def _load_completed(path: Path) -> set[str]:
     Returns
     -------
     set[str]
-        The set of completed products.
+        The set of completed product identifiers.
     """
     if not path.is_file():
-        raise FileNotFoundError(f"Could not find file: {path}")
+        return set()
 
     completed = set()
     with open(path, 'r') as f:
         reader = csv.reader(f)
 
         for row in reader:
-            completed.add(row[0])
+            # a partially written last row is left behind if the process is killed mid-write
+            if row and row[0]:
+                completed.add(row[0])
 
     return completed
 
@@ -60,28 +65,30 @@ def _load_completed(path: Path) -> set[str]:
 def add_to_completed(path: Path, product_name: str) -> None:
     """ Add a product to the completed set to track which omniclasses have been generated.
 
-    This is called once a CSV file has been generated for a product.
+    This is called once a CSV file has been generated for a product. The row is flushed to disk before returning, so
+    the product is not regenerated if the process is interrupted afterwards. The file is created if it does not exist.
 
     Parameters
     ----------
     path : Path
         The path to the file containing the completed products.
     product_name : str
-        The name of the product to add.
+        The identifier of the product to add.
 
     Returns
     -------
     None
     """
-    if not path.is_file():
-        raise FileNotFoundError(f"Could not find file: {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
 
     with open(path, 'a') as f:
         writer = csv.writer(f)
         writer.writerow([product_name])
+        f.flush()
+        os.fsync(f.fileno())
 
 
-def _extract_remaining(completed: set[str], all_products: list[str]) -> list[str]:
+def _extract_remaining(completed: set[str], all_products: list[Omniclass]) -> list[Omniclass]:
     """ Extract the remaining omniclasses from the set of completed omniclasses.
 
     This is called at the beginning of runtime to get a list of omniclasses that still need to be generated.
@@ -89,19 +96,19 @@ def _extract_remaining(completed: set[str], all_products: list[str]) -> list[str
     Parameters
     ----------
     completed : set[str]
-        The set of completed products.
-    all_products : list[str]
+        The set of completed product identifiers.
+    all_products : list[Omniclass]
         The list of all products.
 
     Returns
     -------
-    list[str]
-        The list of remaining products.
+    list[Omniclass]
+        The list of remaining products, in their original order.
     """
-    return [p for p in all_products if p not in completed]
+    return [p for p in all_products if p.identifier not in completed]
 
 
-def get_remaining(remaining_path: Path, completed_path: Path) -> list[str]:
+def get_remaining(remaining_path: Path, completed_path: Path) -> list[Omniclass]:
     """ Get the list of remaining omniclasses.
 
     This function is exposed and expected to be called by the main script.
@@ -115,7 +122,7 @@ def get_remaining(remaining_path: Path, completed_path: Path) -> list[str]:
 
     Returns
     -------
-    list[str]
+    list[Omniclass]
         The list of remaining omniclasses.
     """
     remaining = parse_remaining(remaining_path)
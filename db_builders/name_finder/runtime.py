@@ -1,27 +1,19 @@
 import asyncio
-import csv
 from pathlib import Path
 from typing import Tuple
 
 from db_builders.llm import GPT3_LOW_T
 from db_builders.name_finder.product_page_finder import ProductPageFinder
 from db_builders.name_finder.website_finder import WebsiteFinder
+from db_builders.cache import LLM_CACHE, SEARCH_CACHE
+from db_builders.retry import FATAL_RUN_ERRORS
+from db_builders.session import SESSION_POOL
+from db_builders.storage import AppendOnlyCsvWriter, RESULT_STORE
 from db_builders.utils import strip_url, print_bar
 
 MANUFACTURER_NAME_FILE = 'manufacturer_names.csv'
 MANUFACTURER_URLS_SAVE_PATH = Path('data/manufacturer_product_pages.csv')
-
-
-def _save_manufacturer_urls(urls: dict[str, Tuple[str, str]], save_path: Path):
-    """ Save the manufacturer URLs to a CSV file.
-    """
-    with open(save_path, 'w') as f:
-        writer = csv.writer(f)
-        writer.writerow(['manufacturer name', 'url', 'product page'])
-
-        for name, urls in urls.items():
-            url, product_page = urls
-            writer.writerow([name, url, product_page])
+URL_CSV_HEADER = ['manufacturer name', 'url', 'product page']
 
 
 async def _find_manufacturer_urls(manufacturer_name: str) -> Tuple[str, str]:
@@ -51,34 +43,76 @@ async def _perform_manufacture_url_search(file_path: str) -> dict[str, Tuple[str
     """
 
 
-async def product_page_search_runtime(names: list[str]):
+async def product_page_search_runtime(names: list[str], resume: bool = True):
     """ Perform the search for manufacturer product pages and save to disk.
 
-    Results are incrementally saved to disk after each batch of names is processed.
+    Only the new results are appended to disk after each batch of names is processed. The file is compacted once the
+    run stops. If `RESULT_STORE` is enabled, each batch is saved there instead.
 
     Parameters:
         names: List of manufacturer names to search for
+        resume: If `True`, names which have already been saved by a previous run are skipped. Otherwise, the saved
+            results are discarded and every name is searched again.
     """
     batch = 10
 
-    # find manufacturer websites
-    urls = {}
-    for i in range(0, len(names), batch):
-
-        if i + batch > len(names):
-            last = len(names) - i
+    writer = AppendOnlyCsvWriter(MANUFACTURER_URLS_SAVE_PATH, URL_CSV_HEADER)
+    if resume:
+        if RESULT_STORE is not None:
+            completed = RESULT_STORE.product_page_names()
         else:
-            last = i + batch
-        print(f"Processing batch {i + 1} - {last} of {len(names)} manufacturer names")
-
-        names_batch = names[i:i + batch]
-        tasks = [_find_manufacturer_urls(name) for name in names_batch]
-        results = await asyncio.gather(*tasks)
+            completed = {row[0] for row in writer.read_rows()}
+        remaining = [name for name in names if name not in completed]
+        print(f"Skipping {len(names) - len(remaining)} manufacturer names which have already been processed.")
+        names = remaining
+    elif RESULT_STORE is not None:
+        RESULT_STORE.clear_product_pages()
+    else:
+        writer.clear()
 
-        urls.update({name: result for name, result in zip(names_batch, results)})
-
-        _save_manufacturer_urls(urls, MANUFACTURER_URLS_SAVE_PATH)
+    # find manufacturer websites
+    processed = 0
+    try:
+        for i in range(0, len(names), batch):
+
+            if i + batch > len(names):
+                last = len(names) - i
+            else:
+                last = i + batch
+            print(f"Processing batch {i + 1} - {last} of {len(names)} manufacturer names")
+
+            names_batch = names[i:i + batch]
+            tasks = [_find_manufacturer_urls(name) for name in names_batch]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+            rows = []
+            fatal = None
+            for name, result in zip(names_batch, results):
+                if isinstance(result, FATAL_RUN_ERRORS):
+                    fatal = fatal or result
+                elif isinstance(result, Exception):
+                    # failed names are not saved so that they are retried on the next run
+                    print(f"  - Skipping {name}: {result}")
+                else:
+                    url, product_page = result
+                    rows.append([name, url, product_page])
+
+            # only the new rows are appended. The rest of the batch is saved before stopping so that it is not
+            # searched again.
+            if RESULT_STORE is not None:
+                RESULT_STORE.save_product_pages(rows)
+            else:
+                writer.write_rows(rows)
+            processed += len(rows)
+            if fatal is not None:
+                raise fatal
+    finally:
+        if RESULT_STORE is None:
+            writer.compact()
+        await SESSION_POOL.close()
 
     print_bar("== Finished ==")
 
-    print(f"Processed {len(urls)} manufacturer names")
+    print(f"Processed {processed} manufacturer names")
+    print(f"Search cache: {SEARCH_CACHE.stats()}")
+    print(f"LLM cache: {LLM_CACHE.stats()}")
@@ -1,60 +1,258 @@
 import asyncio
 import csv
-from asyncio import sleep
+import json
+import os
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Coroutine, Any
+from typing import List, Coroutine, Any, Callable, Optional
 
 from langchain_core.messages import AIMessage
-from openai import RateLimitError
 from pydantic_core import ValidationError
 
-from .chains import (build_parameter_chain, build_parameter_value_chain, extract_list_from_response,
-                     build_formatter_chain)
-from db_builders.typedefs import Omniclass, Parameter
+from .chains import (build_parameter_chain, build_structured_value_chain, build_value_batch_chain,
+                     build_parameter_top_up_chain, build_value_top_up_chain, build_value_batch_top_up_chain,
+                     extract_list_from_response, build_formatter_chain, parse_parameter_list, parse_parameter_values,
+                     parse_parameter_batch)
+from db_builders.cache import LLM_CACHE, VALUE_INDEX
+from db_builders.typedefs import Omniclass, Parameter, ParameterList
 from db_builders.llm import GPT3_LOW_T, GPT3_HIGH_T
+from db_builders.scheduling import PrioritySemaphore
+from db_builders.utils import retry_on_ratelimit
 
 PARAMETER_CHAIN = build_parameter_chain(GPT3_HIGH_T)
-VALUE_CHAIN = build_parameter_value_chain(GPT3_LOW_T, GPT3_LOW_T)
+PARAMETER_TOP_UP_CHAIN = build_parameter_top_up_chain(GPT3_LOW_T)
+VALUE_CHAIN = build_structured_value_chain(GPT3_LOW_T)
+VALUE_TOP_UP_CHAIN = build_value_top_up_chain(GPT3_LOW_T)
+VALUE_BATCH_CHAIN = build_value_batch_chain(GPT3_LOW_T)
+VALUE_BATCH_TOP_UP_CHAIN = build_value_batch_top_up_chain(GPT3_LOW_T)
+# only used when a structured response could not be parsed
 FORMATTER_CHAIN = build_formatter_chain(GPT3_LOW_T)
 
+# number of parameters generated for each omniclass, and number of values generated for each parameter
+PARAMETER_COUNT = 20
+VALUE_COUNT = 20
 
+# number of requests made for a single list before giving up. When a response is short, the following requests only
+# ask for the missing items. API errors are retried separately by `retry_on_ratelimit`.
+MAX_GENERATION_ATTEMPTS = int(os.getenv('MAX_GENERATION_ATTEMPTS', 5))
+
+# lists which are still short after `MAX_GENERATION_ATTEMPTS` are accepted if they have at least this many items.
+# By default, only complete lists are accepted.
+MIN_ACCEPTED_PARAMETERS = int(os.getenv('MIN_ACCEPTED_PARAMETERS', PARAMETER_COUNT))
+MIN_ACCEPTED_VALUES = int(os.getenv('MIN_ACCEPTED_VALUES', VALUE_COUNT))
+
+
+# limits the number of value requests in flight across every omniclass. Requests with a lower priority value (ie:
+# for omniclasses which were started earlier) are served first, so tables are finished before new ones are started.
+VALUE_SLOTS = PrioritySemaphore(int(os.getenv('VALUE_CONCURRENCY', 20)))
+
+# number of parameters whose values are generated in a single request. `1` sends a request per parameter.
+VALUE_BATCH_SIZE = int(os.getenv('VALUE_BATCH_SIZE', 5))
+
+# how values recorded in `VALUE_INDEX` for another omniclass are used: 'reuse' uses them as-is, while 'adapt' keeps the
+# first `VALUE_SEED_COUNT` values and generates the rest for the product, with a request per `VALUE_BATCH_SIZE`
+# parameters
+VALUE_REUSE_POLICY = os.getenv('VALUE_REUSE_POLICY', 'reuse').lower()
+VALUE_SEED_COUNT = int(os.getenv('VALUE_SEED_COUNT', 15))
+
+
+class GenerationError(RuntimeError):
+    """ Raised when a usable response could not be generated within `MAX_GENERATION_ATTEMPTS` attempts. """
+
+
+def _name_key(name: str) -> str:
+    """ Normalize a name so that items which only differ in casing or whitespace compare equal. """
+    return " ".join(name.casefold().split())
+
+
+def _merge(existing: list[str], new: list, count: int) -> list[str]:
+    """ Add the items of `new` which are not already in `existing`, until there are `count` items.
+
+    Examples:
+        >>> _merge(['Oak', 'Pine'], ['pine', 'Maple', 'Ash'], 3)
+        ['Oak', 'Pine', 'Maple']
+    """
+    merged = list(existing)
+    seen = {_name_key(item) for item in merged}
+    for item in new:
+        if len(merged) >= count:
+            break
+        item = str(item).strip()
+        key = _name_key(item)
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+
+async def _format_list(content: str) -> list[str]:
+    """ Fall back to the formatter model to turn a response which could not be parsed into a list. """
+    formatted = await FORMATTER_CHAIN.ainvoke({"content": content})
+    return extract_list_from_response(formatted)
+
+
+@retry_on_ratelimit()
 async def _generate_parameters(product_name: str) -> (AIMessage, list[str]):
     llm_response = await PARAMETER_CHAIN.ainvoke({"omniclass": product_name})
-    formatted = await FORMATTER_CHAIN.ainvoke({"content": llm_response.content})
-    parameter_list = extract_list_from_response(formatted)
+    try:
+        parameter_list = parse_parameter_list(llm_response.content)
+    except ValidationError:
+        parameter_list = await _format_list(llm_response.content)
     return llm_response, parameter_list
 
 
-async def generate_parameters(product_name: str) -> (AIMessage, list[str]):
+@retry_on_ratelimit()
+async def _top_up_parameters(product_name: str, parameters: list[str], count: int) -> list[str]:
+    response = await PARAMETER_TOP_UP_CHAIN.ainvoke({
+        "omniclass": product_name,
+        "existing": json.dumps(parameters),
+        "count": count})
+    try:
+        return parse_parameter_list(response)
+    except ValidationError:
+        return await _format_list(response)
+
+
+async def generate_parameters(product_name: str, seed: Optional[list[str]] = None) -> (AIMessage, list[str]):
+    """ Generate `PARAMETER_COUNT` parameters for a product.
+
+    If a response is short, the parameters which were returned are kept and only the missing ones are requested.
+
+    Parameters:
+        product_name: The product to generate parameters for.
+        seed: Parameters to start the list with (ie: the parameters of a parent omniclass). Only the missing
+            parameters are requested, as if a previous response had been short.
+
+    Returns:
+        The message to use as context when generating values, and the parameters.
+
+    Raises:
+        GenerationError: If less than `MIN_ACCEPTED_PARAMETERS` parameters could be generated within
+            `MAX_GENERATION_ATTEMPTS` requests.
+    """
     feedback_msg = f"parameters for {product_name}"
-    while True:
+    ai_message = None
+    parameters = _merge([], seed or [], PARAMETER_COUNT)
+    if len(parameters) == PARAMETER_COUNT:
+        return AIMessage(content=ParameterList(parameters=parameters).model_dump_json()), parameters
+    topped_up = False
+    # once a response has been rejected, cached responses must be ignored or the same response would be returned
+    refresh = False
+    for _ in range(MAX_GENERATION_ATTEMPTS):
         try:
-            ai_message, parameters = await _generate_parameters(product_name)
-            if len(parameters) == 20:
-                return ai_message, parameters
-            else:
-                print(f"Got less than 20 {feedback_msg}, retrying...")
-        except RateLimitError:
-            await sleep(15)
+            with LLM_CACHE.refresh() if refresh else nullcontext():
+                if ai_message is None and not parameters:
+                    ai_message, new = await _generate_parameters(product_name)
+                else:
+                    new = await _top_up_parameters(product_name, parameters, PARAMETER_COUNT - len(parameters))
+                    topped_up = True
+            parameters = _merge(parameters, new, PARAMETER_COUNT)
+            if len(parameters) == PARAMETER_COUNT:
+                break
+            print(f"Got {len(parameters)} {feedback_msg}, requesting {PARAMETER_COUNT - len(parameters)} more...")
         except SyntaxError:
             print(f"Could not understand response when generating {feedback_msg}, retrying...")
+        refresh = True
+
+    if len(parameters) < MIN_ACCEPTED_PARAMETERS:
+        raise GenerationError(f"Could not generate {feedback_msg} after {MAX_GENERATION_ATTEMPTS} attempts")
+    if len(parameters) < PARAMETER_COUNT:
+        print(f"Accepting {len(parameters)} {feedback_msg}.")
+    if topped_up or ai_message is None:
+        # values are generated in the context of the parameter list, so it must contain every parameter. There is no
+        # message at all when a seeded list was accepted without any successful top-up.
+        ai_message = AIMessage(content=ParameterList(parameters=parameters).model_dump_json())
+    return ai_message, parameters
 
 
 def value_coroutines(product_name: str, ai_message: AIMessage,
-                     parameters: list[str]) -> list[Coroutine[Any, Any, Parameter]]:
+                     parameters: list[str], priority: int = 0) -> list[Coroutine[Any, Any, Parameter]]:
     """ Generate coroutines for generating all values for a given product.
 
     This is used in `generate_all_values` and in the backend to asynchronously load values.
     """
-    return [generate_values(product_name, ai_message, parameter) for parameter in parameters]
+    return [generate_values(product_name, ai_message, parameter, priority) for parameter in parameters]
 
 
-async def generate_all_values(product_name: str, parameters: list[str], ai_message: AIMessage) -> List[Parameter]:
+async def generate_all_values(product_name: str, parameters: list[str], ai_message: AIMessage,
+                              priority: int = 0,
+                              on_generated: Optional[Callable[[Parameter], None]] = None,
+                              batch_size: int = VALUE_BATCH_SIZE,
+                              value_scope: Optional[str] = None) -> List[Parameter]:
     """ Generate all values for a given product in a synchronous manner.
 
     This is to be used when locally generating a CSV file.
+
+    Values for up to `batch_size` parameters are generated with a single request (see `generate_value_batch`).
+
+    At most `VALUE_CONCURRENCY` value requests are in flight across all products. `priority` is used to decide which
+    product's requests are sent first; lower values are sent first.
+
+    `on_generated` is called with each `Parameter` as soon as its values have been generated, which is used to
+    checkpoint progress.
+
+    If `value_scope` is given, values which were recorded in `VALUE_INDEX` for a matching parameter of another product
+    in the same scope are used according to `VALUE_REUSE_POLICY`, and newly generated values are recorded.
     """
-    tasks = value_coroutines(product_name, ai_message, parameters)
+    if value_scope is None:
+        return await _generate_all_values(product_name, parameters, ai_message, priority, on_generated, batch_size)
+
+    if VALUE_REUSE_POLICY not in ('reuse', 'adapt'):
+        raise ValueError(f"Invalid value for `VALUE_REUSE_POLICY`: {VALUE_REUSE_POLICY}")
+
+    cached = {name: VALUE_INDEX.lookup(value_scope, name) for name in parameters}
+    generated: dict[str, Parameter] = {}
+
+    def record(parameter: Parameter) -> None:
+        VALUE_INDEX.record(value_scope, parameter, product_name)
+        if on_generated is not None:
+            on_generated(parameter)
+
+    reused = [name for name in cached if cached[name] is not None]
+    if reused:
+        print(f"Reusing values for {len(reused)} parameters for {product_name}: {', '.join(reused)}")
+    seeds = {}
+    for name in reused:
+        if VALUE_REUSE_POLICY == 'adapt' and len(cached[name][:VALUE_SEED_COUNT]) < VALUE_COUNT:
+            seeds[name] = cached[name][:VALUE_SEED_COUNT]
+        else:
+            generated[name] = Parameter(name=name, values=cached[name])
+            if on_generated is not None:
+                on_generated(generated[name])
+
+    async def generate_new() -> None:
+        new = [name for name in cached if cached[name] is None]
+        for parameter in await _generate_all_values(product_name, new, ai_message, priority, record, batch_size):
+            generated[parameter.name] = parameter
+
+    async def adapt(batch: list[str]) -> None:
+        for parameter in await generate_value_batch(product_name, ai_message, batch, priority, on_generated, seeds):
+            generated[parameter.name] = parameter
+
+    adapted = list(seeds)
+    size = max(batch_size, 1)
+    await asyncio.gather(generate_new(), *[adapt(adapted[i:i + size]) for i in range(0, len(adapted), size)])
+    return [generated[name] for name in parameters]
+
+
+async def _generate_all_values(product_name: str, parameters: list[str], ai_message: AIMessage, priority: int,
+                               on_generated: Optional[Callable[[Parameter], None]],
+                               batch_size: int) -> List[Parameter]:
+    if batch_size > 1:
+        batches = [parameters[i:i + batch_size] for i in range(0, len(parameters), batch_size)]
+        results = await asyncio.gather(*[generate_value_batch(product_name, ai_message, batch, priority, on_generated)
+                                         for batch in batches])
+        generated = {parameter.name: parameter for batch in results for parameter in batch}
+        return [generated[name] for name in parameters]
+
+    tasks = value_coroutines(product_name, ai_message, parameters, priority)
+
+    if on_generated is not None:
+        async def notify(task: Coroutine[Any, Any, Parameter]) -> Parameter:
+            parameter = await task
+            on_generated(parameter)
+            return parameter
+        tasks = [notify(task) for task in tasks]
 
     with_values = []
 
@@ -64,29 +262,161 @@ async def generate_all_values(product_name: str, parameters: list[str], ai_messa
     return with_values
 
 
+@retry_on_ratelimit()
+async def _generate_value_batch(product_name: str, parameters: list[str],
+                               ai_message: AIMessage) -> dict[str, list[str]]:
+    value_response = await VALUE_BATCH_CHAIN.ainvoke({
+        "parameters": ", ".join(parameters),
+        "ai_message": [ai_message],
+        "omniclass": product_name})
+    return parse_parameter_batch(value_response)
+
+
+@retry_on_ratelimit()
+async def _top_up_value_batch(product_name: str, existing: dict[str, list[str]], count: int,
+                              ai_message: AIMessage) -> dict[str, list[str]]:
+    value_response = await VALUE_BATCH_TOP_UP_CHAIN.ainvoke({
+        "existing": json.dumps(existing),
+        "count": count,
+        "ai_message": [ai_message],
+        "omniclass": product_name})
+    return parse_parameter_batch(value_response)
+
+
+async def generate_value_batch(product_name: str, ai_message: AIMessage, parameter_names: list[str],
+                               priority: int = 0,
+                               on_generated: Optional[Callable[[Parameter], None]] = None,
+                               seeds: Optional[dict[str, list[str]]] = None) -> List[Parameter]:
+    """ Generate values for several parameters with a single request.
+
+    Parameters which did not get `VALUE_COUNT` values keep the values which were returned, and the missing values are
+    requested for each of them separately (see `generate_values`).
+
+    If `seeds` is given, each parameter starts with its values in `seeds` (ie: values reused from another product) and
+    a single request asks for the missing values of every parameter.
+
+    Returns:
+        A `Parameter` for each of `parameter_names`, in the same order.
+    """
+    feedback_msg = f"parameters for {product_name}"
+    names = list(dict.fromkeys(parameter_names))
+    seeds = seeds or {}
+    try:
+        async with VALUE_SLOTS.slot(priority):
+            if seeds:
+                existing = {name: seeds.get(name, []) for name in names}
+                count = VALUE_COUNT - min(len(values) for values in existing.values())
+                response = await _top_up_value_batch(product_name, existing, count, ai_message)
+            else:
+                response = await _generate_value_batch(product_name, names, ai_message)
+    except ValidationError:
+        print(f"Could not understand response when generating values for {len(names)} {feedback_msg}, "
+              f"generating them separately...")
+        response = {}
+    returned = {_name_key(name): values for name, values in response.items()}
+
+    generated: dict[str, Parameter] = {}
+    partial: dict[str, list[str]] = {}
+    for name in names:
+        values = _merge(seeds.get(name, []), returned.get(_name_key(name), []), VALUE_COUNT)
+        if len(values) == VALUE_COUNT:
+            generated[name] = Parameter(name=name, values=values)
+            if on_generated is not None:
+                on_generated(generated[name])
+        else:
+            partial[name] = values
+
+    if partial:
+        print(f"Got less than {VALUE_COUNT} values for {len(partial)} {feedback_msg}, topping up: "
+              f"{', '.join(partial)}")
+
+    async def complete(name: str) -> None:
+        # the batch request counts as the first attempt
+        generated[name] = await _complete_values(product_name, ai_message, name, partial[name], priority,
+                                                 MAX_GENERATION_ATTEMPTS - 1)
+        if on_generated is not None:
+            on_generated(generated[name])
+
+    await asyncio.gather(*[complete(name) for name in partial])
+    return [generated[name] for name in parameter_names]
+
+
+@retry_on_ratelimit()
 async def _generate_values(product_name: str, parameter: str, ai_message: AIMessage) -> list[str]:
     value_response = await VALUE_CHAIN.ainvoke({
         "parameter": parameter,
         "ai_message": [ai_message],
         "omniclass": product_name})
-    return extract_list_from_response(value_response)
+    try:
+        return parse_parameter_values(value_response)
+    except ValidationError:
+        return await _format_list(value_response)
+
+
+@retry_on_ratelimit()
+async def _top_up_values(product_name: str, parameter: str, ai_message: AIMessage, values: list[str],
+                         count: int) -> list[str]:
+    value_response = await VALUE_TOP_UP_CHAIN.ainvoke({
+        "parameter": parameter,
+        "ai_message": [ai_message],
+        "omniclass": product_name,
+        "existing": json.dumps(values),
+        "count": count})
+    try:
+        return parse_parameter_values(value_response)
+    except ValidationError:
+        return await _format_list(value_response)
 
 
-async def generate_values(product_name: str, ai_message: AIMessage, parameter_name: str) -> Parameter:
+async def _complete_values(product_name: str, ai_message: AIMessage, parameter_name: str, values: list[str],
+                           priority: int, attempts: int) -> Parameter:
+    """ Generate the values which are missing from `values`, making at most `attempts` requests.
+
+    Raises:
+        GenerationError: If there are still less than `MIN_ACCEPTED_VALUES` values after the last attempt.
+    """
     feedback_msg = f"{parameter_name} parameter for {product_name}"
-    while True:
+    # once a response has been rejected, cached responses must be ignored or the same response would be returned
+    refresh = False
+    for _ in range(attempts):
+        if len(values) >= VALUE_COUNT:
+            break
         try:
-            values = await _generate_values(product_name, parameter_name, ai_message)
-            if len(values) == 20:
-                return Parameter(name=parameter_name, values=[str(val) for val in values])
-            else:
-                print(f"Got less than 20 values for {feedback_msg}, retrying...")
-        except RateLimitError:
-            await sleep(30)
+            async with VALUE_SLOTS.slot(priority):
+                with LLM_CACHE.refresh() if refresh else nullcontext():
+                    if values:
+                        new = await _top_up_values(product_name, parameter_name, ai_message, values,
+                                                   VALUE_COUNT - len(values))
+                    else:
+                        new = await _generate_values(product_name, parameter_name, ai_message)
+            values = _merge(values, new, VALUE_COUNT)
+            if len(values) < VALUE_COUNT:
+                print(f"Got {len(values)} values for {feedback_msg}, requesting {VALUE_COUNT - len(values)} more...")
         except SyntaxError:
             print(f"Could not understand response when generating values for {feedback_msg}, retrying...")
         except ValidationError:
             print(f"Validation error when generating values for {feedback_msg}, retrying...")
+        refresh = True
+
+    if len(values) < MIN_ACCEPTED_VALUES:
+        raise GenerationError(f"Could not generate values for {feedback_msg} after {MAX_GENERATION_ATTEMPTS} "
+                              f"attempts")
+    if len(values) < VALUE_COUNT:
+        print(f"Accepting {len(values)} values for {feedback_msg}.")
+    return Parameter(name=parameter_name, values=values)
+
+
+async def generate_values(product_name: str, ai_message: AIMessage, parameter_name: str,
+                          priority: int = 0) -> Parameter:
+    """ Generate `VALUE_COUNT` values for a single parameter.
+
+    If a response is short, the values which were returned are kept and only the missing ones are requested.
+
+    Raises:
+        GenerationError: If less than `MIN_ACCEPTED_VALUES` values could be generated within
+            `MAX_GENERATION_ATTEMPTS` requests.
+    """
+    return await _complete_values(product_name, ai_message, parameter_name, [], priority, MAX_GENERATION_ATTEMPTS)
 
 
 def save_product(path: Path, omniclass: Omniclass, parameters: List[Parameter]) -> None:
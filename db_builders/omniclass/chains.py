@@ -1,3 +1,4 @@
+import ast
 from pathlib import Path
 
 from langchain_core.output_parsers import StrOutputParser
@@ -5,6 +6,8 @@ from langchain_core.prompts import PromptTemplate, HumanMessagePromptTemplate, C
 from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 
+from db_builders.typedefs import Parameter, ParameterBatch, ParameterList
+
 _ROOT = Path(__file__).parent
 
 PARAMETER_PROMPT_FILE = _ROOT.joinpath("prompts", "PARAMETER_PROMPT.txt")
@@ -19,6 +22,45 @@ VALUE_PROMPT = HumanMessagePromptTemplate.from_template(
     open(VALUE_PROMPT_FILE, "r").read()
 )
 
+# appended to the prompts above so that the list can be parsed without a second call to a formatter model. OpenAI's
+# JSON mode requires the word "JSON" to be in the prompt.
+PARAMETER_JSON_PROMPT = HumanMessagePromptTemplate.from_template(
+    'Respond with a JSON object in the form {{"parameters": ["first parameter", "second parameter", ...]}}.'
+)
+
+VALUE_JSON_PROMPT = HumanMessagePromptTemplate.from_template(
+    'Respond with a JSON object in the form {{"name": "{parameter}", "values": ["first value", "second value", ...]}}.'
+)
+
+# used to ask for the missing items when a response contained less than 20 items. `existing` is a JSON list.
+PARAMETER_TOP_UP_PROMPT = HumanMessagePromptTemplate.from_template(
+    'These parameters have already been listed: {existing}\n'
+    'List {count} more parameters for this omniclass which are different from the ones already listed.'
+)
+
+VALUE_TOP_UP_PROMPT = HumanMessagePromptTemplate.from_template(
+    'These values have already been listed: {existing}\n'
+    'List {count} more specific values for the {parameter} parameter which are different from the ones already listed.'
+)
+
+# used instead of VALUE_PROMPT to generate values for several parameters in a single request
+VALUE_BATCH_PROMPT = HumanMessagePromptTemplate.from_template(
+    'For each of the following parameters, create an exhaustive list of the top 20 specific values: {parameters}.\n'
+    'Respond with a JSON object in the form {{"parameters": [{{"name": "parameter name", "values": ["first value", '
+    '"second value", ...]}}, ...]}}, with an entry for every parameter.'
+)
+
+# used instead of VALUE_TOP_UP_PROMPT to top up the values of several parameters in a single request. `existing` is a
+# JSON object with the values which have already been listed for each parameter.
+VALUE_BATCH_TOP_UP_PROMPT = HumanMessagePromptTemplate.from_template(
+    'These values have already been listed for each of the following parameters: {existing}\n'
+    'For each parameter, list {count} more specific values which are different from the ones already listed.\n'
+    'Respond with a JSON object in the form {{"parameters": [{{"name": "parameter name", "values": ["first value", '
+    '"second value", ...]}}, ...]}}, with an entry for every parameter.'
+)
+
+JSON_MODE = {"response_format": {"type": "json_object"}}
+
 
 FORMAT_PROMPT = PromptTemplate.from_template(
     """Please format the given list as a valid python list:
@@ -43,6 +85,9 @@ Here is the list of values:
 def extract_list_from_response(response: str) -> list[str]:
     """ Extract a list of values from the response.
 
+    This is used to parse the output of the formatter chain, which is only used when a structured response could not
+    be parsed.
+
     Parameters
     ----------
     response: str
@@ -52,20 +97,52 @@ def extract_list_from_response(response: str) -> list[str]:
     -------
     list[str]
         The list of values.
+
+    Raises
+    ------
+    SyntaxError
+        If the response is not a list of literals.
     """
     # remove any text after "]"
-    response = response.split("]")[0]
+    response = response.split("]")[0].strip()
 
-    if response[0] != "[":
+    if not response.startswith("["):
         response = "[" + response
 
-    if response[-1] != "]":
+    if not response.endswith("]"):
         response = response + "]"
 
-    extracted: list[str] = eval(response)
+    try:
+        extracted = ast.literal_eval(response)
+    except ValueError as e:
+        raise SyntaxError(f"Response is not a list of literals: {e}") from None
+    if not isinstance(extracted, list):
+        raise SyntaxError("Response is not a list")
     return extracted
 
 
+def parse_parameter_list(response: str) -> list[str]:
+    """ Parse the structured response of the chain built by `build_parameter_chain`.
+
+    Raises
+    ------
+    pydantic_core.ValidationError
+        If the response is not valid JSON in the expected form.
+    """
+    return ParameterList.model_validate_json(response).parameters
+
+
+def parse_parameter_values(response: str) -> list[str]:
+    """ Parse the structured response of the chain built by `build_structured_value_chain`.
+
+    Raises
+    ------
+    pydantic_core.ValidationError
+        If the response is not valid JSON in the expected form.
+    """
+    return Parameter.model_validate_json(response).values
+
+
 def build_formatter_chain(chat: ChatOpenAI) -> Runnable:
     """ Build a chain of runnables to format a list of values.
 
@@ -91,9 +168,27 @@ def build_formatter_chain(chat: ChatOpenAI) -> Runnable:
     )
 
 
+def parse_parameter_batch(response: str) -> dict[str, list[str]]:
+    """ Parse the structured response of the chain built by `build_value_batch_chain`.
+
+    Returns
+    -------
+    dict[str, list[str]]
+        The values for each parameter in the response, keyed by the parameter name as written in the response.
+
+    Raises
+    ------
+    pydantic_core.ValidationError
+        If the response is not valid JSON in the expected form.
+    """
+    return {parameter.name: parameter.values for parameter in ParameterBatch.model_validate_json(response).parameters}
+
+
 def build_parameter_chain(chat: ChatOpenAI) -> Runnable:
     """ Build a chain of runnables to generate a list of parameters for a given product.
 
+    The output of the runnable is an `AIMessage` containing a JSON object which is parsed by `parse_parameter_list`.
+
     Parameters
     ----------
     chat : ChatOpenAI
@@ -103,22 +198,156 @@ def build_parameter_chain(chat: ChatOpenAI) -> Runnable:
     -------
     Runnable
     """
-    _prompt = ChatPromptTemplate.from_messages([PARAMETER_PROMPT])
+    _prompt = ChatPromptTemplate.from_messages([PARAMETER_PROMPT, PARAMETER_JSON_PROMPT])
 
     return (
         _prompt
-        | chat
+        | chat.bind(**JSON_MODE)
+    )
+
+
+def build_structured_value_chain(chat: ChatOpenAI) -> Runnable:
+    """ Build a chain of runnables to generate a list of values for a given parameter in a single call.
+
+    The runnable accepts a dictionary with the following keys:
+    - omniclass: The name of the product to generate values for.
+    - ai_message: A list containing the message which was returned by the parameter chain.
+    - parameter: The name of the parameter to generate values for.
+
+    The output of the runnable is a string containing a JSON object which is parsed by `parse_parameter_values`.
+
+    Parameters
+    ----------
+    chat : ChatOpenAI
+        The chatbot to use to generate values.
+
+    Returns
+    -------
+    Runnable
+        The chain of runnables to generate values.
+    """
+    value_prompt_messages = ChatPromptTemplate.from_messages([
+        PARAMETER_PROMPT,
+        MessagesPlaceholder(variable_name='ai_message'),
+        VALUE_PROMPT,
+        VALUE_JSON_PROMPT])
+
+    return (
+        value_prompt_messages
+        | chat.bind(**JSON_MODE)
+        | StrOutputParser()
+    )
+
+
+def build_value_batch_chain(chat: ChatOpenAI) -> Runnable:
+    """ Build a chain of runnables to generate lists of values for several parameters in a single call.
+
+    The parameter prompt and the parameter chain's response are only sent once for the whole batch, instead of once
+    per parameter.
+
+    The runnable accepts a dictionary with the following keys:
+    - omniclass: The name of the product to generate values for.
+    - ai_message: A list containing the message which was returned by the parameter chain.
+    - parameters: The names of the parameters to generate values for, as a single string.
+
+    The output of the runnable is a string containing a JSON object which is parsed by `parse_parameter_batch`.
+
+    Parameters
+    ----------
+    chat : ChatOpenAI
+        The chatbot to use to generate values.
+
+    Returns
+    -------
+    Runnable
+        The chain of runnables to generate values.
+    """
+    value_prompt_messages = ChatPromptTemplate.from_messages([
+        PARAMETER_PROMPT,
+        MessagesPlaceholder(variable_name='ai_message'),
+        VALUE_BATCH_PROMPT])
+
+    return (
+        value_prompt_messages
+        | chat.bind(**JSON_MODE)
+        | StrOutputParser()
+    )
+
+
+def build_parameter_top_up_chain(chat: ChatOpenAI) -> Runnable:
+    """ Build a chain of runnables to generate the parameters which are missing from a short list.
+
+    The runnable accepts a dictionary with the following keys:
+    - omniclass: The name of the product to generate parameters for.
+    - existing: The parameters which have already been generated, as a JSON list.
+    - count: The number of parameters to generate.
+
+    The output of the runnable is a string containing a JSON object which is parsed by `parse_parameter_list`.
+    """
+    _prompt = ChatPromptTemplate.from_messages([PARAMETER_PROMPT, PARAMETER_TOP_UP_PROMPT, PARAMETER_JSON_PROMPT])
+
+    return (
+        _prompt
+        | chat.bind(**JSON_MODE)
+        | StrOutputParser()
+    )
+
+
+def build_value_batch_top_up_chain(chat: ChatOpenAI) -> Runnable:
+    """ Build a chain of runnables to generate the values which are missing from several short lists in a single call.
+
+    The runnable accepts the same keys as `build_value_batch_chain`, except for `parameters`, and:
+    - existing: The values which have already been generated for each parameter, as a JSON object.
+    - count: The number of values to generate for each parameter.
+
+    The output of the runnable is a string containing a JSON object which is parsed by `parse_parameter_batch`.
+    """
+    value_prompt_messages = ChatPromptTemplate.from_messages([
+        PARAMETER_PROMPT,
+        MessagesPlaceholder(variable_name='ai_message'),
+        VALUE_BATCH_TOP_UP_PROMPT])
+
+    return (
+        value_prompt_messages
+        | chat.bind(**JSON_MODE)
+        | StrOutputParser()
+    )
+
+
+def build_value_top_up_chain(chat: ChatOpenAI) -> Runnable:
+    """ Build a chain of runnables to generate the values which are missing from a short list.
+
+    The runnable accepts the same keys as `build_structured_value_chain`, and:
+    - existing: The values which have already been generated, as a JSON list.
+    - count: The number of values to generate.
+
+    The output of the runnable is a string containing a JSON object which is parsed by `parse_parameter_values`.
+    """
+    value_prompt_messages = ChatPromptTemplate.from_messages([
+        PARAMETER_PROMPT,
+        MessagesPlaceholder(variable_name='ai_message'),
+        VALUE_PROMPT,
+        VALUE_TOP_UP_PROMPT,
+        VALUE_JSON_PROMPT])
+
+    return (
+        value_prompt_messages
+        | chat.bind(**JSON_MODE)
+        | StrOutputParser()
     )
 
 
 def build_parameter_value_chain(chat: ChatOpenAI, parse_chat: ChatOpenAI) -> Runnable:
     """ Build a chain of runnables to generate a list of values for a given parameter.
 
+    This makes two calls: one to generate the values and one to format them. `build_structured_value_chain` does the
+    same with a single call.
+
     The runnable accepts a dictionary with the following keys:
     - parameter: The name of the parameter to generate values for.
     - product: The label of the product to generate values for.
 
-    The output of the runnable is a parsed `ParameterList` object.
+    The output of the runnable is a string which is parsed by `extract_list_from_response`.
 
     Parameters
     ----------
@@ -0,0 +1,85 @@
+""" Per-omniclass checkpoints so that an interrupted table generation can be resumed.
+
+Progress for each omniclass is appended to a JSON lines file as soon as it is generated: first the parameter list,
+then a line for each parameter once its values have been generated. Every line is flushed to disk before the next
+one is written, so at most the line being written is lost when the process is killed.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.messages import AIMessage
+
+from db_builders.typedefs import Omniclass, Parameter
+
+
+class OmniclassCheckpoint:
+    """ Append-only checkpoint for a single omniclass. """
+    path: Path
+    ai_message: Optional[AIMessage]
+    parameters: Optional[list[str]]
+    values: dict[str, Parameter]
+
+    def __init__(self, directory: Path, omniclass: Omniclass):
+        self.path = directory.joinpath(f"{omniclass.identifier}.jsonl")
+        self.ai_message = None
+        self.parameters = None
+        self.values = {}
+
+    def load(self) -> 'OmniclassCheckpoint':
+        """ Load any progress which was recorded by a previous run.
+
+        Lines which cannot be parsed (ie: a line which was being written when the process was killed) are ignored.
+        """
+        if not self.path.is_file():
+            return self
+
+        line = '\n'
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'parameters' in record:
+                    self.ai_message = AIMessage(content=record['ai_message'])
+                    self.parameters = record['parameters']
+                elif 'name' in record:
+                    parameter = Parameter(name=record['name'], values=record['values'])
+                    self.values[parameter.name] = parameter
+
+        if not line.endswith('\n'):
+            # terminate the partial line so that the next record is not appended to it
+            with open(self.path, 'a') as f:
+                f.write('\n')
+        return self
+
+    @property
+    def remaining(self) -> list[str]:
+        """ Parameters which do not have any values yet. """
+        return [name for name in self.parameters or [] if name not in self.values]
+
+    def _append(self, record: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record_parameters(self, ai_message: AIMessage, parameters: list[str]) -> None:
+        self.ai_message = ai_message
+        self.parameters = parameters
+        self._append({'ai_message': ai_message.content, 'parameters': parameters})
+
+    def record_values(self, parameter: Parameter) -> None:
+        self.values[parameter.name] = parameter
+        self._append({'name': parameter.name, 'values': parameter.values})
+
+    def ordered_values(self) -> list[Parameter]:
+        """ Get the generated values in the same order as the parameters. """
+        return [self.values[name] for name in self.parameters]
+
+    def remove(self) -> None:
+        """ Delete the checkpoint once the omniclass table has been saved. """
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,162 @@
+""" Share parameter lists between omniclasses with a common parent.
+
+OmniClass numbers are hierarchical: "23-11 17 13" is a child of "23-11 17 00", which is a child of "23-11 00 00".
+Sibling products usually share most of their parameters, so a parameter list is generated once for their parent and
+then either reused as-is or used to seed each child's list, which only costs a short top-up request.
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.messages import AIMessage
+
+from db_builders.omniclass.builder_functions import generate_parameters
+from db_builders.typedefs import Omniclass
+
+# number of parent parameters which seed a child's list in the 'seed' mode. The rest are generated for the child.
+SEED_COUNT = int(os.getenv('PARAMETER_SEED_COUNT', 15))
+
+# maximum number of child names used to describe a parent which is not in the list of omniclasses
+_MAX_DESCRIBED_CHILDREN = 5
+
+NodeKey = tuple[str, ...]
+
+
+def node_key(number: str) -> NodeKey:
+    """ Get the position of an omniclass number in the hierarchy.
+
+    Trailing "00" levels are placeholders for the parent of a group, so they are removed.
+
+    Examples:
+        >>> node_key('23-11 17 13')
+        ('23-11', '17', '13')
+        >>> node_key('23-11 17 00')
+        ('23-11', '17')
+    """
+    levels = number.split()
+    while len(levels) > 1 and levels[-1] == '00':
+        levels.pop()
+    return tuple(levels)
+
+
+def value_scope(omniclass: Omniclass, scope: str) -> Optional[str]:
+    """ Get the group of omniclasses which may reuse each other's parameter values (see `ParameterValueIndex`).
+
+    Parameters:
+        omniclass: The omniclass being generated.
+        scope: 'category' for omniclasses with the same first two levels (ie: "23-11 17"), 'table' for omniclasses in
+            the same table (ie: "23-11"), 'global' for every omniclass, or 'off' to disable value reuse.
+
+    Returns:
+        The scope key, or `None` if values should not be reused for the omniclass.
+
+    Examples:
+        >>> value_scope(Omniclass(number='23-11 17 13', name='Crash Barriers'), 'category')
+        '23-11 17'
+        >>> value_scope(Omniclass(name='Crash Barriers'), 'table') is None
+        True
+    """
+    if scope == 'off':
+        return None
+    if scope == 'global':
+        return 'global'
+    if scope not in ('category', 'table'):
+        raise ValueError(f"Invalid value reuse scope: {scope}")
+    if omniclass.number is None:
+        return None
+    key = node_key(omniclass.number)
+    depth = 2 if scope == 'category' else 1
+    if len(key) < depth:
+        return None
+    return ' '.join(key[:depth])
+
+
+class ParameterHierarchy:
+    """ Tree of the omniclasses being generated, with a cached parameter list per parent node.
+
+    A node is a parent when at least two of the omniclasses are below it (or are it). Each omniclass uses the parameter
+    list of its nearest parent node, excluding the top level of a table, which is too broad to share parameters.
+    Omniclasses without a number, or without a parent node, have their parameters generated on their own.
+
+    Parent parameter lists are generated once, even when several children request them at the same time, and are saved
+    to `directory` so that they are reused when the runtime is restarted.
+
+    `mode` selects how a parent's list is used: 'reuse' uses it as the child's list, while 'seed' keeps the first
+    `SEED_COUNT` parameters and generates the rest for the child.
+    """
+    directory: Path
+    mode: str
+
+    def __init__(self, omniclasses: list[Omniclass], directory: Path, mode: str = 'seed'):
+        if mode not in ('seed', 'reuse'):
+            raise ValueError(f"Invalid parameter reuse mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self._names: dict[NodeKey, str] = {}
+        self._children: dict[NodeKey, list[str]] = {}
+        self._generating: dict[NodeKey, asyncio.Task] = {}
+
+        for omniclass in omniclasses:
+            if omniclass.number is None:
+                continue
+            key = node_key(omniclass.number)
+            self._names[key] = omniclass.name
+            for depth in range(1, len(key) + 1):
+                self._children.setdefault(key[:depth], []).append(omniclass.name)
+
+    def parent(self, omniclass: Omniclass) -> Optional[NodeKey]:
+        """ Get the nearest parent node of an omniclass, which may be the omniclass itself. """
+        if omniclass.number is None:
+            return None
+        key = node_key(omniclass.number)
+        # the first level is the table, so the shallowest parent is at the second level
+        for depth in range(len(key), 1, -1):
+            if len(self._children.get(key[:depth], [])) >= 2:
+                return key[:depth]
+        return None
+
+    def _label(self, key: NodeKey) -> str:
+        """ Describe a node in the parameter prompt. """
+        if key in self._names:
+            return self._names[key]
+        children = self._children[key][:_MAX_DESCRIBED_CHILDREN]
+        return f"a category of products which includes {', '.join(children)}"
+
+    def _path(self, key: NodeKey) -> Path:
+        return self.directory.joinpath(f"{' '.join(key)}.json")
+
+    async def _generate(self, key: NodeKey) -> list[str]:
+        path = self._path(key)
+        if path.is_file():
+            return json.loads(path.read_text())['parameters']
+
+        _, parameters = await generate_parameters(self._label(key))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'label': self._label(key), 'parameters': parameters}))
+        os.replace(tmp_path, path)
+        return parameters
+
+    async def node_parameters(self, key: NodeKey) -> list[str]:
+        """ Get the parameter list of a parent node, generating it if it has not been generated yet. """
+        if key not in self._generating or (self._generating[key].done() and self._generating[key].exception()):
+            # a failed generation is retried by the next child which needs it
+            self._generating[key] = asyncio.ensure_future(self._generate(key))
+        return await asyncio.shield(self._generating[key])
+
+    async def generate_parameters(self, omniclass: Omniclass) -> (AIMessage, list[str]):
+        """ Generate the parameters for an omniclass, using the parameters of its parent node.
+
+        This is a drop-in replacement for `builder_functions.generate_parameters`.
+        """
+        key = self.parent(omniclass)
+        if key is None:
+            return await generate_parameters(omniclass.name)
+
+        parameters = await self.node_parameters(key)
+        if self.mode == 'reuse' or key == node_key(omniclass.number):
+            # an omniclass which is a parent node uses its own list
+            return await generate_parameters(omniclass.name, seed=parameters)
+        return await generate_parameters(omniclass.name, seed=parameters[:SEED_COUNT])
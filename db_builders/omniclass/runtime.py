@@ -1,44 +1,119 @@
-from asyncio import sleep, gather
+import itertools
+import os
+import shutil
+from asyncio import sleep
+from functools import partial
 from pathlib import Path
+from typing import Optional
 
+from db_builders.cache import LLM_CACHE, VALUE_INDEX
+from db_builders.loading import add_to_completed
+from db_builders.omniclass.checkpoint import OmniclassCheckpoint
 from db_builders.omniclass.builder_functions import generate_parameters, generate_all_values, save_product
+from db_builders.omniclass.hierarchy import ParameterHierarchy, value_scope
+from db_builders.rate_limit import OPENAI_LIMITER
+from db_builders.retry import FATAL_RUN_ERRORS
+from db_builders.scheduling import run_pool
+from db_builders.storage import RESULT_STORE
 from db_builders.typedefs import Omniclass
 
 
-CHUNK_SIZE = 3
+# maximum number of omniclasses being generated at once
+CONCURRENCY = int(os.getenv('OMNICLASS_CONCURRENCY', 3))
 OMNICLASS_SAVE_PATH = Path('data/omniclass_tables')
-
-
-async def _process_product(omniclass: Omniclass):
+# identifiers of omniclasses whose tables have been saved. These are skipped when the runtime is restarted.
+OMNICLASS_COMPLETED_PATH = Path('data/completed_omniclass.csv')
+# progress of omniclasses which are being generated
+OMNICLASS_CHECKPOINT_PATH = Path('data/checkpoints/omniclass')
+# parameter lists generated for parent omniclasses
+OMNICLASS_PARENT_PATH = Path('data/checkpoints/omniclass_parents')
+# 'seed' or 'reuse' shares parameter lists between sibling omniclasses (see `ParameterHierarchy`). 'off' disables it.
+PARAMETER_REUSE = os.getenv('PARAMETER_REUSE', 'off').lower()
+# 'category', 'table' or 'global' reuses values generated for a matching parameter of another omniclass in the same
+# scope (see `value_scope`). 'off' disables it.
+VALUE_REUSE_SCOPE = os.getenv('VALUE_REUSE_SCOPE', 'off').lower()
+
+# omniclasses which were started earlier get priority when generating values
+_START_ORDER = itertools.count()
+
+
+async def _process_product(omniclass: Omniclass, hierarchy: Optional[ParameterHierarchy] = None):
     """ Begin to process a single omniclass product.
 
     This is used as a coroutine in `generate_omniclass_tables` to execute in parallel.
 
-    Data is saved to a CSV file in the `data/omniclass_tables` directory.
+    Data is saved to a CSV file in the `data/omniclass_tables` directory, or to `RESULT_STORE` if it is enabled.
+    Progress is checkpointed after the parameters and after each parameter's values are generated, so an interrupted
+    omniclass resumes where it stopped.
+    Once the CSV file is saved, the omniclass is added to `OMNICLASS_COMPLETED_PATH`.
 
     Parameters:
         `omniclass`: A single omniclass to process.
+        `hierarchy`: If given, parameters are generated from the parameters of the omniclass's parent.
     """
     omniclass_name = omniclass.name
-    print(f"\n*** Processing {omniclass_name}...")
-    ai_message, parameters = await generate_parameters(omniclass_name)
-    kv_columns = await generate_all_values(omniclass_name, parameters, ai_message)
-    save_product(OMNICLASS_SAVE_PATH, omniclass, kv_columns)
+    priority = next(_START_ORDER)
+    scope = value_scope(omniclass, VALUE_REUSE_SCOPE)
+    checkpoint = OmniclassCheckpoint(OMNICLASS_CHECKPOINT_PATH, omniclass).load()
+    if checkpoint.parameters is None:
+        print(f"\n*** Processing {omniclass_name}...")
+    else:
+        print(f"\n*** Resuming {omniclass_name} ({len(checkpoint.remaining)} parameters remaining)...")
+    try:
+        if checkpoint.parameters is None:
+            if hierarchy is not None:
+                ai_message, parameters = await hierarchy.generate_parameters(omniclass)
+            else:
+                ai_message, parameters = await generate_parameters(omniclass_name)
+            checkpoint.record_parameters(ai_message, parameters)
+        await generate_all_values(omniclass_name, checkpoint.remaining, checkpoint.ai_message, priority,
+                                  on_generated=checkpoint.record_values, value_scope=scope)
+    except FATAL_RUN_ERRORS:
+        raise
+    except Exception as e:
+        print(f"\n*** Skipping {omniclass_name}: {e} ***\n")
+        return
+    if RESULT_STORE is not None:
+        RESULT_STORE.save_omniclass_table(omniclass, checkpoint.ordered_values())
+    else:
+        save_product(OMNICLASS_SAVE_PATH, omniclass, checkpoint.ordered_values())
+    add_to_completed(OMNICLASS_COMPLETED_PATH, omniclass.identifier)
+    checkpoint.remove()
     print(f"\n*** ...Done processing {omniclass_name}. ***\n")
 
 
-async def generate_omniclass_tables(omniclasses: list[Omniclass]):
+async def generate_omniclass_tables(omniclasses: list[Omniclass], concurrency: int = CONCURRENCY,
+                                    resume: bool = True, parameter_reuse: str = PARAMETER_REUSE,
+                                    hierarchy_source: Optional[list[Omniclass]] = None):
     """ Generate omniclass tables for a given list of omniclass objects.
 
     This is the main entry point for the omniclass table generation runtime and should be the only function
     called in `main.py`.
 
+    Up to `concurrency` omniclasses are processed at a time. A new omniclass is started as soon as another one
+    finishes, and fewer omniclasses are processed at once while OpenAI is rate limiting requests.
+
     Parameters:
         `omniclasses`: The list of omniclasses to generate tables for
+        `concurrency`: The maximum number of omniclasses to process at once
+        `resume`: If `True`, omniclasses which were interrupted by a previous run continue from their checkpoint.
+            Otherwise, all checkpoints are discarded. Completed omniclasses are filtered out by the caller.
+        `parameter_reuse`: 'seed' or 'reuse' to share parameter lists between omniclasses with the same parent, or
+            'off' to generate the parameters of every omniclass on its own.
+        `hierarchy_source`: Every omniclass in the run, including the completed ones, used to find the parent of each
+            omniclass. Defaults to `omniclasses`, which gives a resumed run fewer siblings than the run it continues.
     """
     # create directory if it does not exist
     OMNICLASS_SAVE_PATH.mkdir(parents=True, exist_ok=True)
 
+    if not resume:
+        shutil.rmtree(OMNICLASS_CHECKPOINT_PATH, ignore_errors=True)
+        shutil.rmtree(OMNICLASS_PARENT_PATH, ignore_errors=True)
+
+    hierarchy = None
+    if parameter_reuse != 'off':
+        hierarchy = ParameterHierarchy(hierarchy_source or omniclasses, OMNICLASS_PARENT_PATH, parameter_reuse)
+
     # give some feedback on how many products are being processed
     print(f"Processing {len(omniclasses)} products...")
 
@@ -46,13 +121,12 @@ async def generate_omniclass_tables(omniclasses: list[Omniclass]):
     print("Processing will start in 5 seconds... (press Ctrl+C to cancel at any time)")
     await sleep(5)
 
-    # chunk products into groups of CHUNK_SIZE
-    chunks = [omniclasses[i:i + CHUNK_SIZE] for i in range(0, len(omniclasses), CHUNK_SIZE)]
-    for chunk in chunks:
-        tasks = [_process_product(product_name) for product_name in chunk]
-        await gather(*tasks)
+    await run_pool(omniclasses, partial(_process_product, hierarchy=hierarchy), concurrency, limiters=[OPENAI_LIMITER])
 
     # print the number of products that were processed
     print(f"\nProcessed {len(omniclasses)} products.")
+    print(f"LLM cache: {LLM_CACHE.stats()}")
+    if VALUE_REUSE_SCOPE != 'off':
+        print(f"Value index: {VALUE_INDEX.stats()}")
     print("Done!")
     exit(0)
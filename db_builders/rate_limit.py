@@ -0,0 +1,204 @@
+""" Proactive, process-wide rate limiting for the OpenAI and Google custom search APIs.
+
+Every call site acquires from the limiter of the API it is about to call *before* sending a request. Waiters are
+served in FIFO order, so when the provider ceiling is reached coroutines queue up and are released at the allowed
+rate instead of all sleeping and retrying at once.
+"""
+import asyncio
+import os
+import time
+from datetime import date
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from db_builders.cache import SQLiteCache, CACHE_DIR
+
+load_dotenv()
+
+
+class QuotaExceededError(RuntimeError):
+    """ Raised when the daily request quota of an API has been used up. """
+
+
+class TokenBucket:
+    """ Asynchronous token bucket.
+
+    Tokens are refilled continuously at `rate` tokens per second, up to `capacity`.
+    """
+    rate: float
+    capacity: float
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # an `asyncio.Lock` is bound to the loop it is first used on
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """ Wait until `amount` tokens are available, then consume them.
+
+        Requests larger than `capacity` are clamped to `capacity` so that they can eventually be served.
+        """
+        amount = min(amount, self.capacity)
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                else:
+                    wait = (amount - self._tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """ Empty the bucket and block every waiter for `seconds`. """
+        self._refill(time.monotonic())
+        self._tokens = 0
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class ApiRateLimiter:
+    """ Request-rate, token-rate and daily quota limits for a single API.
+
+    Any of the limits may be `None` to disable it. The number of requests sent each day is kept in `quota_store`, so
+    that the daily quota also holds across restarts.
+    """
+    name: str
+    penalty: float
+    requests_per_day: Optional[int]
+    throttle_events: int
+    _requests: Optional[TokenBucket]
+    _tokens: Optional[TokenBucket]
+
+    def __init__(self, name: str, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, requests_per_day: Optional[int] = None,
+                 penalty: float = 10, quota_store: Optional[SQLiteCache] = None):
+        """ Create a limiter.
+
+        Parameters:
+            name: Name of the API, used in error messages.
+            requests_per_minute: Maximum number of requests per minute. Bursts of up to one second worth of requests
+                are allowed.
+            tokens_per_minute: Maximum number of tokens per minute. Bursts of up to ten seconds worth of tokens are
+                allowed.
+            requests_per_day: Maximum number of requests per calendar day.
+            penalty: Default number of seconds to block all callers for after the provider reports a rate limit.
+            quota_store: Persistent store for the number of requests sent each day. If `None`, the count is only
+                kept in memory.
+        """
+        self.name = name
+        self.penalty = penalty
+        self.requests_per_day = requests_per_day
+        self.throttle_events = 0
+        self._requests = None
+        self._tokens = None
+        if requests_per_minute:
+            rate = requests_per_minute / 60
+            self._requests = TokenBucket(rate, max(1.0, rate))
+        if tokens_per_minute:
+            rate = tokens_per_minute / 60
+            self._tokens = TokenBucket(rate, rate * 10)
+        self._quota_store = quota_store
+        # the count for the current day is loaded from `quota_store` by the first request
+        self._day: Optional[date] = None
+        self._used_today = 0
+
+    def _quota_key(self) -> str:
+        return f"{self.name}|{self._day.isoformat()}"
+
+    def _consume_quota(self) -> None:
+        if self.requests_per_day is None:
+            return
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            stored = self._quota_store.peek(self._quota_key()) if self._quota_store is not None else None
+            self._used_today = int(stored) if stored is not None else 0
+        if self._used_today >= self.requests_per_day:
+            raise QuotaExceededError(f"Daily quota of {self.requests_per_day} requests for {self.name} has been used.")
+        self._used_today += 1
+        if self._quota_store is not None:
+            self._quota_store.set(self._quota_key(), str(self._used_today))
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """ Wait until a request using `tokens` tokens may be sent.
+
+        Raises:
+            QuotaExceededError: If the daily quota has been used up.
+        """
+        self._consume_quota()
+        if self._requests is not None:
+            await self._requests.acquire()
+        if self._tokens is not None and tokens:
+            await self._tokens.acquire(tokens)
+
+    def penalize(self, seconds: Optional[float] = None) -> None:
+        """ Block every caller after the provider has reported that a rate limit was hit.
+
+        Parameters:
+            seconds: Number of seconds to block for. Defaults to `penalty`.
+        """
+        if seconds is None:
+            seconds = self.penalty
+        self.throttle_events += 1
+        for bucket in (self._requests, self._tokens):
+            if bucket is not None:
+                bucket.penalize(seconds)
+
+
+def estimate_tokens(text: str, completion_tokens: int = 500) -> int:
+    """ Roughly estimate the number of tokens used by a request.
+
+    This uses the rule of thumb of four characters per token for the prompt.
+
+    Parameters:
+        text: The full prompt text.
+        completion_tokens: Number of tokens expected in the response.
+    """
+    return len(text) // 4 + completion_tokens
+
+
+def _env_number(key: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(key)
+    if value is None:
+        return default
+    value = float(value)
+    # a limit of 0 disables the limit
+    return value or None
+
+
+OPENAI_LIMITER = ApiRateLimiter(
+    'OpenAI',
+    requests_per_minute=_env_number('OPENAI_REQUESTS_PER_MINUTE', 3500),
+    tokens_per_minute=_env_number('OPENAI_TOKENS_PER_MINUTE', 60_000),
+)
+
+_search_qps = _env_number('GOOGLE_SEARCH_QPS', 10)
+_search_daily_quota = _env_number('GOOGLE_SEARCH_DAILY_QUOTA', 10_000)
+CSE_LIMITER = ApiRateLimiter(
+    'Google custom search',
+    requests_per_minute=_search_qps * 60 if _search_qps else None,
+    requests_per_day=int(_search_daily_quota) if _search_daily_quota else None,
+    penalty=15,
+    # counts are only needed for the current day
+    quota_store=SQLiteCache(CACHE_DIR.joinpath('quota.sqlite3'), ttl=2 * 24 * 60 * 60),
+)
@@ -0,0 +1,210 @@
+""" Retry policy shared by every LLM and HTTP call site.
+
+A `RetryPolicy` retries transient errors with exponential backoff and full jitter, honours `Retry-After` headers, and
+stops after a per-call number of attempts or once the per-run `RetryBudget` has been spent. Any other error is treated
+as fatal and raised immediately.
+"""
+import asyncio
+import functools
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Mapping, Optional, TypeVar
+
+import aiohttp
+from openai import (RateLimitError, InternalServerError, APIConnectionError, APITimeoutError,
+                    APIResponseValidationError, APIStatusError)
+
+from db_builders.rate_limit import ApiRateLimiter, OPENAI_LIMITER, CSE_LIMITER, QuotaExceededError
+
+T = TypeVar('T')
+
+
+class RetryBudgetExceeded(RuntimeError):
+    """ Raised when every retry allowed during a run has been used. """
+
+
+# errors which should stop a whole run rather than only skip the current item
+FATAL_RUN_ERRORS = (RetryBudgetExceeded, QuotaExceededError)
+
+
+class RetryableHTTPError(Exception):
+    """ Raised for an HTTP response which should be retried (ie: 429 or 5XX). """
+    status: int
+    retry_after: Optional[float]
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"Got status code {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """ Parse the `Retry-After` header.
+
+    Parameters:
+        headers: Response headers.
+
+    Returns:
+        Number of seconds to wait, or `None` if the header is missing or invalid.
+
+    Examples:
+        >>> parse_retry_after({'Retry-After': '2'})
+        2.0
+        >>> parse_retry_after({}) is None
+        True
+    """
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryBudget:
+    """ Number of retries which may be spent across a whole run. """
+    limit: Optional[int]
+    used: int
+
+    def __init__(self, limit: Optional[int] = None):
+        """ Create a budget.
+
+        Parameters:
+            limit: Maximum number of retries. If `None`, the budget is unlimited.
+        """
+        self.limit = limit
+        self.used = 0
+
+    def spend(self) -> None:
+        """ Spend a single retry.
+
+        Raises:
+            RetryBudgetExceeded: If the budget has been used up.
+        """
+        if self.limit is not None and self.used >= self.limit:
+            raise RetryBudgetExceeded(f"All {self.limit} retries for this run have been used.")
+        self.used += 1
+
+    def reset(self) -> None:
+        self.used = 0
+
+
+class RetryPolicy:
+    """ Retry transient errors with exponential backoff and full jitter.
+
+    The policy may be used directly with `await policy.call(func, *args)`, or as a decorator for coroutine functions.
+    """
+    RETRYABLE: tuple[type[BaseException], ...] = (
+        RateLimitError, InternalServerError, APIConnectionError, APITimeoutError, APIResponseValidationError,
+        RetryableHTTPError, aiohttp.ClientConnectionError, asyncio.TimeoutError,
+    )
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    budget: Optional[RetryBudget]
+    limiter: Optional[ApiRateLimiter]
+
+    def __init__(self, max_attempts: int = 6, base_delay: float = 1, max_delay: float = 60,
+                 budget: Optional[RetryBudget] = None, limiter: Optional[ApiRateLimiter] = None):
+        """ Create a retry policy.
+
+        Parameters:
+            max_attempts: Maximum number of attempts for a single call, including the first one.
+            base_delay: Upper bound in seconds of the delay before the first retry.
+            max_delay: Upper bound in seconds of any delay.
+            budget: Budget shared by every call using this policy.
+            limiter: Rate limiter which is penalized when the provider reports a rate limit, so that every caller
+                backs off together.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.limiter = limiter
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """ Classify an error as retryable or fatal. """
+        return isinstance(error, self.RETRYABLE)
+
+    @staticmethod
+    def is_rate_limit(error: BaseException) -> bool:
+        if isinstance(error, RateLimitError):
+            return True
+        return isinstance(error, RetryableHTTPError) and error.status == 429
+
+    @staticmethod
+    def retry_after(error: BaseException) -> Optional[float]:
+        """ Get the server-requested delay for an error, if any. """
+        if isinstance(error, RetryableHTTPError):
+            return error.retry_after
+        if isinstance(error, APIStatusError):
+            return parse_retry_after(error.response.headers)
+        return None
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """ Get the number of seconds to wait before retrying.
+
+        Parameters:
+            attempt: Number of attempts which have failed so far, starting at 1.
+            retry_after: Delay requested by the server. The returned delay is never shorter than this.
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        jittered = random.uniform(0, ceiling)
+        if retry_after is not None:
+            return max(retry_after, jittered)
+        return jittered
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """ Call `func` until it succeeds, a fatal error is raised, or the retries are exhausted.
+
+        Raises:
+            RetryBudgetExceeded: If the run's retry budget has been used up.
+            Exception: The last error raised by `func` if it is fatal or if `max_attempts` has been reached.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as error:
+                attempt += 1
+                if not self.is_retryable(error) or attempt >= self.max_attempts:
+                    raise
+                if self.budget is not None:
+                    self.budget.spend()
+
+                retry_after = self.retry_after(error)
+                if self.is_rate_limit(error):
+                    if self.limiter is not None:
+                        self.limiter.penalize(retry_after)
+                else:
+                    print(f"{type(error).__name__}: {error}. Retrying (attempt {attempt + 1})...")
+                await asyncio.sleep(self.delay(attempt, retry_after))
+
+    def __call__(self, func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            return await self.call(func, *args, **kwargs)
+        return wrapped
+
+
+LLM_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv('OPENAI_MAX_ATTEMPTS', 8)),
+    budget=RetryBudget(int(os.getenv('OPENAI_RETRY_BUDGET', 2000))),
+    limiter=OPENAI_LIMITER,
+)
+
+SEARCH_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv('GOOGLE_SEARCH_MAX_ATTEMPTS', 6)),
+    base_delay=2,
+    budget=RetryBudget(int(os.getenv('GOOGLE_SEARCH_RETRY_BUDGET', 500))),
+    limiter=CSE_LIMITER,
+)
@@ -0,0 +1,261 @@
+""" Helpers for running many coroutines with bounded, adaptive concurrency. """
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Sequence, TypeVar
+
+from db_builders.rate_limit import ApiRateLimiter
+
+T = TypeVar('T')
+U = TypeVar('U')
+
+
+class AdaptiveConcurrency:
+    """ Concurrency limit which adapts to rate-limit pressure.
+
+    The limit starts at `maximum`. Every time a slot is released, the limiters are checked: if any of them has been
+    throttled since the last check, the limit is halved (down to `minimum`), otherwise it is increased by one (up to
+    `maximum`).
+
+    This is used as an async context manager:
+
+        async with slots:
+            ...
+    """
+    maximum: int
+    minimum: int
+    limit: int
+
+    def __init__(self, maximum: int, minimum: int = 1, limiters: Sequence[ApiRateLimiter] = ()):
+        if maximum < 1:
+            raise ValueError("`maximum` must be at least 1")
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.limit = maximum
+        self._limiters = limiters
+        self._throttle_events = self._count_throttle_events()
+        self._active = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _count_throttle_events(self) -> int:
+        return sum(limiter.throttle_events for limiter in self._limiters)
+
+    def _adapt(self) -> None:
+        events = self._count_throttle_events()
+        if events > self._throttle_events:
+            self.limit = max(self.minimum, self.limit // 2)
+        elif self.limit < self.maximum:
+            self.limit += 1
+        self._throttle_events = events
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        """ Wait for a free slot. """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def release(self) -> None:
+        """ Release a slot and adapt the limit. """
+        condition = self._get_condition()
+        async with condition:
+            self._active -= 1
+            self._adapt()
+            condition.notify_all()
+
+    async def __aenter__(self) -> 'AdaptiveConcurrency':
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.release()
+
+
+class PrioritySemaphore:
+    """ Semaphore which hands free slots to the waiter with the lowest `priority` value first.
+
+    Waiters with the same priority are served in FIFO order. This is used as:
+
+        async with semaphore.slot(priority):
+            ...
+    """
+    value: int
+
+    def __init__(self, value: int):
+        if value < 1:
+            raise ValueError("`value` must be at least 1")
+        self.value = value
+        self._free = value
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int = 0) -> None:
+        """ Wait for a free slot. """
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._counter), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just before cancellation
+                self.release()
+            elif entry in self._waiters:
+                # `release` may already have popped (and skipped) the cancelled entry
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self) -> None:
+        """ Release a slot, handing it directly to the highest priority waiter if there is one. """
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+async def run_pool(items: Iterable[T], func: Callable[[T], Awaitable[U]], concurrency: int,
+                   limiters: Sequence[ApiRateLimiter] = ()) -> list[U]:
+    """ Call `func` for every item, keeping up to `concurrency` calls in flight at all times.
+
+    Unlike processing fixed chunks with `asyncio.gather`, a new item is started as soon as any other item finishes,
+    so a single slow item never holds back the rest. The concurrency is reduced while any of `limiters` is being
+    throttled.
+
+    If any call raises, the remaining calls are cancelled and the error is propagated.
+
+    Parameters:
+        items: Items to process.
+        func: Coroutine function to call with each item.
+        concurrency: Maximum number of calls in flight.
+        limiters: Rate limiters whose throttling should reduce the concurrency.
+
+    Returns:
+        The results of `func`, in the same order as `items`.
+    """
+    slots = AdaptiveConcurrency(concurrency, limiters=limiters)
+
+    async def process(item: T) -> U:
+        try:
+            return await func(item)
+        finally:
+            await slots.release()
+
+    tasks = []
+    try:
+        async with asyncio.TaskGroup() as group:
+            for item in items:
+                await slots.acquire()
+                tasks.append(group.create_task(process(item)))
+    except ExceptionGroup as errors:
+        # surface the original error rather than the group
+        raise errors.exceptions[0] from None
+
+    return [task.result() for task in tasks]
+
+
+async def stream_map(source: AsyncIterable[T], func: Callable[[T], Awaitable[Optional[U]]],
+                     concurrency: int) -> AsyncIterator[U]:
+    """ Pipeline stage which calls `func` for every item of `source` and yields results as soon as they are ready.
+
+    Items are pulled from `source` while fewer than `concurrency` calls are in flight, so consecutive stages run
+    simultaneously instead of waiting for the previous stage to finish every item. Results are yielded in completion
+    order. `None` results are dropped, which lets a stage act as a filter.
+
+    If `func` or `source` raises, the stage stops and the error is raised to the consumer.
+
+    Parameters:
+        source: Items to process. This is usually the previous stage.
+        func: Coroutine function to call with each item.
+        concurrency: Maximum number of calls in flight.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+    pending: set[asyncio.Task] = set()
+    done = object()
+
+    async def run(item: T) -> None:
+        try:
+            results.put_nowait((await func(item), None))
+        except Exception as error:
+            results.put_nowait((None, error))
+        finally:
+            semaphore.release()
+
+    async def feed() -> None:
+        try:
+            async for item in source:
+                await semaphore.acquire()
+                task = asyncio.create_task(run(item))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.wait(list(pending))
+        except Exception as error:
+            results.put_nowait((None, error))
+        finally:
+            results.put_nowait((done, None))
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            value, error = await results.get()
+            if error is not None:
+                raise error
+            if value is done:
+                break
+            if value is not None:
+                yield value
+    finally:
+        tasks = [feeder, *pending]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def batched(source: AsyncIterable[T], size: int) -> AsyncIterator[list[T]]:
+    """ Pipeline stage which groups consecutive items of `source` into lists of up to `size` items.
+
+    A batch is yielded as soon as it is full, and any remaining items are yielded once `source` is exhausted.
+    """
+    if size < 1:
+        raise ValueError("`size` must be at least 1")
+    batch = []
+    async for item in source:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def flatten(source: AsyncIterable[Iterable[T]]) -> AsyncIterator[T]:
+    """ Pipeline stage which yields every item of every list from `source`. This undoes `batched`. """
+    async for items in source:
+        for item in items:
+            yield item
@@ -0,0 +1,100 @@
+from typing import Optional
+
+from langchain.schema.runnable import Runnable
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+from pydantic_core import ValidationError
+
+from db_builders.typedefs import SearchResultItem, SiteAssessment, SiteAssessmentList
+from db_builders.utils import format_numbered_results, invoke_parsed, retry_on_ratelimit
+from .name_extractor import NameExtractor
+
+_PROMPT = PromptTemplate.from_template(
+    """You will be given a numbered list of search results, each from a different website.
+
+{results}
+
+For each website, determine if it directly represents a singular manufacturing company, and if so, the name of the
+company. Respond with a JSON object in the form
+{{"results": [{{"index": 1, "is_manufacturer": true, "company_name": "company name", "confidence": 0.9}}, ...]}},
+with an entry for every search result. "company_name" is null if the website is not a manufacturer, and "confidence"
+is a number between 0 and 1 describing how certain you are that "is_manufacturer" is correct.
+"""
+)
+
+
+class DomainVerifier(object):
+    """ Functor which classifies search results and extracts their company names with a single request.
+
+    This replaces `SiteChecker` and `NameExtractor` in the single-pass verification mode of `SearchHandler`. Each
+    assessment has a confidence, so that only uncertain manufacturers need to be double checked with
+    `SiteDoubleChecker`.
+    """
+    _chain: Runnable
+
+    def __init__(self, llm: ChatOpenAI):
+        self._chain = _PROMPT | llm.bind(response_format={"type": "json_object"}) | StrOutputParser()
+
+    @staticmethod
+    def parse(response: str, results: list[SearchResultItem],
+              strict: bool = False) -> list[Optional[SiteAssessment]]:
+        """ Parse the result from `_chain`.
+
+        Assessments are matched to the results by their index. Results which are missing from the response or which
+        were given more than one assessment are `None`. Company names are cleaned with `NameExtractor.clean_text`,
+        and a manufacturer without a name is given the name from its title (`NameExtractor.guess_name`), or is
+        `None` if there is no name in the title.
+
+        Parameters:
+            response: LLM response from `_chain`
+            results: Search results in the request
+            strict: If True, a response which is not valid JSON raises `ValidationError` instead of returning `None`
+                for every result
+
+        Returns:
+            An assessment for each search result, in the same order as the request
+        """
+        try:
+            assessments = SiteAssessmentList.model_validate_json(response).results
+        except ValidationError:
+            if strict:
+                raise
+            return [None] * len(results)
+
+        found: dict[int, list[SiteAssessment]] = {}
+        for assessment in assessments:
+            found.setdefault(assessment.index, []).append(assessment)
+
+        parsed = []
+        for index, result in enumerate(results, start=1):
+            assessment = found.get(index)
+            if assessment is None or len(assessment) != 1:
+                parsed.append(None)
+                continue
+            assessment = assessment[0]
+            if assessment.is_manufacturer:
+                name = NameExtractor.clean_text(assessment.company_name or '')
+                name = name or NameExtractor.guess_name(result.title, result.link)
+                assessment = assessment.model_copy(update={'company_name': name}) if name else None
+            parsed.append(assessment)
+        return parsed
+
+    @retry_on_ratelimit()
+    async def __call__(self, results: list[SearchResultItem]) -> list[Optional[SiteAssessment]]:
+        """ Assess several search results with a single request.
+
+        Parameters:
+            results: Search results to assess. Each result should be from a different domain.
+
+        Returns:
+            For each search result: the assessment, or None if the result could not be assessed and should be
+            checked with the staged verification
+        """
+        if not results:
+            return []
+        try:
+            return await invoke_parsed(self._chain, {'results': format_numbered_results(results)},
+                                       lambda response: self.parse(response, results, strict=True))
+        except ValidationError:
+            return [None] * len(results)
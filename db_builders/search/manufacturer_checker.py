@@ -5,7 +5,7 @@ from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 
 from db_builders.base_search import BaseSearchHandler
-from db_builders.utils import retry_on_ratelimit
+from db_builders.utils import invoke_parsed, retry_on_ratelimit
 
 load_dotenv()
 
@@ -60,8 +60,7 @@ class SiteDoubleChecker(BaseSearchHandler):
         Returns:
             True if site is a manufacturer site, False otherwise
         """
-        response = await self._chain.ainvoke({'search_results': results})
-        return self.is_manufacturer(response)
+        return await invoke_parsed(self._chain, {'search_results': results}, self.is_manufacturer)
 
     async def __call__(self, site: str) -> bool:
         """ Check if a site is a manufacturer site.
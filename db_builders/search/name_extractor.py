@@ -1,12 +1,16 @@
 import asyncio
+import re
+from typing import Optional
+from urllib.parse import urlparse
 
 from langchain.schema.runnable import Runnable
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
-from openai import RateLimitError
+from pydantic_core import ValidationError
 
-from db_builders.utils import retry_on_ratelimit
+from db_builders.typedefs import CompanyNameList, SearchResultItem
+from db_builders.utils import format_numbered_results, invoke_parsed, retry_on_ratelimit
 
 _PROMPT = PromptTemplate.from_template(
     """You will be given the title, description, and URL of a company website.
@@ -19,15 +23,59 @@ Infer and extract the name of the company. Only return the name of the company.
 """
 )
 
+_BATCH_PROMPT = PromptTemplate.from_template(
+    """You will be given a numbered list of company websites, each with a title, URL, and description.
+
+{results}
+
+Infer and extract the name of the company for each website. Respond with a JSON object in the form
+{{"names": [{{"index": 1, "name": "company name"}}, ...]}}, with an entry for every website.
+"""
+)
+
+# separators between the parts of a page title (ie: "Products | Acme Corp")
+_TITLE_SEPARATORS = re.compile(r"\s*[|:·•]+\s*|\s+[-–—]+\s+")
+
+# words which may follow the name of a company in a title without appearing in its domain
+_COMPANY_SUFFIXES = {'inc', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company', 'group', 'gmbh',
+                     'industries', 'manufacturing', 'mfg', 'international', 'usa'}
+
+# second-level labels which are part of a country's top-level domain (ie: "acme.co.uk")
+_SECOND_LEVEL_DOMAINS = {'co', 'com', 'net', 'org', 'ac', 'gov'}
+
+
+def _compact(text: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+def _domain_label(url: str) -> str:
+    """ Get the label of a URL's registered domain.
+
+    Examples:
+        >>> _domain_label('https://www.acme-corp.co.uk/about')
+        'acme-corp'
+    """
+    labels = (urlparse(url).hostname or '').split('.')
+    if len(labels) >= 3 and labels[-2] in _SECOND_LEVEL_DOMAINS:
+        return labels[-3]
+    return labels[-2] if len(labels) >= 2 else labels[0]
+
 
 class NameExtractor(object):
+    """ Functor which extracts the name of a company from a search result.
+
+    `extract_batch` extracts names for many search results, using `guess_name` where possible and a single request
+    for the rest. Calling the functor extracts a single name with a single request.
+    """
     _chain: Runnable
+    _batch_chain: Runnable
 
     def __init__(self, llm: ChatOpenAI):
         self._chain = _PROMPT | llm | StrOutputParser()
+        self._batch_chain = _BATCH_PROMPT | llm.bind(response_format={"type": "json_object"}) | StrOutputParser()
 
     @staticmethod
-    def _clean_text(name: str) -> str:
+    def clean_text(name: str) -> str:
         """ Remove GPT artifacts from the output.
 
         GPT has a tendency to:
@@ -36,21 +84,110 @@ class NameExtractor(object):
         - surround text with quotation marks
         """
         cleaned = name.replace("The name of the company is ", "")
-        cleaned = cleaned.replace("\"", "")
-        if cleaned[-1] == '.':
+        cleaned = cleaned.replace("\"", "").strip()
+        if cleaned.endswith('.'):
             cleaned = cleaned[:-1]
 
         return cleaned
 
+    @staticmethod
+    def guess_name(title: str, url: str) -> Optional[str]:
+        """ Find the company name in a title without using the LLM.
+
+        The title is split into parts (ie: "Industrial Widgets | Acme Corp") and a part is used as the name if it
+        matches the domain of the URL, optionally followed by a company suffix such as "Inc" or "Corporation".
+
+        Returns:
+            The name, or `None` if no part of the title is confidently the company name.
+
+        Examples:
+            >>> NameExtractor.guess_name('Industrial Widgets | Acme Corp', 'https://www.acme.com')
+            'Acme Corp'
+            >>> NameExtractor.guess_name('Industrial Widgets', 'https://www.acme.com') is None
+            True
+        """
+        label = _compact(_domain_label(url))
+        if len(label) < 3:
+            return None
+
+        for part in _TITLE_SEPARATORS.split(title):
+            part = part.strip()
+            words = part.split()
+            # remove company suffixes from the end of the part
+            while len(words) > 1 and _compact(words[-1]) in _COMPANY_SUFFIXES:
+                words = words[:-1]
+            if words and _compact(' '.join(words)) == label:
+                return part
+        return None
+
+    @classmethod
+    def parse_batch(cls, response: str, count: int, strict: bool = False) -> list[Optional[str]]:
+        """ Parse the result from `_batch_chain`.
+
+        Names are matched to the results by their index. Results which are missing from the response, which were
+        given more than one name, or whose name is empty are `None`.
+
+        Parameters:
+            response: LLM response from `_batch_chain`
+            count: Number of search results in the request
+            strict: If True, a response which is not valid JSON raises `ValidationError` instead of returning `None`
+                for every result
+
+        Returns:
+            A name for each search result, in the same order as the request
+        """
+        try:
+            names = CompanyNameList.model_validate_json(response).names
+        except ValidationError:
+            if strict:
+                raise
+            return [None] * count
+
+        found: dict[int, list[str]] = {}
+        for name in names:
+            found.setdefault(name.index, []).append(cls.clean_text(name.name))
+
+        parsed = []
+        for index in range(1, count + 1):
+            name = found.get(index)
+            parsed.append(name[0] if name is not None and len(name) == 1 and name[0] else None)
+        return parsed
+
+    @retry_on_ratelimit()
+    async def _extract_batch(self, results: list[SearchResultItem]) -> list[Optional[str]]:
+        try:
+            return await invoke_parsed(self._batch_chain, {'results': format_numbered_results(results)},
+                                       lambda response: self.parse_batch(response, len(results), strict=True))
+        except ValidationError:
+            return [None] * len(results)
+
+    async def extract_batch(self, results: list[SearchResultItem]) -> list[str]:
+        """ Extract the names of the companies for several search results.
+
+        Names which can be found in the title are used directly. The rest are extracted with a single request, and
+        any result which is missing from the response is extracted on its own.
+
+        Returns:
+            A name for each search result, in the same order
+        """
+        names = [self.guess_name(result.title, result.link) for result in results]
+        unknown = [i for i, name in enumerate(names) if name is None]
+        if unknown:
+            extracted = await self._extract_batch([results[i] for i in unknown])
+            for i, name in zip(unknown, extracted):
+                names[i] = name
+
+        missing = [i for i, name in enumerate(names) if name is None]
+        extracted = await asyncio.gather(*[self(results[i].title, results[i].link, results[i].snippet)
+                                           for i in missing])
+        for i, name in zip(missing, extracted):
+            names[i] = name
+        return names
+
     @retry_on_ratelimit()
     async def __call__(self, title: str, url: str, description: str) -> str:
         """ Extract the name of a company from a search result. """
-        while True:
-            try:
-                response = await self._chain.ainvoke({'title': title, 'url': url, 'description': description})
-                break
-            except RateLimitError:
-                await asyncio.sleep(15)
-
-        cleaned = self._clean_text(response)
+        response = await self._chain.ainvoke({'title': title, 'url': url, 'description': description})
+
+        cleaned = self.clean_text(response)
         return cleaned
@@ -1,13 +1,22 @@
 import asyncio
 import csv
+import os
 from pathlib import Path
 
 from db_builders.llm import GPT3_LOW_T
+from db_builders.cache import DOMAIN_INDEX, LLM_CACHE, SEARCH_CACHE
+from db_builders.session import SESSION_POOL
+from db_builders.rate_limit import CSE_LIMITER, OPENAI_LIMITER
+from db_builders.retry import FATAL_RUN_ERRORS
+from db_builders.scheduling import run_pool
 from db_builders.search.search_handler import SearchHandler
+from db_builders.storage import RESULT_STORE
 from db_builders.typedefs import Manufacturer, Omniclass
 
 
 MANUFACTURER_SAVE_PATH = Path('data/manufacturers')
+# maximum number of omniclasses being searched at once
+CONCURRENCY = int(os.getenv('MANUFACTURER_SEARCH_CONCURRENCY', 3))
 
 
 async def _search_for_manufacturers(omniclass: Omniclass,
@@ -15,7 +24,8 @@ async def _search_for_manufacturers(omniclass: Omniclass,
                                     num_results: int = 100):
     """ Search for manufacturers for a given omniclass.
 
-    This is used as a coroutine in `manufacturer_search_runtime` to execute in parallel.
+    This is used as a coroutine in `manufacturer_search_runtime` to execute in parallel. Results are saved as soon
+    as the search is finished.
 
     Parameters:
         `omniclass`: The omniclass to search for.
@@ -23,49 +33,91 @@ async def _search_for_manufacturers(omniclass: Omniclass,
         `num_results`: The number of results to search for. Defaults to 1000.
     """
     print(f"Getting manufacturers for {omniclass}")
-    results = await handler(omniclass.name, num_results)
+    try:
+        results = await handler(omniclass.name, num_results)
+    except FATAL_RUN_ERRORS:
+        raise
+    except Exception as e:
+        print(f"\u2514 Skipping {omniclass}: {e}\n")
+        return
     _save_manufacturers(omniclass, results)
 
 
+def _manufacturer_save_path(omniclass: Omniclass) -> Path:
+    return MANUFACTURER_SAVE_PATH.joinpath(f"{omniclass} manufacturers.csv")
+
+
 def _save_manufacturers(omniclass: Omniclass, manufacturers: list[Manufacturer]):
     """ Save manufacturers to a CSV file.
 
     The CSV file will be saved in the `data/manufacturers` directory and named appropriately
-    based on the `omniclass` parameter.
+    based on the `omniclass` parameter. The file is written to a temporary file first, so an existing CSV file
+    always represents a finished search. If `RESULT_STORE` is enabled, manufacturers are saved there instead.
 
     Parameters:
         `omniclass`: The omniclass to save manufacturers for.
         `manufacturers`: The list of manufacturers to save.
     """
+    if RESULT_STORE is not None:
+        RESULT_STORE.save_manufacturers(omniclass, manufacturers)
+        print(f"\u2514 Saved to {RESULT_STORE.path}.\n")
+        return
+
     # save manufacturers to CSV
-    save_path = MANUFACTURER_SAVE_PATH.joinpath(f"{omniclass} manufacturers.csv")
-    with open(save_path, 'w') as f:
+    save_path = _manufacturer_save_path(omniclass)
+    tmp_path = save_path.with_name(save_path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
         writer = csv.writer(f)
         writer.writerow(['company name', 'url'])
         for manufacturer in manufacturers:
             writer.writerow([manufacturer.title, manufacturer.url])
+    os.replace(tmp_path, save_path)
 
     print(f"\u2514 Saved CSV file.\n")
 
 
-async def manufacturer_search_runtime(omniclasses: list[Omniclass]):
+def _remaining_omniclasses(omniclasses: list[Omniclass]) -> list[Omniclass]:
+    """ Get the omniclasses which do not have saved manufacturers yet. """
+    if RESULT_STORE is not None:
+        return [omniclass for omniclass in omniclasses if not RESULT_STORE.has_manufacturers(omniclass)]
+    return [omniclass for omniclass in omniclasses if not _manufacturer_save_path(omniclass).is_file()]
+
+
+async def manufacturer_search_runtime(omniclasses: list[Omniclass], concurrency: int = CONCURRENCY,
+                                      resume: bool = True):
     """ Find all manufacturers and save the data to a CSV file.
 
     This is the main entry point for the manufacturer search runtime and should be the only function
     called in `main.py`.
 
+    Up to `concurrency` omniclasses are searched at a time, and each one is saved as soon as it is finished. Fewer
+    omniclasses are searched at once while either OpenAI or the Google API is rate limiting requests.
+
     Parameters:
         `omniclasses`: The list of omniclasses to search for.
-        `llm`: The LLM instance to use for checking search results.
+        `concurrency`: The maximum number of omniclasses to search at once.
+        `resume`: If `True`, omniclasses which already have a manufacturer CSV file are skipped. Otherwise, every
+            omniclass is searched again and existing files are overwritten.
     """
     # create directory if it does not exist
     MANUFACTURER_SAVE_PATH.mkdir(parents=True, exist_ok=True)
 
+    if resume:
+        remaining = _remaining_omniclasses(omniclasses)
+        print(f"Skipping {len(omniclasses) - len(remaining)} omniclasses which have already been searched.")
+        omniclasses = remaining
+
     # search for manufacturers
     handler = SearchHandler(GPT3_LOW_T)
-    for omniclass in omniclasses:
-        await _search_for_manufacturers(omniclass, handler, 100)
+    try:
+        await run_pool(omniclasses, lambda omniclass: _search_for_manufacturers(omniclass, handler, 100),
+                       concurrency, limiters=[OPENAI_LIMITER, CSE_LIMITER])
+    finally:
+        await SESSION_POOL.close()
 
     # print the number of products that were processed
     print(f"\nProcessed {len(omniclasses)} products.")
+    print(f"Search cache: {SEARCH_CACHE.stats()}")
+    print(f"LLM cache: {LLM_CACHE.stats()}")
+    print(f"Domain index: {DOMAIN_INDEX.stats()}")
     print("Done!")
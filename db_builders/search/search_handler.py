@@ -1,22 +1,53 @@
 import asyncio
+import os
+from collections import Counter
 from datetime import datetime
-from typing import List
+from typing import Any, AsyncIterator, ClassVar, List, Optional, TypeVar
 
 from langchain_openai import ChatOpenAI
 
 from db_builders.base_search import BaseSearchHandler
-from db_builders.typedefs import Manufacturer
-from db_builders.utils import strip_url, filter_results
+from db_builders.cache import DomainIndex, DOMAIN_INDEX
+from db_builders.scheduling import batched, flatten, stream_map
+from db_builders.typedefs import Manufacturer, SearchResultItem
+from db_builders.utils import strip_url, is_excluded, normalize_domain
+from .domain_verifier import DomainVerifier
 from .manufacturer_checker import SiteDoubleChecker
 from .name_extractor import NameExtractor
 from .site_checker import SiteChecker
 
+T = TypeVar('T')
+
 
 class SearchHandler(BaseSearchHandler):
-    """ Functor which conducts a search of manufacturers and returns the results which represent companies. """
+    """ Functor which conducts a search of manufacturers and returns the results which represent companies.
+
+    Verdicts are recorded per domain in `domain_index` and consulted before any stage spends an API call. Set
+    `domain_index` to `None` to always check every result.
+
+    `VERIFICATION_MODE` selects how results are verified. 'staged' checks each result with `SiteChecker`, then
+    `NameExtractor`, then `SiteDoubleChecker`. 'single-pass' classifies results and extracts their names with a single
+    `DomainVerifier` request, and only double checks manufacturers whose confidence is below `CONFIDENCE_THRESHOLD`.
+    """
     _site_checker: SiteChecker
     _name_extractor: NameExtractor
     _site_verifier: SiteDoubleChecker
+    _domain_verifier: DomainVerifier
+
+    SITE_CHECK_CONCURRENCY: ClassVar[int] = 10
+    # number of results classified by `SiteChecker` in a single request. `1` checks each result on its own.
+    SITE_CHECK_BATCH_SIZE: ClassVar[int] = 10
+    NAME_EXTRACTION_CONCURRENCY: ClassVar[int] = 10
+    # number of results whose company name is extracted by `NameExtractor` in a single request
+    NAME_EXTRACTION_BATCH_SIZE: ClassVar[int] = 10
+    VERIFICATION_CONCURRENCY: ClassVar[int] = 5
+    VERIFICATION_MODE: ClassVar[str] = os.getenv('MANUFACTURER_VERIFICATION', 'staged').lower()
+    # single-pass manufacturers with a lower confidence are double checked with `SiteDoubleChecker`
+    CONFIDENCE_THRESHOLD: ClassVar[float] = float(os.getenv('VERIFICATION_CONFIDENCE_THRESHOLD', 0.8))
+    domain_index: ClassVar[Optional[DomainIndex]] = DOMAIN_INDEX
+    # which result to keep when several results are on the same domain: 'rank' keeps the highest ranked result and
+    # 'snippet' keeps the result with the longest snippet. 'snippet' has to wait for the whole search to finish.
+    KEEP_DUPLICATE: ClassVar[str] = 'rank'
 
     def __init__(self, llm: ChatOpenAI):
         super().__init__()
@@ -24,104 +55,256 @@ class SearchHandler(BaseSearchHandler):
         self._site_checker = SiteChecker(llm)
         self._name_extractor = NameExtractor(llm)
         self._site_verifier = SiteDoubleChecker(llm)
+        self._domain_verifier = DomainVerifier(llm)
 
-    @staticmethod
-    def _deduplicate_manufacturers(results: list[Manufacturer]) -> list[Manufacturer]:
-        """ Deduplicate manufacturers based on URL
-
-        Parameters:
-            results: List of manufacturers to deduplicate
+    async def _search(self, omniclass_name: str, num_results: int) -> AsyncIterator[tuple[int, SearchResultItem]]:
+        """ Stream search results along with their rank. """
+        search_query = f"{omniclass_name} manufacturers"
+        rank = 0
+        async for result in self.stream_search(search_query, num_results):
+            rank += 1
+            yield rank, result
 
-        Returns:
-            List of manufacturers with duplicates removed
+    @staticmethod
+    async def _filter(source: AsyncIterator[tuple[int, SearchResultItem]]
+                      ) -> AsyncIterator[tuple[int, SearchResultItem]]:
+        """ Perform a keyword filter to remove irrelevant results. """
+        async for rank, result in source:
+            if not is_excluded(result):
+                yield rank, result
+
+    def _lookup(self, url: str, field: str) -> Any:
+        """ Get a single recorded field for the domain of a URL from `domain_index`.
+
+        The index is keyed by `normalize_domain`, the same key `_deduplicate` uses, so results which were deduplicated
+        together share a verdict.
+        """
+        if self.domain_index is None:
+            return None
+        verdict = self.domain_index.lookup(normalize_domain(url))
+        return getattr(verdict, field) if verdict is not None else None
+
+    def _record(self, url: str, **fields) -> None:
+        if self.domain_index is not None:
+            self.domain_index.record(normalize_domain(url), **fields)
+
+    async def _check_site(self, ranked: tuple[int, SearchResultItem]) -> Optional[tuple[int, SearchResultItem]]:
+        """ Drop results which do not represent a manufacturer site. """
+        _, result = ranked
+        is_manufacturer = self._lookup(result.link, 'is_manufacturer')
+        if is_manufacturer is None:
+            is_manufacturer = await self._site_checker(result.title, result.link, result.snippet)
+            self._record(result.link, is_manufacturer=is_manufacturer)
+        return ranked if is_manufacturer else None
+
+    async def _check_sites(self, batch: list[tuple[int, SearchResultItem]]) -> list[tuple[int, SearchResultItem]]:
+        """ Drop results which do not represent a manufacturer site, classifying the batch with a single request.
+
+        Results which the batched request could not classify are checked on their own.
         """
-        urls = []
-        deduplicated_results = []
-        for result in results:
-            if result.url not in urls:
-                urls.append(result.url)
-                deduplicated_results.append(result)
+        verdicts = {}
+        # several results may be on the same domain when `KEEP_DUPLICATE` does not remove them
+        unknown: dict[str, SearchResultItem] = {}
+        for _, result in batch:
+            domain = normalize_domain(result.link)
+            if domain not in verdicts:
+                verdicts[domain] = self._lookup(result.link, 'is_manufacturer')
+                if verdicts[domain] is None:
+                    unknown[domain] = result
+
+        results = list(unknown.values())
+        classified = await self._site_checker.check_batch(results) if results else []
+        fallback = [result for result, verdict in zip(results, classified) if verdict is None]
+        checked = iter(await asyncio.gather(*[self._site_checker(result.title, result.link, result.snippet)
+                                              for result in fallback]))
+        for domain, verdict in zip(unknown, classified):
+            if verdict is None:
+                verdict = next(checked)
+            verdicts[domain] = verdict
+            self._record(unknown[domain].link, is_manufacturer=verdict)
+
+        return [ranked for ranked in batch if verdicts[normalize_domain(ranked[1].link)]]
+
+    async def _extract_name(self, ranked: tuple[int, SearchResultItem]) -> tuple[int, Manufacturer]:
+        """ Create a `Manufacturer` from a result. """
+        rank, result = ranked
+        name = self._lookup(result.link, 'company_name')
+        if name is None:
+            name = await self._name_extractor(result.title, result.link, result.snippet)
+            self._record(result.link, company_name=name)
+        return rank, Manufacturer(title=name, url=strip_url(result.link))
+
+    async def _extract_names(self, batch: list[tuple[int, SearchResultItem]]) -> list[tuple[int, Manufacturer]]:
+        """ Create a `Manufacturer` from each result, extracting the names with a single request. """
+        names = {}
+        unknown: dict[str, SearchResultItem] = {}
+        for _, result in batch:
+            domain = normalize_domain(result.link)
+            if domain not in names:
+                names[domain] = self._lookup(result.link, 'company_name')
+                if names[domain] is None:
+                    unknown[domain] = result
+
+        extracted = await self._name_extractor.extract_batch(list(unknown.values())) if unknown else []
+        for domain, name in zip(unknown, extracted):
+            names[domain] = name
+            self._record(unknown[domain].link, company_name=name)
+
+        return [(rank, Manufacturer(title=names[normalize_domain(result.link)], url=strip_url(result.link)))
+                for rank, result in batch]
+
+    async def _assess_site(self, result: SearchResultItem) -> Optional[str]:
+        """ Check a single result with the staged verification, returning its name if it is a manufacturer. """
+        is_manufacturer = await self._site_checker(result.title, result.link, result.snippet)
+        self._record(result.link, is_manufacturer=is_manufacturer)
+        if not is_manufacturer:
+            return None
+        name = await self._name_extractor(result.title, result.link, result.snippet)
+        self._record(result.link, company_name=name)
+        return name
+
+    async def _assess_sites(self, batch: list[tuple[int, SearchResultItem]]) -> list[tuple[int, Manufacturer]]:
+        """ Create a `Manufacturer` for each result which represents a manufacturer site, with a single request.
+
+        Manufacturers assessed with at least `CONFIDENCE_THRESHOLD` confidence are accepted directly and the rest are
+        double checked with `_verify`. Results which `DomainVerifier` could not assess are checked with the staged
+        verification.
+        """
+        names: dict[str, Optional[str]] = {}
+        confident = set()
+        unknown: dict[str, SearchResultItem] = {}
+        for _, result in batch:
+            domain = normalize_domain(result.link)
+            if domain in names or domain in unknown:
+                continue
+            is_manufacturer = self._lookup(result.link, 'is_manufacturer')
+            name = self._lookup(result.link, 'company_name')
+            if is_manufacturer is False:
+                names[domain] = None
+            elif is_manufacturer and name is not None:
+                names[domain] = name
+            else:
+                unknown[domain] = result
+
+        results = list(unknown.values())
+        assessments = await self._domain_verifier(results) if results else []
+        fallback = [result for result, assessment in zip(results, assessments) if assessment is None]
+        checked = iter(await asyncio.gather(*[self._assess_site(result) for result in fallback]))
+        for domain, assessment in zip(unknown, assessments):
+            if assessment is None:
+                names[domain] = next(checked)
+                continue
+            fields = {'is_manufacturer': assessment.is_manufacturer, 'confidence': assessment.confidence}
+            if assessment.is_manufacturer:
+                fields['company_name'] = assessment.company_name
+                if assessment.confidence >= self.CONFIDENCE_THRESHOLD:
+                    fields['verified'] = True
+                    confident.add(domain)
+            self._record(unknown[domain].link, **fields)
+            names[domain] = assessment.company_name if assessment.is_manufacturer else None
+
+        manufacturers = [(rank, Manufacturer(title=names[normalize_domain(result.link)], url=strip_url(result.link)))
+                         for rank, result in batch if names[normalize_domain(result.link)] is not None]
+        verified = await asyncio.gather(*[self._verify(ranked) for ranked in manufacturers
+                                          if normalize_domain(ranked[1].url) not in confident])
+        return [ranked for ranked in manufacturers if normalize_domain(ranked[1].url) in confident] + \
+            [ranked for ranked in verified if ranked is not None]
+
+    async def _deduplicate(self, source: AsyncIterator[tuple[int, SearchResultItem]]
+                           ) -> AsyncIterator[tuple[int, SearchResultItem]]:
+        """ Keep a single result per normalized domain, according to `KEEP_DUPLICATE`.
+
+        This runs before any LLM stage so that each domain is only classified once.
+        """
+        if self.KEEP_DUPLICATE == 'rank':
+            # results arrive in rank order, so the first result for a domain is the best ranked one
+            seen = set()
+            async for rank, result in source:
+                domain = normalize_domain(result.link)
+                if domain not in seen:
+                    seen.add(domain)
+                    yield rank, result
+        elif self.KEEP_DUPLICATE == 'snippet':
+            best: dict[str, tuple[int, SearchResultItem]] = {}
+            async for rank, result in source:
+                domain = normalize_domain(result.link)
+                if domain not in best or len(result.snippet) > len(best[domain][1].snippet):
+                    best[domain] = (rank, result)
+            for ranked in sorted(best.values(), key=lambda item: item[0]):
+                yield ranked
+        else:
+            raise ValueError(f"Invalid value for `KEEP_DUPLICATE`: {self.KEEP_DUPLICATE}")
+
+    async def _verify(self, ranked: tuple[int, Manufacturer]) -> Optional[tuple[int, Manufacturer]]:
+        """ Double check that the manufacturer site is valid. """
+        _, manufacturer = ranked
+        verified = self._lookup(manufacturer.url, 'verified')
+        if verified is None:
+            verified = await self._site_verifier(manufacturer.url)
+            self._record(manufacturer.url, verified=verified)
+        return ranked if verified else None
 
-        return deduplicated_results
+    @staticmethod
+    async def _count(source: AsyncIterator[T], counts: Counter, key: str) -> AsyncIterator[T]:
+        """ Count the items passing between two stages. """
+        async for item in source:
+            counts[key] += 1
+            yield item
 
     async def __call__(self, omniclass_name: str, num_results: int = 1000) -> List[Manufacturer]:
         """ Conduct a search of manufacturers and return the results which represent companies.
 
-        Parameters:
-            omniclass_name: Query to search for
-
-        Returns:
-            List of manufacturers objects which offer the given omniclass_name
-        """
-
-        print(f"\u2514 Began process at {datetime.now().strftime('%H:%M:%S')}")
+        The search is performed as a streaming pipeline:
 
-        # get search results
-        search_query = f"{omniclass_name} manufacturers"
-
-        print("\u2514 Performing search... ")
-        results = await self.perform_search(search_query, num_results)
-
-        print(f"  - Got {len(results)} results.")
-
-        # perform a keyword filter to remove irrelevant results
-        results = filter_results(results)
-
-        print(f"  - Filtered results down to {len(results)}")
-
-        # check if each site is a manufacturer in batches of 10
-        print("\u2514 Checking which results are manufacturer sites... ")
-
-        valid_sites = []
-        batch_size = 10
-        for i in range(0, len(results), batch_size):
-            print(f"  - Checking batch {i // batch_size + 1} of {len(results) // batch_size + 1}")
-            tasks = []
-            for result in results[i:i + batch_size]:
-                tasks.append(self._site_checker(result.title, result.link, result.snippet))
-            valid_sites.extend(await asyncio.gather(*tasks))
-
-        print("  - Done!")
-
-        # filter out non-manufacturer sites and extract names
-        print("\u2514 Creating Manufacturer objects... ")
-
-        urls = []
-        name_tasks = []
-        for result, is_manufacturer in zip(results, valid_sites):
-            if is_manufacturer:
-                name_tasks.append(self._name_extractor(result.title, result.link, result.snippet))
-                urls.append(result.link)
+            search -> keyword filter -> deduplicate -> `SiteChecker` -> `NameExtractor` -> `SiteDoubleChecker`
 
-        print(f"  - Awaiting {len(name_tasks)} name tasks... ")
+        In the 'single-pass' `VERIFICATION_MODE`, the `SiteChecker` and `NameExtractor` stages are replaced by a single
+        `DomainVerifier` stage, which double checks uncertain manufacturers with `SiteDoubleChecker` itself.
 
-        manufacturer_names = await asyncio.gather(*name_tasks)
+        Each of the LLM stages is skipped for domains which already have a verdict in `domain_index`.
 
-        # create manufacturer objects
-        print("  - Creating manufacturer objects and deduplicating results... ")
+        Each result moves to the next stage as soon as it is ready, with at most `SITE_CHECK_CONCURRENCY`,
+        `NAME_EXTRACTION_CONCURRENCY` and `VERIFICATION_CONCURRENCY` calls in flight for the respective stages.
+        `SiteChecker` classifies `SITE_CHECK_BATCH_SIZE` results per request, and `NameExtractor` extracts up to
+        `NAME_EXTRACTION_BATCH_SIZE` names per request.
 
-        manufacturers = []
-        for name, url in zip(manufacturer_names, urls):
-            stripped_url = strip_url(url)
-            manufacturers.append(Manufacturer(title=name, url=stripped_url))
-
-        # deduplicate manufacturers
-        manufacturers = self._deduplicate_manufacturers(manufacturers)
-
-        print("  - Done")
-
-        # double check that manufacturers are valid
-        print("\u2514 Double checking manufacturers... ")
-        tasks = []
-        for manufacturer in manufacturers:
-            tasks.append(self._site_verifier(manufacturer.url))
-
-        valid_manufacturers = await asyncio.gather(*tasks)
-
-        print("  - Validated sites!")
+        Parameters:
+            omniclass_name: Query to search for
 
-        manufacturers = [manufacturer for manufacturer, is_valid in zip(manufacturers, valid_manufacturers) if is_valid]
+        Returns:
+            List of manufacturers objects which offer the given omniclass_name, in search rank order
+        """
 
-        print(f"\u2514 Returning {len(manufacturers)} manufacturers.\n")
+        print(f"\u2514 Began process for {omniclass_name} at {datetime.now().strftime('%H:%M:%S')}")
+        counts = Counter()
+
+        results = self._count(self._search(omniclass_name, num_results), counts, 'results')
+        filtered = self._count(self._filter(results), counts, 'filtered')
+        unique = self._count(self._deduplicate(filtered), counts, 'unique')
+        if self.VERIFICATION_MODE == 'single-pass':
+            verified = self._count(flatten(stream_map(batched(unique, self.SITE_CHECK_BATCH_SIZE), self._assess_sites,
+                                                      self.SITE_CHECK_CONCURRENCY)), counts, 'manufacturer sites')
+        elif self.VERIFICATION_MODE == 'staged':
+            if self.SITE_CHECK_BATCH_SIZE > 1:
+                sites = flatten(stream_map(batched(unique, self.SITE_CHECK_BATCH_SIZE), self._check_sites,
+                                           self.SITE_CHECK_CONCURRENCY))
+            else:
+                sites = stream_map(unique, self._check_site, self.SITE_CHECK_CONCURRENCY)
+            if self.NAME_EXTRACTION_BATCH_SIZE > 1:
+                named = flatten(stream_map(batched(sites, self.NAME_EXTRACTION_BATCH_SIZE), self._extract_names,
+                                           self.NAME_EXTRACTION_CONCURRENCY))
+            else:
+                named = stream_map(sites, self._extract_name, self.NAME_EXTRACTION_CONCURRENCY)
+            named = self._count(named, counts, 'manufacturer sites')
+            verified = stream_map(named, self._verify, self.VERIFICATION_CONCURRENCY)
+        else:
+            raise ValueError(f"Invalid value for `VERIFICATION_MODE`: {self.VERIFICATION_MODE}")
+
+        ranked = sorted([item async for item in verified], key=lambda item: item[0])
+        manufacturers = [manufacturer for _, manufacturer in ranked]
+
+        print(f"\u2514 {omniclass_name}: got {counts['results']} results, {counts['filtered']} after filtering, "
+              f"{counts['unique']} unique domains, {counts['manufacturer sites']} manufacturer sites.")
+        print(f"\u2514 Returning {len(manufacturers)} manufacturers for {omniclass_name}.\n")
 
         return manufacturers
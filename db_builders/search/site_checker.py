@@ -1,9 +1,13 @@
+from typing import Optional
+
 from langchain.schema.runnable import Runnable
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
+from pydantic_core import ValidationError
 
-from db_builders.utils import retry_on_ratelimit
+from db_builders.typedefs import SearchResultItem, SiteClassificationList
+from db_builders.utils import format_numbered_results, invoke_parsed, retry_on_ratelimit
 
 _DESCRIPTION_EXPAND_PROMPT = PromptTemplate.from_template(
     """ You will be given the title, URL, and description of a search result.
@@ -27,15 +31,88 @@ and 'not manufacturer' if it does not directly represent a manufacturing company
 """
 )
 
+_BATCH_PROMPT = PromptTemplate.from_template(
+    """You will be given a numbered list of search results. For each one, determine if it directly represents a
+webpage for a singular manufacturing company.
+
+{results}
+
+Respond with a JSON object in the form {{"results": [{{"index": 1, "verdict": "manufacturer"}}, ...]}}, with an entry
+for every search result. The verdict is 'manufacturer' if the result directly represents a manufacturing company
+website, 'not manufacturer' if it does not, and 'unsure' if it can not be determined from the search result alone.
+"""
+)
+
 
 class SiteChecker(object):
     """ Functor which checks if a search result is a valid site by examining the `title`, `url`, and `description`.
+
+    `check_batch` classifies many search results with a single request. Calling the functor checks a single result
+    with two requests (an explanation of the result, then a classification of the explanation), which is used for
+    results the batched check is unsure about.
     """
     _chain: Runnable
+    _batch_chain: Runnable
 
     def __init__(self, llm: ChatOpenAI):
         expand_chain = _DESCRIPTION_EXPAND_PROMPT | llm | StrOutputParser()
         self._chain = {'explanation': expand_chain} | _IS_MANUFACTURER_PROMPT | llm | StrOutputParser()
+        self._batch_chain = _BATCH_PROMPT | llm.bind(response_format={"type": "json_object"}) | StrOutputParser()
+
+    @staticmethod
+    def parse_batch(response: str, count: int, strict: bool = False) -> list[Optional[bool]]:
+        """ Parse the result from `_batch_chain`.
+
+        Verdicts are matched to the results by their index. Results which are missing from the response, which were
+        given more than one verdict, or which the model is unsure about are `None`.
+
+        Parameters:
+            response: LLM response from `_batch_chain`
+            count: Number of search results in the request
+            strict: If True, a response which is not valid JSON raises `ValidationError` instead of returning `None`
+                for every result
+
+        Returns:
+            A verdict for each search result, in the same order as the request
+        """
+        try:
+            classifications = SiteClassificationList.model_validate_json(response).results
+        except ValidationError:
+            if strict:
+                raise
+            return [None] * count
+
+        verdicts: dict[int, list[str]] = {}
+        for classification in classifications:
+            verdicts.setdefault(classification.index, []).append(classification.verdict)
+
+        parsed = []
+        for index in range(1, count + 1):
+            verdict = verdicts.get(index)
+            if verdict is None or len(verdict) != 1 or verdict[0] == 'unsure':
+                parsed.append(None)
+            else:
+                parsed.append(verdict[0] == 'manufacturer')
+        return parsed
+
+    @retry_on_ratelimit()
+    async def check_batch(self, results: list[SearchResultItem]) -> list[Optional[bool]]:
+        """ Check if several search results are manufacturer sites with a single request.
+
+        Parameters:
+            results: Search results to check
+
+        Returns:
+            For each search result: True if it is a manufacturer site, False if it is not, and None if the result
+            could not be classified and should be checked on its own
+        """
+        if not results:
+            return []
+        try:
+            return await invoke_parsed(self._batch_chain, {'results': format_numbered_results(results)},
+                                       lambda response: self.parse_batch(response, len(results), strict=True))
+        except ValidationError:
+            return [None] * len(results)
 
     @staticmethod
     def is_manufacturer(response: str) -> bool:
@@ -68,5 +145,5 @@ class SiteChecker(object):
         Returns:
             True if site is a manufacturer site, False otherwise
         """
-        response = await self._chain.ainvoke({'title': title, 'url': url, 'description': description})
-        return self.is_manufacturer(response)
+        return await invoke_parsed(self._chain, {'title': title, 'url': url, 'description': description},
+                                   self.is_manufacturer)
@@ -0,0 +1,101 @@
+""" Process-wide HTTP session shared by every search handler.
+
+Opening a new `aiohttp.ClientSession` per search means a new connector, new TLS handshakes and new DNS lookups for
+every Google API page. Instead, a single session is lazily created and reused by all handlers. Runtimes are expected
+to call `SESSION_POOL.close()` once they are finished.
+"""
+import asyncio
+import os
+from typing import Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class SessionPool:
+    """ Owns a single keep-alive `aiohttp.ClientSession` and its connector.
+
+    The session is created on first use and bound to the running event loop. If it is requested from a different
+    loop (ie: `asyncio.run` was called again), a fresh session is created.
+    """
+    limit: int
+    limit_per_host: int
+    dns_cache_ttl: int
+    keepalive_timeout: float
+    timeout: float
+    _session: Optional[aiohttp.ClientSession]
+    _loop: Optional[asyncio.AbstractEventLoop]
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, dns_cache_ttl: int = 300,
+                 keepalive_timeout: float = 30, timeout: float = 60):
+        """ Create a session pool.
+
+        Parameters:
+            limit: Total number of simultaneous connections.
+            limit_per_host: Number of simultaneous connections to a single host.
+            dns_cache_ttl: Number of seconds that resolved DNS entries are cached for.
+            keepalive_timeout: Number of seconds an idle connection is kept open.
+            timeout: Total timeout in seconds for a single request.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session = None
+        self._loop = None
+
+    def configure(self, **kwargs) -> None:
+        """ Change the connector settings.
+
+        Settings take effect the next time a session is created, so this should be called before any searches are
+        performed, or after `close()`.
+
+        Parameters:
+            kwargs: Any of the parameters accepted by `__init__`.
+        """
+        for key, value in kwargs.items():
+            if not hasattr(self, key) or key.startswith('_'):
+                raise AttributeError(f"Unknown session setting: {key}")
+            setattr(self, key, value)
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            ssl=False,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def get(self) -> aiohttp.ClientSession:
+        """ Get the shared session, creating it if necessary.
+
+        This must be called from within a running event loop.
+
+        Returns:
+            The shared `aiohttp.ClientSession`.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = self._build_session()
+            self._loop = loop
+        return self._session
+
+    async def close(self) -> None:
+        """ Close the shared session and release all pooled connections. """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+SESSION_POOL = SessionPool(
+    limit=int(os.getenv('HTTP_CONNECTION_LIMIT', 100)),
+    limit_per_host=int(os.getenv('HTTP_CONNECTION_LIMIT_PER_HOST', 10)),
+    dns_cache_ttl=int(os.getenv('HTTP_DNS_CACHE_TTL', 300)),
+)
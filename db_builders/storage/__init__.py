@@ -0,0 +1,3 @@
+""" Durable storage for generated results. """
+from .csv_writer import AppendOnlyCsvWriter
+from .result_store import ResultStore, RESULT_STORE
@@ -0,0 +1,129 @@
+import csv
+import io
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence, TextIO
+
+
+class AppendOnlyCsvWriter:
+    """ Streaming CSV writer which only ever appends new rows to the end of the file.
+
+    Each call to `write_rows` appends a batch with a single write, which is flushed and fsync'd before returning. The
+    cost of a batch only depends on the size of the batch, and rows which have been written are never rewritten, so a
+    crash can lose at most the batch which was being written.
+
+    Every row ends with a line terminator, so a row which was only partially written is the last row of the file
+    and has no line terminator. It is skipped by `read_rows`, and is removed when the file is reopened for writing or
+    compacted.
+    """
+    path: Path
+    header: list[str]
+
+    def __init__(self, path: Path, header: Sequence[str]):
+        """ Create a writer.
+
+        Parameters:
+            path: Path of the CSV file. The file and its parent directories are created when the first row is written.
+            header: Column names. These are written once, when the file is created.
+        """
+        self.path = path
+        self.header = list(header)
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> 'AppendOnlyCsvWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def _format(rows: Iterable[Sequence[str]]) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+    def _open(self) -> TextIO:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            size = self.path.stat().st_size if self.path.is_file() else 0
+            if size:
+                with open(self.path, 'rb+') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        # remove the partially written row so that it is not merged with the next row
+                        f.seek(0)
+                        f.truncate(f.read().rfind(b'\n') + 1)
+                        f.flush()
+                        os.fsync(f.fileno())
+                size = self.path.stat().st_size
+
+            self._file = open(self.path, 'a', newline='')
+            if not size:
+                self._append(self._format([self.header]))
+        return self._file
+
+    def _append(self, text: str) -> None:
+        self._file.write(text)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def write_rows(self, rows: Iterable[Sequence[str]]) -> None:
+        """ Append a batch of rows and flush them to disk. """
+        text = self._format(rows)
+        if text:
+            self._open()
+            self._append(text)
+
+    def read_rows(self) -> Iterator[list[str]]:
+        """ Iterate over the rows which have been written, excluding the header.
+
+        A final row without a line terminator was only partially written, and is skipped along with rows which do not
+        have the same number of columns as the header.
+        """
+        if not self.path.is_file():
+            return
+        with open(self.path, 'r', newline='') as f:
+            text = f.read()
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows and not text.endswith('\n'):
+            rows.pop()
+        for row in rows:
+            if len(row) == len(self.header) and row != self.header:
+                yield row
+
+    def compact(self, key: int = 0) -> int:
+        """ Rewrite the file without partial or duplicate rows.
+
+        When several rows have the same value in the `key` column, only the last one is kept, in the position of the
+        first one. The compacted file is written to a temporary file which then replaces the original, so the
+        original is left intact if compaction is interrupted.
+
+        Returns:
+            The number of rows which were kept.
+        """
+        self.close()
+        if not self.path.is_file():
+            return 0
+
+        rows: dict[str, list[str]] = {}
+        for row in self.read_rows():
+            rows[row[key]] = row
+
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', newline='') as f:
+            f.write(self._format([self.header, *rows.values()]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(rows)
+
+    def clear(self) -> None:
+        """ Delete the file. """
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,227 @@
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from db_builders.typedefs import Manufacturer, Omniclass, Parameter
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS omniclasses (
+    id INTEGER PRIMARY KEY,
+    identifier TEXT NOT NULL UNIQUE,
+    number TEXT,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    id INTEGER PRIMARY KEY,
+    omniclass_id INTEGER NOT NULL REFERENCES omniclasses (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (omniclass_id, position)
+);
+CREATE INDEX IF NOT EXISTS parameters_name ON parameters (name);
+CREATE TABLE IF NOT EXISTS parameter_values (
+    parameter_id INTEGER NOT NULL REFERENCES parameters (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (parameter_id, position)
+);
+CREATE TABLE IF NOT EXISTS manufacturers (
+    omniclass_id INTEGER NOT NULL REFERENCES omniclasses (id) ON DELETE CASCADE,
+    rank INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (omniclass_id, rank)
+);
+CREATE INDEX IF NOT EXISTS manufacturers_url ON manufacturers (url);
+CREATE TABLE IF NOT EXISTS manufacturer_searches (
+    omniclass_id INTEGER PRIMARY KEY REFERENCES omniclasses (id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS product_pages (
+    manufacturer_name TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    product_page TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS product_pages_url ON product_pages (url);
+"""
+
+
+class ResultStore:
+    """ Single SQLite database holding every generated result.
+
+    This is an alternative to the CSV files written by each runtime. Omniclass tables, manufacturers and product
+    pages are stored in indexed tables, so results from many runs can be queried and joined directly. Each save is a
+    single transaction, so a crash never leaves a partially saved omniclass behind.
+
+    `export_csv` writes the same CSV files which the runtimes write when the store is not used.
+
+    Like `SQLiteCache`, the connection is opened lazily and access is serialized with a lock.
+    """
+    path: Path
+
+    def __init__(self, path: Path):
+        """ Create a store.
+
+        Parameters:
+            path: Path of the SQLite database file. Parent directories are created when the store is first used.
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connection
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _omniclass_id(conn: sqlite3.Connection, omniclass: Omniclass) -> int:
+        conn.execute("INSERT OR IGNORE INTO omniclasses (identifier, number, name) VALUES (?, ?, ?)",
+                     (omniclass.identifier, omniclass.number, omniclass.name))
+        return conn.execute("SELECT id FROM omniclasses WHERE identifier = ?", (omniclass.identifier,)).fetchone()[0]
+
+    def save_omniclass_table(self, omniclass: Omniclass, parameters: list[Parameter]) -> None:
+        """ Save a product's parameters and values, replacing any previously saved table. """
+        with self._transaction() as conn:
+            omniclass_id = self._omniclass_id(conn, omniclass)
+            conn.execute("DELETE FROM parameters WHERE omniclass_id = ?", (omniclass_id,))
+            for position, parameter in enumerate(parameters):
+                parameter_id = conn.execute(
+                    "INSERT INTO parameters (omniclass_id, position, name) VALUES (?, ?, ?)",
+                    (omniclass_id, position, parameter.name)).lastrowid
+                conn.executemany("INSERT INTO parameter_values (parameter_id, position, value) VALUES (?, ?, ?)",
+                                 [(parameter_id, i, value) for i, value in enumerate(parameter.values)])
+
+    def load_omniclass_table(self, omniclass: Omniclass) -> Optional[list[Parameter]]:
+        """ Load a saved table, or `None` if there is no table for `omniclass`. """
+        with self._lock:
+            conn = self._connection
+            rows = conn.execute(
+                "SELECT p.id, p.name FROM parameters p JOIN omniclasses o ON o.id = p.omniclass_id "
+                "WHERE o.identifier = ? ORDER BY p.position", (omniclass.identifier,)).fetchall()
+            if not rows:
+                return None
+            parameters = []
+            for parameter_id, name in rows:
+                values = conn.execute("SELECT value FROM parameter_values WHERE parameter_id = ? ORDER BY position",
+                                      (parameter_id,)).fetchall()
+                parameters.append(Parameter(name=name, values=[value for value, in values]))
+            return parameters
+
+    def save_manufacturers(self, omniclass: Omniclass, manufacturers: list[Manufacturer]) -> None:
+        """ Save the manufacturers found for an omniclass, in rank order, replacing any previous search. """
+        with self._transaction() as conn:
+            omniclass_id = self._omniclass_id(conn, omniclass)
+            conn.execute("DELETE FROM manufacturers WHERE omniclass_id = ?", (omniclass_id,))
+            conn.executemany("INSERT INTO manufacturers (omniclass_id, rank, name, url) VALUES (?, ?, ?, ?)",
+                             [(omniclass_id, rank, manufacturer.title, manufacturer.url)
+                              for rank, manufacturer in enumerate(manufacturers)])
+            # an omniclass may have no manufacturers, so finished searches are tracked separately
+            conn.execute("INSERT OR IGNORE INTO manufacturer_searches (omniclass_id) VALUES (?)", (omniclass_id,))
+
+    def has_manufacturers(self, omniclass: Omniclass) -> bool:
+        """ Check whether a manufacturer search has been saved for an omniclass. """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT 1 FROM manufacturer_searches s JOIN omniclasses o ON o.id = s.omniclass_id "
+                "WHERE o.identifier = ?", (omniclass.identifier,)).fetchone() is not None
+
+    def load_manufacturers(self, omniclass: Omniclass) -> list[Manufacturer]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT m.name, m.url FROM manufacturers m JOIN omniclasses o ON o.id = m.omniclass_id "
+                "WHERE o.identifier = ? ORDER BY m.rank", (omniclass.identifier,)).fetchall()
+        return [Manufacturer(title=name, url=url) for name, url in rows]
+
+    def save_product_pages(self, rows: Iterable[tuple[str, str, str]]) -> None:
+        """ Save a batch of `(manufacturer name, url, product page)` rows in a single transaction. """
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO product_pages (manufacturer_name, url, product_page) "
+                             "VALUES (?, ?, ?)", rows)
+
+    def product_page_names(self) -> set[str]:
+        """ Get the names of the manufacturers which have a saved product page. """
+        with self._lock:
+            return {name for name, in self._connection.execute("SELECT manufacturer_name FROM product_pages")}
+
+    def clear_product_pages(self) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM product_pages")
+
+    def export_csv(self, directory: Path) -> None:
+        """ Export every result to the same CSV files which are written when the store is not used.
+
+        Parameters:
+            directory: The data directory. Omniclass tables are written to "omniclass_tables", manufacturers to
+                "manufacturers" and product pages to "manufacturer_product_pages.csv".
+        """
+        with self._lock:
+            omniclasses = [Omniclass(number=number, name=name) for number, name in
+                           self._connection.execute("SELECT number, name FROM omniclasses ORDER BY id")]
+
+        tables_path = directory.joinpath('omniclass_tables')
+        manufacturers_path = directory.joinpath('manufacturers')
+        tables_path.mkdir(parents=True, exist_ok=True)
+        manufacturers_path.mkdir(parents=True, exist_ok=True)
+
+        for omniclass in omniclasses:
+            parameters = self.load_omniclass_table(omniclass)
+            if parameters is not None:
+                with open(tables_path.joinpath(f'{omniclass.number} {omniclass.name}.csv'), 'w') as f:
+                    writer = csv.writer(f)
+                    writer.writerow([parameter.name for parameter in parameters])
+                    for parameter in parameters:
+                        writer.writerow(parameter.values)
+
+            if self.has_manufacturers(omniclass):
+                with open(manufacturers_path.joinpath(f"{omniclass} manufacturers.csv"), 'w') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['company name', 'url'])
+                    for manufacturer in self.load_manufacturers(omniclass):
+                        writer.writerow([manufacturer.title, manufacturer.url])
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT manufacturer_name, url, product_page FROM product_pages ORDER BY rowid").fetchall()
+        if rows:
+            with open(directory.joinpath('manufacturer_product_pages.csv'), 'w') as f:
+                writer = csv.writer(f)
+                writer.writerow(['manufacturer name', 'url', 'product page'])
+                writer.writerows(rows)
+
+    def close(self) -> None:
+        """ Close the underlying connection. It is reopened if the store is used again. """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# results are saved to CSV files unless `RESULT_STORE=sqlite` is set
+RESULT_STORE: Optional[ResultStore] = (ResultStore(Path('data/results.sqlite3'))
+                                       if os.getenv('RESULT_STORE', 'csv').lower() == 'sqlite' else None)
@@ -1,4 +1,10 @@
 from .parameter import Parameter
+from .parameter_list import ParameterList
+from .parameter_batch import ParameterBatch
 from .manufacturer import Manufacturer
 from .omniclass import Omniclass
 from .search_result import SearchResultItem
+from .domain_verdict import DomainVerdict
+from .site_classification import SiteClassification, SiteClassificationList
+from .company_name import CompanyName, CompanyNameList
+from .site_assessment import SiteAssessment, SiteAssessmentList
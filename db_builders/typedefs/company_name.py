@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class CompanyName(BaseModel):
+    """ Company name extracted from a single search result in a batched request. `index` is the 1-based position of
+    the result in the request. """
+    index: int
+    name: str
+
+
+class CompanyNameList(BaseModel):
+    """ Structured output for batched company name extraction. """
+    names: list[CompanyName]
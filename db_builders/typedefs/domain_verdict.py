@@ -0,0 +1,17 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class DomainVerdict(BaseModel):
+    """ Verification results recorded for a single manufacturer domain.
+
+    Each field is `None` until the corresponding stage has been run for the domain.
+    """
+    domain: str
+    is_manufacturer: Optional[bool] = None
+    company_name: Optional[str] = None
+    verified: Optional[bool] = None
+    # confidence of a single-pass `DomainVerifier` assessment
+    confidence: Optional[float] = None
+    updated: float = 0.0
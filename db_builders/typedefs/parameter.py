@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class Parameter(BaseModel):
+    # numeric values (ie: `10` for a "Width" parameter) are stored as strings
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
     name: str
     values: list[str]
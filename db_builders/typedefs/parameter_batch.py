@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+from .parameter import Parameter
+
+
+class ParameterBatch(BaseModel):
+    """ Structured output for values generated for several parameters in a single request. """
+    parameters: list[Parameter]
@@ -0,0 +1,8 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class ParameterList(BaseModel):
+    """ Structured output for the list of parameters generated for an omniclass. """
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    parameters: list[str]
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class SiteAssessment(BaseModel):
+    """ Single-pass verdict for a single search result. `index` is the 1-based position of the result in the request,
+    and `confidence` is the model's confidence in `is_manufacturer`, between 0 and 1. """
+    index: int
+    is_manufacturer: bool
+    company_name: Optional[str] = None
+    confidence: float
+
+
+class SiteAssessmentList(BaseModel):
+    """ Structured output for a batched single-pass site assessment. """
+    results: list[SiteAssessment]
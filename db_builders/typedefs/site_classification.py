@@ -0,0 +1,15 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class SiteClassification(BaseModel):
+    """ Verdict for a single search result in a batched site check. `index` is the 1-based position of the result in
+    the request. """
+    index: int
+    verdict: Literal['manufacturer', 'not manufacturer', 'unsure']
+
+
+class SiteClassificationList(BaseModel):
+    """ Structured output for a batched site check. """
+    results: list[SiteClassification]
@@ -0,0 +1,124 @@
+""" Filter engine used to exclude irrelevant search results by their URL.
+
+Rules are loaded from a plain text file (see "exclude_rules.txt" for the format). Each URL is parsed once and only
+its host is checked:
+
+- `domain` rules are stored in a set, and every suffix of the host is looked up in it.
+- `keyword` rules are compiled into a single regular expression which matches whole host labels or hyphen-separated
+  parts of labels.
+
+Both checks are independent of the number of rules, so filtering stays fast as the rule list grows.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+from urllib.parse import urlparse
+
+DEFAULT_RULES_FILE = Path(__file__).parent.joinpath('exclude_rules.txt')
+
+RULE_TYPES = ('domain', 'keyword')
+
+
+class ExclusionRule(NamedTuple):
+    """ A single exclusion rule. `line` is the line number in the rules file, or 0 if the rule was not loaded from a
+    file. """
+    type: str
+    value: str
+    line: int = 0
+
+    def __str__(self):
+        return f"{self.type} {self.value}"
+
+
+def parse_rules(text: str) -> list[ExclusionRule]:
+    """ Parse exclusion rules.
+
+    Blank lines and lines starting with "#" are ignored.
+
+    Parameters:
+        text: Contents of a rules file.
+
+    Returns:
+        The list of rules.
+
+    Raises:
+        ValueError: If a line is not a valid rule.
+    """
+    rules = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            rule_type, value = line.split()
+        except ValueError:
+            raise ValueError(f"Invalid exclusion rule on line {number}: {line}") from None
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"Invalid exclusion rule type on line {number}: {rule_type}")
+        rules.append(ExclusionRule(rule_type, value.lower().strip('.'), number))
+    return rules
+
+
+class UrlFilter:
+    """ Matches URLs against a set of exclusion rules. """
+    _domains: dict[str, ExclusionRule]
+    _keywords: dict[str, ExclusionRule]
+    _keyword_pattern: Optional[re.Pattern]
+
+    def __init__(self, rules: Iterable[ExclusionRule]):
+        self._domains = {}
+        self._keywords = {}
+        for rule in rules:
+            if rule.type == 'domain':
+                self._domains.setdefault(rule.value, rule)
+            else:
+                self._keywords.setdefault(rule.value, rule)
+
+        if self._keywords:
+            # longest keywords first so that the most specific keyword is reported
+            alternatives = '|'.join(re.escape(keyword) for keyword in sorted(self._keywords, key=len, reverse=True))
+            self._keyword_pattern = re.compile(rf"(?:^|[.-])({alternatives})(?=[.-]|$)")
+        else:
+            self._keyword_pattern = None
+
+    @classmethod
+    def from_file(cls, path: Path) -> 'UrlFilter':
+        """ Load rules from a file. """
+        with open(path, 'r') as f:
+            return cls(parse_rules(f.read()))
+
+    def __len__(self) -> int:
+        return len(self._domains) + len(self._keywords)
+
+    def match(self, url: str) -> Optional[ExclusionRule]:
+        """ Find the rule which excludes a URL.
+
+        Parameters:
+            url: The URL to check.
+
+        Returns:
+            The first matching rule, or `None` if the URL is not excluded.
+        """
+        host = urlparse(url).hostname
+        if not host:
+            return None
+
+        labels = host.split('.')
+        for i in range(len(labels)):
+            rule = self._domains.get('.'.join(labels[i:]))
+            if rule is not None:
+                return rule
+
+        if self._keyword_pattern is not None:
+            found = self._keyword_pattern.search(host)
+            if found:
+                return self._keywords[found.group(1)]
+
+        return None
+
+    def is_excluded(self, url: str) -> bool:
+        return self.match(url) is not None
+
+
+URL_FILTER = UrlFilter.from_file(Path(os.getenv('EXCLUDE_RULES_FILE', DEFAULT_RULES_FILE)))
@@ -1,50 +1,54 @@
-import asyncio
-import functools
+import logging
+from contextlib import nullcontext
+from typing import Callable, Optional, TypeVar
 from urllib.parse import urlparse
 
-from openai import RateLimitError, InternalServerError, APIConnectionError, APITimeoutError, APIResponseValidationError
+from langchain_core.runnables import Runnable
 
+from db_builders.cache import LLM_CACHE
+from db_builders.retry import RetryPolicy, LLM_RETRY_POLICY
 from db_builders.typedefs import SearchResultItem
+from db_builders.url_filter import URL_FILTER
 
+T = TypeVar('T')
 
-# List of keywords to exclude from search results
-EXCLUDE_LIST = ['amazon', 'china', 'india', 'co.uk', '.cn', '.in', 'ebay', 'lowes', 'homedepot', 'walmart',
-                'target.com', '.gov', 'acehardware', 'business', 'news', 'alibaba', 'aliexpress', 'wikipedia',
-                'youtube', 'facebook', 'twitter', 'instagram', 'pinterest', 'linkedin', 'yelp', 'bbb', 'glassdoor',
-                'biz', 'bloomberg', 'forbes.com', 'fortune.com', '.inc.com', 'investopedia', 'money', 'nasdaq', 'nyse',
-                'reuters', 'seekingalpha', 'stocktwits', 'thestreet', 'wsj', 'yahoo', 'yahoofinance', 'zacks.com',
-                'barrons.com', 'bloomberg', 'cnbc', 'cnn', 'foxbusiness', 'marketwatch', 'msn', 'newsmax', 'npr.com',
-                'samsclub', 'costco', 'overstock', 'sears', 'kmart', 'wayfair', 'etsy', 'chegg.com', 'coursehero.com',
-                'quizlet.com', 'sparknotes.com', 'wikipedia.org', 'britannica.com', 'dictionary.com', 'thesaurus.com',
-                'merriam-webster.com', 'grammarly.com', 'grammarbook.com', 'grammar-monster.com', 'grammarly.com',
-                'petsmart.com', 'petco.com', 'petfoodexpress.com', 'petland.com', 'petvalu.com', 'petlandia.com',
-                'petlandstores.com', 'petland.ca', 'petlanddiscounts.com', 'petland.com.au', 'petlandflorida.com'
-                'medium.com', 'quora.com', 'reddit.com', 'stackexchange.com', 'stackoverflow.com', 'github.com',
-                'substack.com', 'dev.to', 'hackernoon.com', 'towardsdatascience.com', 'analyticsvidhya.com',
-                'kaggle.com', 'towardsdatascience.com', 'towardsdatascience.com', 'towardsdatascience.com',
-                ]
-
-
-def retry_on_ratelimit():
-    """ Decorator which retries an asynchronous OpenAI call if a RateLimitError or any other openai error is raised. """
-    def decorator(func):
-        @functools.wraps(func)
-        async def wrapped(*args, **kwargs):
-            while True:
-                try:
-                    result = await func(*args, **kwargs)
-                except RateLimitError:
-                    await asyncio.sleep(10)
-                except (InternalServerError, APIConnectionError, APITimeoutError, APIResponseValidationError) as e:
-                    print(e)
-                    pass
-                except Exception as e:
-                    raise e from None
-                else:
-                    break
-            return result
-        return wrapped
-    return decorator
+logger = logging.getLogger(__name__)
+
+
+def retry_on_ratelimit(policy: Optional[RetryPolicy] = None) -> RetryPolicy:
+    """ Decorator which retries an asynchronous OpenAI call if a RateLimitError or any other transient openai error is
+    raised.
+
+    Parameters:
+        policy: The retry policy to use. Defaults to `LLM_RETRY_POLICY`.
+    """
+    return policy or LLM_RETRY_POLICY
+
+
+async def invoke_parsed(chain: Runnable, inputs: dict, parse: Callable[[str], T], attempts: int = 2) -> T:
+    """ Invoke a chain and parse its response, requesting a new response if it can not be parsed.
+
+    Responses are cached by `LLM_CACHE`, so an unparseable response would otherwise be returned again on every
+    retry and every resumed run. Only the first attempt may be served from the cache, and the new response replaces
+    the cached one.
+
+    Parameters:
+        chain: Chain which returns a string
+        inputs: Inputs for the chain
+        parse: Parses the response, raising `ValueError` (or `ValidationError`) if it can not be parsed
+        attempts: Number of responses to request before giving up
+
+    Raises:
+        ValueError: The error raised by `parse` for the last response.
+    """
+    for attempt in range(attempts):
+        with LLM_CACHE.refresh() if attempt else nullcontext():
+            response = await chain.ainvoke(inputs)
+        try:
+            return parse(response)
+        except ValueError:
+            if attempt == attempts - 1:
+                raise
 
 
 def print_bar(text: str):
@@ -81,10 +85,51 @@ def strip_url(url: str) -> str:
             .geturl())
 
 
+def normalize_domain(url: str) -> str:
+    """ Normalize the domain of a URL so that variations of the same site compare equal.
+
+    The scheme, port, path and a leading "www." are removed and the host is lowercased.
+
+    Examples:
+        >>> normalize_domain('https://WWW.Example.com:443/products?page=2')
+        'example.com'
+        >>> normalize_domain('http://shop.example.com')
+        'shop.example.com'
+    """
+    host = urlparse(url).hostname or ''
+    return host.removeprefix('www.')
+
+
+def format_numbered_results(results: list[SearchResultItem]) -> str:
+    """ Format search results as a numbered list for batched LLM requests. Results are numbered from 1.
+
+    Examples:
+        >>> print(format_numbered_results([SearchResultItem(title='Acme', link='https://acme.com', snippet='Widgets')]))
+        1. Title: Acme
+        URL: https://acme.com
+        Description: Widgets
+    """
+    return "\n\n".join(f"{i}. Title: {result.title}\nURL: {result.link}\nDescription: {result.snippet}"
+                       for i, result in enumerate(results, start=1))
+
+
+def is_excluded(result: SearchResultItem) -> bool:
+    """ Check if a single search result should be excluded based on the rules in `URL_FILTER`.
+
+    The rule which excludes a result is logged at debug level, to help tune the rules file.
+    """
+    rule = URL_FILTER.match(result.link)
+    if rule is None:
+        return False
+    logger.debug("Excluded %s by rule '%s' (line %d)", result.link, rule, rule.line)
+    return True
+
+
 def filter_results(results: list[SearchResultItem]) -> list[SearchResultItem]:
     """ Filter out irrelevant search results from a list of search results.
 
-    This uses a list of keywords to exclude irrelevant search results.
+    This uses the exclusion rules in `URL_FILTER` to exclude irrelevant search results. The rule which excludes each
+    result is logged at debug level (see `is_excluded`).
 
     Parameters:
         results: List of search results to filter
@@ -92,4 +137,4 @@ def filter_results(results: list[SearchResultItem]) -> list[SearchResultItem]:
     Returns:
         List of valid `SearchResultItem` objects
     """
-    return [result for result in results if not any(word in result.link for word in EXCLUDE_LIST)]
+    return [result for result in results if not is_excluded(result)]
@@ -1,13 +1,15 @@
 #!/usr/bin/python3
+import argparse
 import os
 from asyncio import run
 from pathlib import Path
 
 from db_builders.name_finder.parsing import parse_name_file
 from db_builders.name_finder.runtime import MANUFACTURER_NAME_FILE, product_page_search_runtime
-from db_builders.omniclass.runtime import generate_omniclass_tables, OMNICLASS_SAVE_PATH
-from db_builders.loading import parse_remaining
+from db_builders.omniclass.runtime import generate_omniclass_tables, OMNICLASS_SAVE_PATH, OMNICLASS_COMPLETED_PATH
+from db_builders.loading import parse_remaining, get_remaining
 from db_builders.search.runtime import manufacturer_search_runtime, MANUFACTURER_SAVE_PATH
+from db_builders.storage import RESULT_STORE
 from db_builders.utils import print_bar
 
 DATA_DIR = Path('data')
@@ -46,10 +48,32 @@ def get_mode() -> str:
             print(f"\n{RED}Invalid mode. Please try again.{RESET}\n")
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build omniclass, manufacturer and product page databases.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--resume', dest='resume', action='store_true', default=True,
+                       help="skip work which was finished by a previous run (default)")
+    group.add_argument('--force', dest='resume', action='store_false',
+                       help="discard the output of previous runs and start over")
+    parser.add_argument('--export-csv', action='store_true',
+                        help="export the results saved in the SQLite result store to CSV files and exit")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
+    ARGS = parse_args()
+
     # create data directory
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+    if ARGS.export_csv:
+        if RESULT_STORE is None:
+            print(f"{RED}The SQLite result store is not enabled. Set RESULT_STORE=sqlite to use it.{RESET}")
+            exit(1)
+        RESULT_STORE.export_csv(DATA_DIR)
+        print(f"Results have been exported to: {LIGHT_BLUE}{DATA_DIR}{RESET}")
+        exit(0)
+
     # clear terminal window
     print(CLEAR)
 
@@ -83,12 +107,23 @@ if __name__ == '__main__':
             exit(1)
         print(CLEAR)
 
+        # skip omniclasses which were completed by a previous run
+        if ARGS.resume:
+            remaining = get_remaining(REMAINING_FN, OMNICLASS_COMPLETED_PATH)
+        else:
+            OMNICLASS_COMPLETED_PATH.unlink(missing_ok=True)
+            remaining = OMNICLASS_LIST
+
         print_bar("== Generating Omniclass Tables ==")
         print(f"Omniclass tables will be saved to: {LIGHT_BLUE}{OMNICLASS_SAVE_PATH}{RESET}")
+        if len(remaining) < len(OMNICLASS_LIST):
+            print(f"Skipping {LIGHT_BLUE}{len(OMNICLASS_LIST) - len(remaining)} omniclasses{RESET} "
+                  f"which have already been generated.")
         print("This process may take a while...")
-        print(f"{RED}Press Ctrl+C to cancel at any time.{RESET}\n")
+        print(f"{RED}Press Ctrl+C to cancel at any time. Progress is saved and resumed on the next run.{RESET}\n")
 
-        run(generate_omniclass_tables(OMNICLASS_LIST))
+        # the parents of the remaining omniclasses are found among all of them, so resumed runs share the same lists
+        run(generate_omniclass_tables(remaining, resume=ARGS.resume, hierarchy_source=OMNICLASS_LIST))
 
     # search for manufacturers
     elif current_mode == '2':
@@ -100,9 +135,9 @@ if __name__ == '__main__':
         print_bar("== Searching for Manufacturers ==")
         print(f"Manufacturer data will be saved to: {LIGHT_BLUE}{MANUFACTURER_SAVE_PATH}{RESET}")
         print("This process may take a while...")
-        print(f"{RED}Press Ctrl+C to cancel at any time.{RESET}\n")
+        print(f"{RED}Press Ctrl+C to cancel at any time. Progress is saved and resumed on the next run.{RESET}\n")
 
-        run(manufacturer_search_runtime(OMNICLASS_LIST))
+        run(manufacturer_search_runtime(OMNICLASS_LIST, resume=ARGS.resume))
 
     elif current_mode == '3':
         if MANUFACTURER_NAMES is None:
@@ -113,6 +148,6 @@ if __name__ == '__main__':
         print_bar("== Getting Product Pages ==")
         print(f"Manufacturer data will be loaded from: {LIGHT_BLUE}{MANUFACTURER_NAME_FILE}{RESET}")
         print("This process may take a while...")
-        print(f"{RED}Press Ctrl+C to cancel at any time.{RESET}\n")
+        print(f"{RED}Press Ctrl+C to cancel at any time. Progress is saved and resumed on the next run.{RESET}\n")
 
-        run(product_page_search_runtime(MANUFACTURER_NAMES))
+        run(product_page_search_runtime(MANUFACTURER_NAMES, resume=ARGS.resume))
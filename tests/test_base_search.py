@@ -0,0 +1,45 @@
+import asyncio
+import os
+import unittest
+
+os.environ.setdefault('GOOGLE_SEARCH_API_KEY', 'test')
+os.environ.setdefault('GOOGLE_SEARCH_ENGINE_ID', 'test')
+
+from db_builders.base_search import BaseSearchHandler
+from db_builders.typedefs import SearchResultItem
+
+
+class FakeSearchHandler(BaseSearchHandler):
+    """ Serves `available` results without touching the network. """
+    def __init__(self, available: int):
+        self.available = available
+        self.requested = []
+
+    async def _fetch_page(self, query, start, num=None):
+        self.requested.append(start)
+        # finish pages out of order
+        await asyncio.sleep(0.01 * (10 - start // 10))
+        last = min(start + (num or 10), self.available + 1)
+        return [SearchResultItem(title=str(i), link=f"https://{i}.com", snippet='') for i in range(start, last)]
+
+
+class PerformSearchTests(unittest.TestCase):
+    def test_results_in_rank_order(self):
+        handler = FakeSearchHandler(available=100)
+        results = asyncio.run(handler.perform_search('query', 100))
+
+        self.assertEqual([r.title for r in results], [str(i) for i in range(1, 101)])
+
+    def test_stops_after_empty_page(self):
+        handler = FakeSearchHandler(available=25)
+        results = asyncio.run(handler.perform_search('query', 100))
+
+        self.assertEqual(len(results), 25)
+        # only the first window of pages should have been requested
+        self.assertLessEqual(len(handler.requested), BaseSearchHandler.MAX_CONCURRENT_PAGES)
+
+    def test_small_num_results(self):
+        handler = FakeSearchHandler(available=100)
+        results = asyncio.run(handler.perform_search('query', 5))
+
+        self.assertEqual(len(results), 5)
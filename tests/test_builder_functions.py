@@ -0,0 +1,262 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from langchain_core.messages import AIMessage
+
+from db_builders.cache import ParameterValueIndex
+from db_builders.omniclass import builder_functions
+from db_builders.omniclass.builder_functions import GenerationError, generate_all_values, generate_value_batch
+from db_builders.typedefs import Parameter
+
+AI_MESSAGE = AIMessage(content='{"parameters": ["Width", "Height", "Material"]}')
+
+
+def values(name: str, count: int = 20) -> list[str]:
+    return [f"{name} {i}" for i in range(count)]
+
+
+class FakeBatchChain:
+    """ Replaces `_generate_value_batch`, returning the queued responses in order. """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def __call__(self, product_name, parameters, ai_message):
+        self.requests.append(list(parameters))
+        return self.responses.pop(0)
+
+
+class FakeTopUp:
+    """ Replaces `_top_up_values`, returning the missing values along with a duplicate. """
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, product_name, parameter, ai_message, existing, count):
+        self.requests.append((parameter, len(existing), count))
+        return [existing[0]] + values(parameter)[len(existing):]
+
+
+class FakeBatchTopUp:
+    """ Replaces `_top_up_value_batch`, returning the missing values of every parameter. """
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, product_name, existing, count, ai_message):
+        self.requests.append((sorted(existing), count))
+        return {name: values(name)[len(seed):] for name, seed in existing.items()}
+
+
+class GenerateValueBatchTests(unittest.TestCase):
+    def run_batch(self, fake, names, **kwargs):
+        with mock.patch.object(builder_functions, '_generate_value_batch', fake):
+            return asyncio.run(generate_value_batch('Doors', AI_MESSAGE, names, **kwargs))
+
+    def test_single_request(self):
+        fake = FakeBatchChain({'Width': values('Width'), 'height': values('Height')})
+        parameters = self.run_batch(fake, ['Width', 'Height'])
+
+        self.assertEqual([parameter.name for parameter in parameters], ['Width', 'Height'])
+        self.assertEqual(parameters[1].values, values('Height'))
+        self.assertEqual(fake.requests, [['Width', 'Height']])
+
+    def test_short_parameters_are_topped_up(self):
+        fake = FakeBatchChain({'Width': values('Width'), 'Height': values('Height', 5)})
+        top_up = FakeTopUp()
+        generated = []
+        with mock.patch.object(builder_functions, '_top_up_values', top_up):
+            parameters = self.run_batch(fake, ['Width', 'Height', 'Width'], on_generated=generated.append)
+
+        self.assertEqual(top_up.requests, [('Height', 5, 15)])
+        self.assertEqual(parameters[1].values, values('Height'))
+        self.assertEqual([parameter.name for parameter in parameters], ['Width', 'Height', 'Width'])
+        self.assertEqual([parameter.name for parameter in generated], ['Width', 'Height'])
+
+    def test_missing_parameters_are_generated_separately(self):
+        fake = FakeBatchChain({'Width': values('Width')})
+
+        async def generate(product_name, parameter, ai_message):
+            return values(parameter)
+
+        with mock.patch.object(builder_functions, '_generate_values', generate):
+            parameters = self.run_batch(fake, ['Width', 'Height'])
+        self.assertEqual(parameters[1].values, values('Height'))
+
+    def test_gives_up(self):
+        fake = FakeBatchChain({})
+
+        async def generate(product_name, parameter, ai_message):
+            return []
+
+        with mock.patch.object(builder_functions, '_generate_values', generate):
+            with self.assertRaises(GenerationError):
+                self.run_batch(fake, ['Width'])
+
+    def test_generate_all_values_in_batches(self):
+        fake = FakeBatchChain({'Width': values('Width'), 'Height': values('Height')},
+                              {'Material': values('Material')})
+        with mock.patch.object(builder_functions, '_generate_value_batch', fake):
+            parameters = asyncio.run(generate_all_values('Doors', ['Width', 'Height', 'Material'], AI_MESSAGE,
+                                                         batch_size=2))
+
+        self.assertEqual([parameter.name for parameter in parameters], ['Width', 'Height', 'Material'])
+        self.assertEqual(len(fake.requests), 2)
+
+
+
+class TopUpTests(unittest.TestCase):
+    def test_merge(self):
+        self.assertEqual(builder_functions._merge(['Oak'], [' oak ', 'Pine', '', 10, 'Ash'], 3), ['Oak', 'Pine', '10'])
+
+    def test_generate_values_tops_up(self):
+        async def generate(product_name, parameter, ai_message):
+            return values(parameter, 12) + values(parameter, 3)
+
+        top_up = FakeTopUp()
+        with mock.patch.object(builder_functions, '_generate_values', generate), \
+                mock.patch.object(builder_functions, '_top_up_values', top_up):
+            parameter = asyncio.run(builder_functions.generate_values('Doors', AI_MESSAGE, 'Width'))
+
+        self.assertEqual(parameter.values, values('Width'))
+        self.assertEqual(top_up.requests, [('Width', 12, 8)])
+
+    def test_accept_short_lists(self):
+        async def generate(product_name, parameter, ai_message):
+            return values(parameter, 15)
+
+        async def top_up(product_name, parameter, ai_message, existing, count):
+            return existing
+
+        with mock.patch.object(builder_functions, '_generate_values', generate), \
+                mock.patch.object(builder_functions, '_top_up_values', top_up):
+            with self.assertRaises(GenerationError):
+                asyncio.run(builder_functions.generate_values('Doors', AI_MESSAGE, 'Width'))
+            with mock.patch.object(builder_functions, 'MIN_ACCEPTED_VALUES', 15):
+                parameter = asyncio.run(builder_functions.generate_values('Doors', AI_MESSAGE, 'Width'))
+        self.assertEqual(len(parameter.values), 15)
+
+    def test_generate_parameters_tops_up(self):
+        async def generate(product_name):
+            return AIMessage(content=''), values('Parameter', 18)
+
+        async def top_up(product_name, parameters, count):
+            return values('Parameter')[18:]
+
+        with mock.patch.object(builder_functions, '_generate_parameters', generate), \
+                mock.patch.object(builder_functions, '_top_up_parameters', top_up):
+            ai_message, parameters = asyncio.run(builder_functions.generate_parameters('Doors'))
+
+        self.assertEqual(parameters, values('Parameter'))
+        self.assertIn('Parameter 19', ai_message.content)
+
+    def test_generate_parameters_from_seed(self):
+        async def generate(product_name):
+            raise AssertionError('a seeded list is only topped up')
+
+        top_ups = []
+
+        async def top_up(product_name, parameters, count):
+            top_ups.append(count)
+            return values('Parameter')[len(parameters):]
+
+        with mock.patch.object(builder_functions, '_generate_parameters', generate), \
+                mock.patch.object(builder_functions, '_top_up_parameters', top_up):
+            ai_message, parameters = asyncio.run(
+                builder_functions.generate_parameters('Doors', seed=values('Parameter', 15)))
+            self.assertEqual(parameters, values('Parameter'))
+            self.assertEqual(top_ups, [5])
+
+            # a complete seed does not make any requests
+            ai_message, parameters = asyncio.run(builder_functions.generate_parameters('Doors', seed=parameters))
+            self.assertEqual(top_ups, [5])
+            self.assertIn('Parameter 19', ai_message.content)
+
+    def test_generate_parameters_accepts_seed_without_top_up(self):
+        async def top_up(product_name, parameters, count):
+            raise SyntaxError('invalid response')
+
+        with mock.patch.object(builder_functions, '_top_up_parameters', top_up), \
+                mock.patch.object(builder_functions, 'MIN_ACCEPTED_PARAMETERS', 15):
+            ai_message, parameters = asyncio.run(
+                builder_functions.generate_parameters('Doors', seed=values('Parameter', 15)))
+
+        self.assertEqual(parameters, values('Parameter', 15))
+        self.assertIn('Parameter 14', ai_message.content)
+
+
+class ValueReuseTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = ParameterValueIndex(Path(tmp.name, 'values.sqlite3'))
+        self.addCleanup(self.index.close)
+        self.index.record('23-11', Parameter(name='Material', values=values('Material')), 'Doors')
+        self.fake = FakeBatchChain({'Width': values('Width')})
+        self.top_up = FakeTopUp()
+        self.batch_top_up = FakeBatchTopUp()
+        for name, value in [('VALUE_INDEX', self.index), ('_generate_value_batch', self.fake),
+                            ('_top_up_values', self.top_up), ('_top_up_value_batch', self.batch_top_up)]:
+            patcher = mock.patch.object(builder_functions, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def generate(self, policy):
+        generated = []
+        with mock.patch.object(builder_functions, 'VALUE_REUSE_POLICY', policy):
+            parameters = asyncio.run(generate_all_values('Windows', ['Width', 'Materials'], AI_MESSAGE,
+                                                         on_generated=generated.append, value_scope='23-11'))
+        self.assertEqual(sorted(parameter.name for parameter in generated), ['Materials', 'Width'])
+        return parameters
+
+    def test_reuse(self):
+        parameters = self.generate('reuse')
+
+        self.assertEqual([parameter.name for parameter in parameters], ['Width', 'Materials'])
+        self.assertEqual(parameters[1].values, values('Material'))
+        # only the new parameter is requested, and its values are recorded
+        self.assertEqual(self.fake.requests, [['Width']])
+        self.assertEqual(self.batch_top_up.requests, [])
+        self.assertEqual(self.index.lookup('23-11', 'width'), values('Width'))
+
+    def test_adapt(self):
+        parameters = self.generate('adapt')
+
+        self.assertEqual(self.batch_top_up.requests, [(['Materials'], 20 - builder_functions.VALUE_SEED_COUNT)])
+        self.assertEqual(self.top_up.requests, [])
+        self.assertEqual(parameters[1].values[:builder_functions.VALUE_SEED_COUNT],
+                         values('Material', builder_functions.VALUE_SEED_COUNT))
+        self.assertEqual(len(parameters[1].values), 20)
+        # adapted values do not replace the recorded values
+        self.assertEqual(self.index.lookup('23-11', 'Material'), values('Material'))
+
+    def test_request_count(self):
+        reused = [f"Reused {i}" for i in range(12)]
+        new = [f"New {i}" for i in range(8)]
+
+        for policy, top_ups in [('reuse', 0), ('adapt', 3)]:
+            # values generated for the first policy would be reused by the second one, so each uses its own scope
+            for name in reused:
+                self.index.record(policy, Parameter(name=name, values=values(name)), 'Doors')
+            self.fake.requests.clear()
+            self.batch_top_up.requests.clear()
+            self.fake.responses = [{name: values(name) for name in new[:5]}, {name: values(name) for name in new[5:]}]
+            with mock.patch.object(builder_functions, 'VALUE_REUSE_POLICY', policy):
+                parameters = asyncio.run(generate_all_values('Windows', reused + new, AI_MESSAGE, batch_size=5,
+                                                             value_scope=policy))
+
+            self.assertEqual([len(parameter.values) for parameter in parameters], [20] * 20)
+            # new parameters and adapted parameters are requested in batches of `batch_size`
+            self.assertEqual(len(self.fake.requests), 2)
+            self.assertEqual(len(self.batch_top_up.requests), top_ups)
+            self.assertEqual(self.top_up.requests, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from db_builders.cache import SQLiteCache, SearchCache, DomainIndex, ParameterValueIndex, normalize_parameter
+from db_builders.typedefs import Parameter, SearchResultItem
+
+
+class SQLiteCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_and_set(self):
+        cache = SQLiteCache(self.path)
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+    def test_persists_between_instances(self):
+        cache = SQLiteCache(self.path)
+        cache.set('key', 'value')
+        cache.close()
+
+        self.assertEqual(SQLiteCache(self.path).get('key'), 'value')
+
+    def test_ttl_expiry(self):
+        cache = SQLiteCache(self.path, ttl=0.01)
+        cache.set('key', 'value')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('key'))
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = SQLiteCache(self.path, max_entries=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        self.assertEqual(cache.evict(), 1)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(len(cache), 2)
+        cache.close()
+
+
+class SearchCacheTests(unittest.TestCase):
+    def test_key_normalization(self):
+        self.assertEqual(SearchCache.make_key('Acme  Manufacturers', 1),
+                         SearchCache.make_key(' acme manufacturers ', 1))
+        self.assertNotEqual(SearchCache.make_key('acme', 1), SearchCache.make_key('acme', 11))
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SearchCache(Path(tmp, 'search.sqlite3'))
+            items = [SearchResultItem(title='Acme', link='https://acme.com', snippet='Widgets')]
+            cache.set_page('acme', 1, None, items)
+
+            self.assertEqual(cache.get_page('ACME', 1), items)
+            self.assertIsNone(cache.get_page('acme', 11))
+            cache.close()
+
+
+class DomainIndexTests(unittest.TestCase):
+    def test_record_merges_fields(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = DomainIndex(Path(tmp, 'domains.sqlite3'))
+            index.record('https://acme.com', is_manufacturer=True)
+            index.record('https://acme.com', company_name='Acme')
+
+            verdict = index.lookup('https://acme.com')
+            self.assertTrue(verdict.is_manufacturer)
+            self.assertEqual(verdict.company_name, 'Acme')
+            self.assertIsNone(verdict.verified)
+
+            index.invalidate('https://acme.com')
+            self.assertIsNone(index.lookup('https://acme.com'))
+            index.close()
+
+
+class ParameterValueIndexTests(unittest.TestCase):
+    def test_normalize_parameter(self):
+        self.assertEqual(normalize_parameter('Material'), normalize_parameter(' material type '))
+        self.assertEqual(normalize_parameter('Colours'), 'color')
+        self.assertEqual(normalize_parameter('Width (mm)'), 'width')
+        self.assertEqual(normalize_parameter('Glass Thickness'), 'glass thickness')
+        self.assertNotEqual(normalize_parameter('Height'), normalize_parameter('Width'))
+
+    def test_lookup_by_scope_and_normalized_name(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = ParameterValueIndex(Path(tmp, 'values.sqlite3'))
+            index.record('23-11', Parameter(name='Colour', values=['Red', 'Blue']), 'Doors')
+
+            self.assertEqual(index.lookup('23-11', 'Colors'), ['Red', 'Blue'])
+            self.assertIsNone(index.lookup('23-13', 'Color'))
+
+            # the first recorded values are kept
+            index.record('23-11', Parameter(name='Color', values=['Green']), 'Windows')
+            self.assertEqual(index.lookup('23-11', 'Color'), ['Red', 'Blue'])
+            index.close()
+
+
+class LLMResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        from langchain_core.globals import get_llm_cache, set_llm_cache
+        from db_builders.cache import LLMResponseCache
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.previous = get_llm_cache()
+        self.cache = LLMResponseCache(Path(self.tmp.name, 'llm.sqlite3'))
+        set_llm_cache(self.cache)
+
+    def tearDown(self):
+        from langchain_core.globals import set_llm_cache
+
+        set_llm_cache(self.previous)
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_responses_are_cached(self):
+        from langchain_community.chat_models.fake import FakeListChatModel
+
+        llm = FakeListChatModel(responses=['first', 'second'])
+        self.assertEqual(llm.invoke('prompt').content, 'first')
+        self.assertEqual(llm.invoke('prompt').content, 'first')
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_refresh_skips_cached_response(self):
+        from langchain_community.chat_models.fake import FakeListChatModel
+
+        llm = FakeListChatModel(responses=['first', 'second'])
+        llm.invoke('prompt')
+        with self.cache.refresh():
+            self.assertEqual(llm.invoke('prompt').content, 'second')
+        # the refreshed response replaces the previous one
+        self.assertEqual(llm.invoke('prompt').content, 'second')
+
+    def test_unparseable_response_is_replaced(self):
+        from langchain_community.chat_models.fake import FakeListChatModel
+        from langchain_core.output_parsers import StrOutputParser
+
+        from db_builders.search.site_checker import SiteChecker
+        from db_builders.utils import invoke_parsed
+
+        chain = FakeListChatModel(responses=['unsure', 'manufacturer']) | StrOutputParser()
+        self.assertTrue(asyncio.run(invoke_parsed(chain, 'prompt', SiteChecker.is_manufacturer)))
+        # the unparseable response is no longer cached, so a resumed run does not fail again
+        self.assertTrue(asyncio.run(invoke_parsed(chain, 'prompt', SiteChecker.is_manufacturer)))
+        self.assertEqual(chain.invoke('prompt'), 'manufacturer')
+
+        chain = FakeListChatModel(responses=['unsure']) | StrOutputParser()
+        with self.assertRaises(ValueError):
+            asyncio.run(invoke_parsed(chain, 'other prompt', SiteChecker.is_manufacturer))
+
+    def test_opt_out(self):
+        from langchain_community.chat_models.fake import FakeListChatModel
+
+        llm = FakeListChatModel(responses=['first', 'second'], cache=False)
+        llm.invoke('prompt')
+        self.assertEqual(llm.invoke('prompt').content, 'second')
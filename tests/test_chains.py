@@ -0,0 +1,46 @@
+import unittest
+
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.messages import AIMessage
+from pydantic_core import ValidationError
+
+from db_builders.omniclass.chains import (build_structured_value_chain, extract_list_from_response,
+                                          parse_parameter_list, parse_parameter_values)
+
+
+class ExtractListTests(unittest.TestCase):
+    def test_extract(self):
+        self.assertEqual(extract_list_from_response('"foo", "bar"]'), ['foo', 'bar'])
+        self.assertEqual(extract_list_from_response('["foo", 2]\n```'), ['foo', 2])
+
+    def test_code_is_not_executed(self):
+        with self.assertRaises(SyntaxError):
+            extract_list_from_response('__import__("os").getcwd()]')
+
+    def test_invalid(self):
+        with self.assertRaises(SyntaxError):
+            extract_list_from_response('"foo", bar')
+
+
+class StructuredOutputTests(unittest.TestCase):
+    def test_parse_parameter_list(self):
+        self.assertEqual(parse_parameter_list('{"parameters": ["Width", "Height"]}'), ['Width', 'Height'])
+        with self.assertRaises(ValidationError):
+            parse_parameter_list('1. Width\n2. Height')
+
+    def test_parse_parameter_values(self):
+        self.assertEqual(parse_parameter_values('{"name": "Width", "values": [10, "20 in"]}'), ['10', '20 in'])
+        with self.assertRaises(ValidationError):
+            parse_parameter_values('{"values": "10"}')
+
+    def test_value_chain(self):
+        # the fake must not use the global LLM cache
+        chat = FakeListChatModel(responses=['{"name": "Width", "values": ["10 in"]}'], cache=False)
+        chain = build_structured_value_chain(chat)
+        response = chain.invoke({"omniclass": "Doors", "parameter": "Width",
+                                 "ai_message": [AIMessage(content='{"parameters": ["Width"]}')]})
+        self.assertEqual(parse_parameter_values(response), ['10 in'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from db_builders.search.domain_verifier import DomainVerifier
+from db_builders.typedefs import SearchResultItem
+
+RESULTS = [
+    SearchResultItem(title='Acme Corp | Widgets', link='https://acme.com', snippet='Acme makes widgets'),
+    SearchResultItem(title='Widget Blog', link='https://widgetblog.net', snippet='A blog about widgets'),
+    SearchResultItem(title='Industrial Bolts', link='https://boltco.com', snippet='Bolts'),
+]
+
+
+class DomainVerifierTests(unittest.TestCase):
+    def test_parse(self):
+        response = ('{"results": ['
+                    '{"index": 1, "is_manufacturer": true, "company_name": "Acme Corp.", "confidence": 0.9},'
+                    '{"index": 2, "is_manufacturer": false, "company_name": null, "confidence": 0.7}]}')
+        acme, blog, bolt = DomainVerifier.parse(response, RESULTS)
+
+        self.assertEqual((acme.is_manufacturer, acme.company_name, acme.confidence), (True, 'Acme Corp', 0.9))
+        self.assertEqual((blog.is_manufacturer, blog.confidence), (False, 0.7))
+        self.assertIsNone(bolt)
+
+    def test_parse_missing_name(self):
+        response = ('{"results": ['
+                    '{"index": 1, "is_manufacturer": true, "company_name": "", "confidence": 0.9},'
+                    '{"index": 3, "is_manufacturer": true, "confidence": 0.9},'
+                    '{"index": 2, "is_manufacturer": false, "confidence": 0.9},'
+                    '{"index": 2, "is_manufacturer": true, "confidence": 0.9}]}')
+        acme, blog, bolt = DomainVerifier.parse(response, RESULTS)
+
+        # the name is taken from the title when possible
+        self.assertEqual(acme.company_name, 'Acme Corp')
+        self.assertIsNone(bolt)
+        # results with several assessments are ambiguous
+        self.assertIsNone(blog)
+
+    def test_parse_invalid(self):
+        self.assertEqual(DomainVerifier.parse('manufacturer', RESULTS), [None, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
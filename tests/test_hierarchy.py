@@ -0,0 +1,118 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from langchain_core.messages import AIMessage
+
+from db_builders.omniclass import hierarchy
+from db_builders.omniclass.hierarchy import ParameterHierarchy, node_key
+from db_builders.typedefs import Omniclass
+
+OMNICLASSES = [
+    Omniclass(number='23-11 17 00', name='Barriers'),
+    Omniclass(number='23-11 17 13', name='Crash Barriers'),
+    Omniclass(number='23-11 17 15', name='Fences'),
+    Omniclass(number='23-13 35 11', name='Doors'),
+    Omniclass(number='23-13 35 13', name='Windows'),
+    Omniclass(number='23-15 11 11', name='Tiles'),
+    Omniclass(name='Widgets'),
+]
+
+
+class FakeGenerateParameters:
+    """ Replaces `generate_parameters`, recording each request. """
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, product_name, seed=None):
+        self.requests.append((product_name, seed))
+        await asyncio.sleep(0.001)
+        parameters = list(seed or []) + [f"{product_name} {i}" for i in range(20 - len(seed or []))]
+        return AIMessage(content=''), parameters
+
+
+class ParameterHierarchyTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fake = FakeGenerateParameters()
+        patcher = mock.patch.object(hierarchy, 'generate_parameters', self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build(self, mode='seed'):
+        return ParameterHierarchy(OMNICLASSES, Path(self.tmp.name), mode)
+
+    def test_node_key(self):
+        self.assertEqual(node_key('23-11 17 13'), ('23-11', '17', '13'))
+        self.assertEqual(node_key('23-11 17 00'), ('23-11', '17'))
+        self.assertEqual(node_key('23-11 00 00'), ('23-11',))
+
+    def test_parent(self):
+        tree = self.build()
+        self.assertEqual(tree.parent(OMNICLASSES[0]), ('23-11', '17'))
+        self.assertEqual(tree.parent(OMNICLASSES[1]), ('23-11', '17'))
+        self.assertEqual(tree.parent(OMNICLASSES[3]), ('23-13', '35'))
+        # an only child and an omniclass without a number have no parent
+        self.assertIsNone(tree.parent(OMNICLASSES[5]))
+        self.assertIsNone(tree.parent(OMNICLASSES[6]))
+
+    def test_seed(self):
+        tree = self.build()
+        asyncio.run(tree.generate_parameters(OMNICLASSES[4]))
+
+        label, seed = self.fake.requests[0]
+        self.assertEqual(label, 'a category of products which includes Doors, Windows')
+        self.assertIsNone(seed)
+        self.assertEqual(self.fake.requests[1][0], 'Windows')
+        self.assertEqual(len(self.fake.requests[1][1]), hierarchy.SEED_COUNT)
+
+    def test_reuse(self):
+        tree = self.build('reuse')
+        _, parameters = asyncio.run(tree.generate_parameters(OMNICLASSES[1]))
+
+        self.assertEqual(self.fake.requests[0], ('Barriers', None))
+        self.assertEqual(parameters, [f"Barriers {i}" for i in range(20)])
+
+    def test_parent_is_generated_once(self):
+        async def generate_all():
+            return await asyncio.gather(*[tree.generate_parameters(omniclass) for omniclass in OMNICLASSES])
+
+        tree = self.build()
+        asyncio.run(generate_all())
+        labels = [label for label, seed in self.fake.requests if seed is None]
+        self.assertEqual(sorted(labels), ['Barriers', 'Tiles', 'Widgets',
+                                          'a category of products which includes Doors, Windows'])
+
+        # parent lists are saved, so a new run does not generate them again
+        self.fake.requests.clear()
+        asyncio.run(self.build().generate_parameters(OMNICLASSES[1]))
+        self.assertEqual([label for label, _ in self.fake.requests], ['Crash Barriers'])
+
+    def test_completed_sibling(self):
+        asyncio.run(self.build().generate_parameters(OMNICLASSES[3]))
+
+        # on a resumed run, only Windows remains but the tree still includes its completed sibling
+        self.fake.requests.clear()
+        tree = self.build()
+        self.assertEqual(tree.parent(OMNICLASSES[4]), ('23-13', '35'))
+        asyncio.run(tree.generate_parameters(OMNICLASSES[4]))
+        self.assertEqual([label for label, _ in self.fake.requests], ['Windows'])
+        self.assertEqual(len(self.fake.requests[0][1]), hierarchy.SEED_COUNT)
+
+        # a tree of the remaining omniclasses alone would not find the saved parent
+        self.assertIsNone(ParameterHierarchy([OMNICLASSES[4]], Path(self.tmp.name)).parent(OMNICLASSES[4]))
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            self.build('always')
+
+
+if __name__ == '__main__':
+    unittest.main()
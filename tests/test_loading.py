@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from langchain_core.messages import AIMessage
+
+from db_builders.loading import add_to_completed, get_remaining, _load_completed
+from db_builders.omniclass.checkpoint import OmniclassCheckpoint
+from db_builders.typedefs import Omniclass, Parameter
+
+
+class CompletedTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.remaining = Path(self.tmp.name, 'remaining.csv')
+        self.completed = Path(self.tmp.name, 'completed.csv')
+        self.remaining.write_text("12-34 56,Doors\n12-34 78,Windows\n12-34 90,Roofs\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_missing_completed_file(self):
+        self.assertEqual(_load_completed(self.completed), set())
+        self.assertEqual(len(get_remaining(self.remaining, self.completed)), 3)
+
+    def test_get_remaining(self):
+        add_to_completed(self.completed, "12-34 78 Windows")
+        remaining = get_remaining(self.remaining, self.completed)
+        self.assertEqual([omniclass.name for omniclass in remaining], ['Doors', 'Roofs'])
+
+    def test_partial_row_is_ignored(self):
+        add_to_completed(self.completed, "12-34 56 Doors")
+        with open(self.completed, 'a') as f:
+            f.write('\n')
+        self.assertEqual(_load_completed(self.completed), {"12-34 56 Doors"})
+
+
+class OmniclassCheckpointTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp.name)
+        self.omniclass = Omniclass(number='12-34 56', name='Doors')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume(self):
+        checkpoint = OmniclassCheckpoint(self.directory, self.omniclass)
+        checkpoint.record_parameters(AIMessage(content='1. Width\n2. Height'), ['Width', 'Height'])
+        checkpoint.record_values(Parameter(name='Height', values=['1', '2']))
+
+        resumed = OmniclassCheckpoint(self.directory, self.omniclass).load()
+        self.assertEqual(resumed.ai_message.content, '1. Width\n2. Height')
+        self.assertEqual(resumed.remaining, ['Width'])
+
+        resumed.record_values(Parameter(name='Width', values=['3']))
+        self.assertEqual([parameter.name for parameter in resumed.ordered_values()], ['Width', 'Height'])
+
+    def test_truncated_line_is_ignored(self):
+        checkpoint = OmniclassCheckpoint(self.directory, self.omniclass)
+        checkpoint.record_parameters(AIMessage(content=''), ['Width'])
+        with open(checkpoint.path, 'a') as f:
+            f.write('{"name": "Width", "val')
+
+        resumed = OmniclassCheckpoint(self.directory, self.omniclass).load()
+        self.assertEqual(resumed.remaining, ['Width'])
+
+        resumed.record_values(Parameter(name='Width', values=['1']))
+        self.assertEqual(OmniclassCheckpoint(self.directory, self.omniclass).load().remaining, [])
+
+    def test_remove(self):
+        checkpoint = OmniclassCheckpoint(self.directory, self.omniclass)
+        checkpoint.record_parameters(AIMessage(content=''), [])
+        checkpoint.remove()
+        self.assertIsNone(OmniclassCheckpoint(self.directory, self.omniclass).load().parameters)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+from db_builders.search.name_extractor import NameExtractor
+from db_builders.typedefs import SearchResultItem
+
+
+class FakeNameExtractor(NameExtractor):
+    """ `NameExtractor` with the LLM requests replaced by fakes. """
+
+    def __init__(self, batch_names):
+        self.batch_names = batch_names
+        self.batches = []
+        self.single = []
+
+    async def _extract_batch(self, results):
+        self.batches.append([result.link for result in results])
+        return self.batch_names
+
+    async def __call__(self, title, url, description):
+        self.single.append(url)
+        return 'Single'
+
+
+class NameExtractorTests(unittest.TestCase):
+    def test_clean_text(self):
+        self.assertEqual(NameExtractor.clean_text('The name of the company is "Acme Corp".'), 'Acme Corp')
+        self.assertEqual(NameExtractor.clean_text(''), '')
+        self.assertEqual(NameExtractor.clean_text('  \n'), '')
+
+    def test_guess_name(self):
+        self.assertEqual(NameExtractor.guess_name('Home | Acme Corp', 'https://www.acme.com'), 'Acme Corp')
+        self.assertEqual(NameExtractor.guess_name('Bolt-Co: Fasteners', 'https://bolt-co.co.uk/x'), 'Bolt-Co')
+        self.assertEqual(NameExtractor.guess_name('Widget Works Inc. - Widgets', 'https://widgetworks.com'),
+                         'Widget Works Inc.')
+        self.assertIsNone(NameExtractor.guess_name('Industrial Widgets', 'https://www.acme.com'))
+
+    def test_parse_batch(self):
+        response = '{"names": [{"index": 2, "name": "Bolt Co."}, {"index": 1, "name": ""}]}'
+        self.assertEqual(NameExtractor.parse_batch(response, 3), [None, 'Bolt Co', None])
+        self.assertEqual(NameExtractor.parse_batch('Acme', 1), [None])
+
+    def test_extract_batch(self):
+        results = [
+            SearchResultItem(title='Acme Corp | Widgets', link='https://acme.com', snippet=''),
+            SearchResultItem(title='Widgets', link='https://boltco.com', snippet=''),
+            SearchResultItem(title='Industrial Bolts', link='https://fasteners.net', snippet=''),
+        ]
+        extractor = FakeNameExtractor(['Bolt Co', None])
+        names = asyncio.run(extractor.extract_batch(results))
+
+        self.assertEqual(names, ['Acme Corp', 'Bolt Co', 'Single'])
+        self.assertEqual(extractor.batches, [['https://boltco.com', 'https://fasteners.net']])
+        self.assertEqual(extractor.single, ['https://fasteners.net'])
+
+
+if __name__ == '__main__':
+    unittest.main()
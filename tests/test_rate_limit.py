@@ -0,0 +1,64 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from db_builders.cache import SQLiteCache
+from db_builders.rate_limit import TokenBucket, ApiRateLimiter, QuotaExceededError
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_rate_is_enforced(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+
+        async def acquire_all():
+            await asyncio.gather(*[bucket.acquire() for _ in range(11)])
+
+        start = time.monotonic()
+        asyncio.run(acquire_all())
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_penalize_blocks_waiters(self):
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.penalize(0.05)
+
+        start = time.monotonic()
+        asyncio.run(bucket.acquire())
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+
+class ApiRateLimiterTests(unittest.TestCase):
+    def test_daily_quota(self):
+        limiter = ApiRateLimiter('test', requests_per_day=2)
+
+        async def acquire(count: int):
+            for _ in range(count):
+                await limiter.acquire()
+
+        asyncio.run(acquire(2))
+        with self.assertRaises(QuotaExceededError):
+            asyncio.run(acquire(1))
+
+    def test_daily_quota_persists_across_restarts(self):
+        async def acquire(limiter: ApiRateLimiter, count: int):
+            for _ in range(count):
+                await limiter.acquire()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteCache(Path(tmp, 'quota.sqlite3'))
+            asyncio.run(acquire(ApiRateLimiter('test', requests_per_day=3, quota_store=store), 2))
+
+            # a new process shares the count of the previous one
+            limiter = ApiRateLimiter('test', requests_per_day=3, quota_store=store)
+            asyncio.run(acquire(limiter, 1))
+            with self.assertRaises(QuotaExceededError):
+                asyncio.run(acquire(limiter, 1))
+            # other APIs are counted separately
+            asyncio.run(acquire(ApiRateLimiter('other', requests_per_day=3, quota_store=store), 3))
+            store.close()
+
+    def test_penalize_counts_throttle_events(self):
+        limiter = ApiRateLimiter('test', requests_per_minute=60)
+        limiter.penalize(0)
+        self.assertEqual(limiter.throttle_events, 1)
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault('GOOGLE_SEARCH_API_KEY', 'test')
+os.environ.setdefault('GOOGLE_SEARCH_ENGINE_ID', 'test')
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from db_builders.search import runtime as search_runtime
+from db_builders.typedefs import Manufacturer, Omniclass
+
+
+class RemainingOmniclassesTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(search_runtime, 'MANUFACTURER_SAVE_PATH', Path(self.tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_saved_omniclasses_are_skipped(self):
+        doors = Omniclass(number='12-34 56', name='Doors')
+        windows = Omniclass(number='12-34 78', name='Windows')
+        search_runtime._save_manufacturers(doors, [Manufacturer(title='Acme', url='https://acme.com')])
+
+        self.assertEqual(search_runtime._remaining_omniclasses([doors, windows]), [windows])
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [Path(self.tmp.name, '12-34 56 Doors manufacturers.csv')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+
+from db_builders.retry import RetryPolicy, RetryBudget, RetryBudgetExceeded, RetryableHTTPError, parse_retry_after
+
+
+class Flaky:
+    """ Raises `error` for the first `failures` calls. """
+    def __init__(self, failures: int, error: Exception):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return 'done'
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def test_retries_transient_errors(self):
+        policy = RetryPolicy(base_delay=0.001)
+        func = Flaky(2, RetryableHTTPError(503))
+
+        self.assertEqual(asyncio.run(policy.call(func)), 'done')
+        self.assertEqual(func.calls, 3)
+
+    def test_fatal_errors_are_not_retried(self):
+        policy = RetryPolicy(base_delay=0.001)
+        func = Flaky(1, ValueError('fatal'))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(policy.call(func))
+        self.assertEqual(func.calls, 1)
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+        func = Flaky(5, RetryableHTTPError(500))
+
+        with self.assertRaises(RetryableHTTPError):
+            asyncio.run(policy.call(func))
+        self.assertEqual(func.calls, 3)
+
+    def test_budget_is_shared(self):
+        policy = RetryPolicy(base_delay=0.001, budget=RetryBudget(1))
+
+        asyncio.run(policy.call(Flaky(1, RetryableHTTPError(500))))
+        with self.assertRaises(RetryBudgetExceeded):
+            asyncio.run(policy.call(Flaky(1, RetryableHTTPError(500))))
+
+    def test_rate_limits_penalize_limiter(self):
+        class Limiter:
+            def __init__(self):
+                self.penalties = []
+
+            def penalize(self, seconds=None):
+                self.penalties.append(seconds)
+
+        limiter = Limiter()
+        policy = RetryPolicy(base_delay=0.001, limiter=limiter)
+        asyncio.run(policy.call(Flaky(1, RetryableHTTPError(429, retry_after=0.001))))
+        asyncio.run(policy.call(Flaky(1, RetryableHTTPError(429))))
+        asyncio.run(policy.call(Flaky(1, RetryableHTTPError(503))))
+
+        # without a `Retry-After` header, the limiter's own penalty is used
+        self.assertEqual(limiter.penalties, [0.001, None])
+
+    def test_delay_respects_retry_after(self):
+        policy = RetryPolicy(base_delay=1, max_delay=4)
+
+        self.assertGreaterEqual(policy.delay(1, retry_after=2), 2)
+        for attempt in range(1, 10):
+            self.assertLessEqual(policy.delay(attempt), 4)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after({'Retry-After': '3'}), 3.0)
+        self.assertEqual(parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}), 0.0)
+        self.assertIsNone(parse_retry_after({'Retry-After': 'soon'}))
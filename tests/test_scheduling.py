@@ -0,0 +1,171 @@
+import asyncio
+import time
+import unittest
+
+from db_builders.scheduling import AdaptiveConcurrency, PrioritySemaphore, batched, flatten, run_pool, stream_map
+
+
+class FakeLimiter:
+    throttle_events = 0
+
+
+class RunPoolTests(unittest.TestCase):
+    def test_results_in_order(self):
+        async def double(x):
+            await asyncio.sleep(0.001 * (5 - x))
+            return x * 2
+
+        self.assertEqual(asyncio.run(run_pool(range(5), double, 2)), [0, 2, 4, 6, 8])
+
+    def test_concurrency_is_bounded(self):
+        in_flight = []
+        peak = []
+
+        async def work(_):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.005)
+            in_flight.pop()
+
+        asyncio.run(run_pool(range(10), work, 3))
+        self.assertEqual(max(peak), 3)
+
+    def test_slow_item_does_not_block_others(self):
+        async def work(delay):
+            await asyncio.sleep(delay)
+
+        start = time.monotonic()
+        # with fixed chunks of 2, this would take 0.2 + 4 * 0.02 seconds
+        asyncio.run(run_pool([0.2] + [0.02] * 8, work, 2))
+        self.assertLess(time.monotonic() - start, 0.26)
+
+    def test_errors_propagate(self):
+        async def work(x):
+            if x == 2:
+                raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run_pool(range(5), work, 2))
+
+
+class AdaptiveConcurrencyTests(unittest.TestCase):
+    def test_limit_adapts_to_throttling(self):
+        limiter = FakeLimiter()
+        slots = AdaptiveConcurrency(8, limiters=[limiter])
+
+        async def cycle():
+            async with slots:
+                pass
+
+        limiter.throttle_events += 1
+        asyncio.run(cycle())
+        self.assertEqual(slots.limit, 4)
+
+        asyncio.run(cycle())
+        self.assertEqual(slots.limit, 5)
+
+
+class PrioritySemaphoreTests(unittest.TestCase):
+    def test_lowest_priority_value_served_first(self):
+        semaphore = PrioritySemaphore(1)
+        order = []
+
+        async def wait(priority):
+            async with semaphore.slot(priority):
+                order.append(priority)
+
+        async def main():
+            await semaphore.acquire()
+            tasks = [asyncio.create_task(wait(priority)) for priority in (5, 1, 3, 1)]
+            await asyncio.sleep(0)
+            semaphore.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        self.assertEqual(order, [1, 1, 3, 5])
+
+    def test_cancelled_waiter_does_not_leak_slot(self):
+        semaphore = PrioritySemaphore(1)
+
+        async def main():
+            await semaphore.acquire()
+            waiter = asyncio.create_task(semaphore.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            semaphore.release()
+            await asyncio.wait_for(semaphore.acquire(), 1)
+
+        asyncio.run(main())
+
+    def test_release_before_cancelled_waiter_resumes(self):
+        semaphore = PrioritySemaphore(1)
+
+        async def main():
+            await semaphore.acquire()
+            waiter = asyncio.create_task(semaphore.acquire())
+            await asyncio.sleep(0)
+            # the slot is released before the waiter handles its cancellation
+            waiter.cancel()
+            semaphore.release()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.wait_for(semaphore.acquire(), 1)
+
+        asyncio.run(main())
+
+
+class StreamMapTests(unittest.TestCase):
+    @staticmethod
+    async def numbers(count):
+        for i in range(count):
+            yield i
+
+    def test_none_results_are_dropped(self):
+        async def evens(x):
+            await asyncio.sleep(0.001 * (10 - x))
+            return x if x % 2 == 0 else None
+
+        async def main():
+            return [x async for x in stream_map(self.numbers(10), evens, 3)]
+
+        self.assertEqual(sorted(asyncio.run(main())), [0, 2, 4, 6, 8])
+
+    def test_stages_overlap(self):
+        events = []
+
+        async def first(x):
+            await asyncio.sleep(0.01 * x)
+            events.append(('first', x))
+            return x
+
+        async def second(x):
+            events.append(('second', x))
+            return x
+
+        async def main():
+            return [x async for x in stream_map(stream_map(self.numbers(3), first, 3), second, 3)]
+
+        asyncio.run(main())
+        # the second stage starts before the first stage has finished every item
+        self.assertLess(events.index(('second', 0)), events.index(('first', 2)))
+
+    def test_errors_propagate(self):
+        async def fail(x):
+            raise ValueError('failed')
+
+        async def main():
+            return [x async for x in stream_map(self.numbers(3), fail, 2)]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(main())
+
+    def test_batched_and_flatten(self):
+        async def main():
+            batches = [batch async for batch in batched(self.numbers(7), 3)]
+            items = [x async for x in flatten(batched(self.numbers(7), 3))]
+            return batches, items
+
+        batches, items = asyncio.run(main())
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(items, list(range(7)))
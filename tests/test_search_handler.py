@@ -0,0 +1,159 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault('GOOGLE_SEARCH_API_KEY', 'test')
+os.environ.setdefault('GOOGLE_SEARCH_ENGINE_ID', 'test')
+
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from db_builders.cache import DomainIndex
+from db_builders.search.search_handler import SearchHandler
+from db_builders.typedefs import SearchResultItem, SiteAssessment
+
+RESULTS = [
+    SearchResultItem(title='Acme Widgets', link='https://www.acme.com/widgets', snippet='Acme makes widgets'),
+    SearchResultItem(title='Widgets on Amazon', link='https://www.amazon.com/widgets', snippet='Buy widgets'),
+    SearchResultItem(title='Widget Blog', link='https://widgetblog.net/post', snippet='A blog about widgets'),
+    SearchResultItem(title='Acme Catalog', link='https://www.acme.com/catalog', snippet='Acme widget catalog'),
+    SearchResultItem(title='Bolt Co', link='https://boltco.com', snippet='Bolt Co manufactures widgets'),
+]
+
+
+class FakeSearchHandler(SearchHandler):
+    """ `SearchHandler` with every API call replaced by a fake. """
+    domain_index = None
+
+    def __init__(self):
+        super().__init__(FakeListChatModel(responses=['unused']))
+        self.calls = {'site_checker': [], 'site_checker_batch': [], 'name_extractor': [], 'name_extractor_batch': [],
+                      'site_verifier': [], 'domain_verifier': []}
+        self._site_checker = self._fake('site_checker', lambda title, url, description: 'blog' not in url)
+        # the batched check is unsure about blogs, which are then checked on their own
+        self._site_checker.check_batch = self._fake(
+            'site_checker_batch', lambda results: [None if 'blog' in result.link else True for result in results])
+        self._name_extractor = self._fake('name_extractor', lambda title, url, description: title.split()[0])
+        self._name_extractor.extract_batch = self._fake(
+            'name_extractor_batch', lambda results: [result.title.split()[0] for result in results])
+        self._site_verifier = self._fake('site_verifier', lambda url: url != 'https://boltco.com')
+        # the single-pass verifier is unsure about Bolt Co and can not assess blogs
+        self._domain_verifier = self._fake('domain_verifier', lambda results: [self._assess(i, result)
+                                                                             for i, result in enumerate(results, 1)])
+
+    @staticmethod
+    def _assess(index, result):
+        if 'blog' in result.link:
+            return None
+        return SiteAssessment(index=index, is_manufacturer=True, company_name=result.title.split()[0],
+                              confidence=0.5 if 'boltco' in result.link else 0.95)
+
+    def _fake(self, name, func):
+        async def call(*args):
+            self.calls[name].append(args)
+            await asyncio.sleep(0.001 * len(self.calls[name]))
+            return func(*args)
+        return call
+
+    async def _fetch_page(self, query, start, num=None):
+        return RESULTS if start == 1 else []
+
+
+class SearchHandlerTests(unittest.TestCase):
+    def test_pipeline(self):
+        handler = FakeSearchHandler()
+        manufacturers = asyncio.run(handler('widgets', 20))
+
+        self.assertEqual([(m.title, m.url) for m in manufacturers], [('Acme', 'https://www.acme.com')])
+        checked = [result.link for args in handler.calls['site_checker_batch'] for result in args[0]]
+        # the excluded result is never checked
+        self.assertNotIn('https://www.amazon.com/widgets', checked)
+        # only a single result per domain is checked
+        self.assertEqual(len([url for url in checked if 'acme.com' in url]), 1)
+        # every result is classified with a single request, and only the blog is checked on its own
+        self.assertEqual(len(handler.calls['site_checker_batch']), 1)
+        self.assertEqual([args[1] for args in handler.calls['site_checker']], ['https://widgetblog.net/post'])
+
+        self.assertEqual(len(handler.calls['name_extractor_batch']), 1)
+        self.assertEqual(handler.calls['name_extractor'], [])
+
+    def test_unbatched(self):
+        handler = FakeSearchHandler()
+        handler.SITE_CHECK_BATCH_SIZE = 1
+        handler.NAME_EXTRACTION_BATCH_SIZE = 1
+        manufacturers = asyncio.run(handler('widgets', 20))
+
+        self.assertEqual([(m.title, m.url) for m in manufacturers], [('Acme', 'https://www.acme.com')])
+        self.assertEqual(handler.calls['site_checker_batch'], [])
+        self.assertEqual(len(handler.calls['site_checker']), 3)
+        self.assertEqual(handler.calls['name_extractor_batch'], [])
+        self.assertEqual(len(handler.calls['name_extractor']), 2)
+
+    def test_single_pass(self):
+        handler = FakeSearchHandler()
+        handler.VERIFICATION_MODE = 'single-pass'
+        manufacturers = asyncio.run(handler('widgets', 20))
+
+        self.assertEqual([(m.title, m.url) for m in manufacturers], [('Acme', 'https://www.acme.com')])
+        self.assertEqual(len(handler.calls['domain_verifier']), 1)
+        # only the blog falls back to the staged checks, and only the uncertain manufacturer is double checked
+        self.assertEqual([args[1] for args in handler.calls['site_checker']], ['https://widgetblog.net/post'])
+        self.assertEqual(handler.calls['name_extractor'], [])
+        self.assertEqual(handler.calls['site_verifier'], [('https://boltco.com',)])
+        self.assertEqual(handler.calls['site_checker_batch'], [])
+        self.assertEqual(handler.calls['name_extractor_batch'], [])
+
+    def test_single_pass_domain_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = FakeSearchHandler()
+            handler.VERIFICATION_MODE = 'single-pass'
+            handler.domain_index = DomainIndex(Path(tmp, 'domains.sqlite3'))
+            first = asyncio.run(handler('widgets', 20))
+
+            calls = {name: len(args) for name, args in handler.calls.items()}
+            second = asyncio.run(handler('widgets', 20))
+
+            self.assertEqual(first, second)
+            self.assertEqual({name: len(args) for name, args in handler.calls.items()}, calls)
+            verdict = handler.domain_index.lookup('acme.com')
+            self.assertEqual((verdict.company_name, verdict.verified, verdict.confidence), ('Acme', True, 0.95))
+            handler.domain_index.close()
+
+    def test_keep_richest_snippet(self):
+        handler = FakeSearchHandler()
+        handler.KEEP_DUPLICATE = 'snippet'
+        asyncio.run(handler('widgets', 20))
+
+        checked = [result.link for args in handler.calls['site_checker_batch'] for result in args[0]]
+        self.assertIn('https://www.acme.com/catalog', checked)
+        self.assertNotIn('https://www.acme.com/widgets', checked)
+
+    def test_domain_index_skips_known_domains(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = FakeSearchHandler()
+            handler.domain_index = DomainIndex(Path(tmp, 'domains.sqlite3'))
+            first = asyncio.run(handler('widgets', 20))
+
+            calls = {name: len(args) for name, args in handler.calls.items()}
+            second = asyncio.run(handler('widgets', 20))
+
+            self.assertEqual(first, second)
+            self.assertEqual({name: len(args) for name, args in handler.calls.items()}, calls)
+            self.assertTrue(handler.domain_index.lookup('acme.com').verified)
+            self.assertFalse(handler.domain_index.lookup('boltco.com').verified)
+            handler.domain_index.close()
+
+    def test_domain_index_matches_deduplicated_domains(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = FakeSearchHandler()
+            handler.domain_index = DomainIndex(Path(tmp, 'domains.sqlite3'))
+            # recorded from another scheme and without "www.", which `_deduplicate` treats as the same domain
+            handler._record('http://acme.com/about', is_manufacturer=True, company_name='Acme Corp', verified=True)
+            manufacturers = asyncio.run(handler('widgets', 20))
+
+            self.assertIn(('Acme Corp', 'https://www.acme.com'), [(m.title, m.url) for m in manufacturers])
+            checked = [result.link for args in handler.calls['site_checker_batch'] for result in args[0]]
+            self.assertFalse([url for url in checked if 'acme.com' in url])
+            self.assertNotIn(('https://www.acme.com',), handler.calls['site_verifier'])
+            handler.domain_index.close()
@@ -0,0 +1,31 @@
+import unittest
+
+from db_builders.search.site_checker import SiteChecker
+from db_builders.typedefs import SearchResultItem
+from db_builders.utils import format_numbered_results
+
+
+class ParseBatchTests(unittest.TestCase):
+    def test_verdicts_follow_request_order(self):
+        response = ('{"results": [{"index": 2, "verdict": "not manufacturer"}, '
+                    '{"index": 1, "verdict": "manufacturer"}, {"index": 3, "verdict": "unsure"}]}')
+        self.assertEqual(SiteChecker.parse_batch(response, 3), [True, False, None])
+
+    def test_missing_and_conflicting_verdicts(self):
+        response = ('{"results": [{"index": 1, "verdict": "manufacturer"}, '
+                    '{"index": 1, "verdict": "not manufacturer"}, {"index": 5, "verdict": "manufacturer"}]}')
+        self.assertEqual(SiteChecker.parse_batch(response, 2), [None, None])
+
+    def test_invalid_response(self):
+        self.assertEqual(SiteChecker.parse_batch('manufacturer', 2), [None, None])
+        self.assertEqual(SiteChecker.parse_batch('{"results": [{"index": 1, "verdict": "maybe"}]}', 1), [None])
+
+    def test_format_results(self):
+        results = [SearchResultItem(title='Acme', link='https://acme.com', snippet='Widgets')] * 2
+        formatted = format_numbered_results(results)
+        self.assertTrue(formatted.startswith('1. Title: Acme\nURL: https://acme.com\nDescription: Widgets'))
+        self.assertIn('\n\n2. Title: Acme', formatted)
+
+
+if __name__ == '__main__':
+    unittest.main()
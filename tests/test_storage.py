@@ -0,0 +1,139 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from db_builders.storage import AppendOnlyCsvWriter, ResultStore
+from db_builders.typedefs import Manufacturer, Omniclass, Parameter
+
+HEADER = ['manufacturer name', 'url', 'product page']
+
+
+class AppendOnlyCsvWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name, 'nested', 'product_pages.csv')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_append_and_read(self):
+        with AppendOnlyCsvWriter(self.path, HEADER) as writer:
+            self.assertEqual(list(writer.read_rows()), [])
+            writer.write_rows([['Acme', 'https://acme.com', 'https://acme.com/products']])
+            writer.write_rows([['Bolt Co', 'https://boltco.com', 'https://boltco.com/shop']])
+
+        writer = AppendOnlyCsvWriter(self.path, HEADER)
+        writer.write_rows([['Widget Inc', 'https://widget.com', 'https://widget.com/all']])
+        writer.close()
+
+        self.assertEqual([row[0] for row in writer.read_rows()], ['Acme', 'Bolt Co', 'Widget Inc'])
+        self.assertEqual(self.path.read_text().count('manufacturer name'), 1)
+
+    def test_empty_batch_does_not_create_file(self):
+        AppendOnlyCsvWriter(self.path, HEADER).write_rows([])
+        self.assertFalse(self.path.exists())
+
+    def test_partial_row(self):
+        with AppendOnlyCsvWriter(self.path, HEADER) as writer:
+            writer.write_rows([['Acme', 'https://acme.com', 'https://acme.com/products']])
+        with open(self.path, 'a') as f:
+            f.write('Bolt Co,https://bol')
+
+        with AppendOnlyCsvWriter(self.path, HEADER) as writer:
+            writer.write_rows([['Widget Inc', 'https://widget.com', 'https://widget.com/all']])
+            self.assertEqual([row[0] for row in writer.read_rows()], ['Acme', 'Widget Inc'])
+
+    def test_row_cut_off_in_last_field(self):
+        with AppendOnlyCsvWriter(self.path, HEADER) as writer:
+            writer.write_rows([['Acme', 'https://acme.com', 'https://acme.com/products']])
+        with open(self.path, 'a') as f:
+            f.write('Bolt Co,https://boltco.com,https://boltco.co')
+
+        writer = AppendOnlyCsvWriter(self.path, HEADER)
+        self.assertEqual([row[0] for row in writer.read_rows()], ['Acme'])
+        writer.write_rows([['Bolt Co', 'https://boltco.com', 'https://boltco.com/shop']])
+        writer.close()
+        self.assertEqual(list(writer.read_rows())[1], ['Bolt Co', 'https://boltco.com', 'https://boltco.com/shop'])
+        self.assertNotIn(b'boltco.co\r', self.path.read_bytes())
+
+    def test_compact(self):
+        writer = AppendOnlyCsvWriter(self.path, HEADER)
+        writer.write_rows([['Acme', 'https://acme.com', 'old'], ['Bolt Co', 'https://boltco.com', '']])
+        writer.write_rows([['Acme', 'https://acme.com', 'new']])
+        with open(self.path, 'a') as f:
+            f.write('partial')
+
+        self.assertEqual(writer.compact(), 2)
+        self.assertEqual(list(writer.read_rows()), [['Acme', 'https://acme.com', 'new'],
+                                                    ['Bolt Co', 'https://boltco.com', '']])
+        self.assertTrue(self.path.read_bytes().endswith(b'\r\n'))
+
+    def test_clear(self):
+        writer = AppendOnlyCsvWriter(self.path, HEADER)
+        writer.write_rows([['Acme', 'https://acme.com', '']])
+        writer.clear()
+        self.assertFalse(self.path.exists())
+
+
+
+class ResultStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ResultStore(Path(self.tmp.name, 'results.sqlite3'))
+        self.doors = Omniclass(number='12-34 56', name='Doors')
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_omniclass_table(self):
+        self.assertIsNone(self.store.load_omniclass_table(self.doors))
+        self.store.save_omniclass_table(self.doors, [Parameter(name='Width', values=['1', '2'])])
+        self.store.save_omniclass_table(self.doors, [Parameter(name='Height', values=['3', '4']),
+                                                     Parameter(name='Material', values=['Oak'])])
+        self.assertEqual(self.store.load_omniclass_table(self.doors),
+                         [Parameter(name='Height', values=['3', '4']), Parameter(name='Material', values=['Oak'])])
+
+    def test_failed_save_is_rolled_back(self):
+        self.store.save_omniclass_table(self.doors, [Parameter(name='Width', values=['1'])])
+        with self.assertRaises(sqlite3.IntegrityError):
+            # values may not be NULL
+            self.store.save_omniclass_table(self.doors, [Parameter(name='Height', values=['2']),
+                                                         Parameter.model_construct(name='Depth', values=[None])])
+        self.assertEqual(self.store.load_omniclass_table(self.doors), [Parameter(name='Width', values=['1'])])
+
+    def test_manufacturers(self):
+        self.assertFalse(self.store.has_manufacturers(self.doors))
+        self.store.save_manufacturers(self.doors, [])
+        self.assertTrue(self.store.has_manufacturers(self.doors))
+
+        manufacturers = [Manufacturer(title='Acme', url='https://acme.com'),
+                         Manufacturer(title='Bolt Co', url='https://boltco.com')]
+        self.store.save_manufacturers(self.doors, manufacturers)
+        self.assertEqual(self.store.load_manufacturers(self.doors), manufacturers)
+
+    def test_product_pages(self):
+        self.store.save_product_pages([('Acme', 'https://acme.com', 'https://acme.com/products')])
+        self.assertEqual(self.store.product_page_names(), {'Acme'})
+        self.store.clear_product_pages()
+        self.assertEqual(self.store.product_page_names(), set())
+
+    def test_export_csv(self):
+        self.store.save_omniclass_table(self.doors, [Parameter(name='Width', values=['1', '2'])])
+        self.store.save_manufacturers(self.doors, [Manufacturer(title='Acme', url='https://acme.com')])
+        self.store.save_product_pages([('Acme', 'https://acme.com', 'https://acme.com/products')])
+
+        directory = Path(self.tmp.name, 'export')
+        self.store.export_csv(directory)
+
+        self.assertEqual(directory.joinpath('omniclass_tables', '12-34 56 Doors.csv').read_text().splitlines(),
+                         ['Width', '1,2'])
+        self.assertEqual(directory.joinpath('manufacturers', '12-34 56 Doors manufacturers.csv').read_text()
+                         .splitlines(), ['company name,url', 'Acme,https://acme.com'])
+        self.assertEqual(directory.joinpath('manufacturer_product_pages.csv').read_text().splitlines()[1],
+                         'Acme,https://acme.com,https://acme.com/products')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from db_builders.url_filter import ExclusionRule, UrlFilter, URL_FILTER, parse_rules
+
+RULES = """
+# comment
+domain cn
+domain co.uk
+domain target.com
+keyword news
+keyword amazon
+"""
+
+
+class ParseRulesTests(unittest.TestCase):
+    def test_parse(self):
+        rules = parse_rules(RULES)
+        self.assertEqual(len(rules), 5)
+        self.assertEqual(rules[0], ExclusionRule('domain', 'cn', 3))
+        self.assertEqual(str(rules[-1]), 'keyword amazon')
+
+    def test_invalid_rule(self):
+        with self.assertRaises(ValueError):
+            parse_rules("pattern news")
+        with self.assertRaises(ValueError):
+            parse_rules("domain")
+
+
+class UrlFilterTests(unittest.TestCase):
+    def setUp(self):
+        self.filter = UrlFilter(parse_rules(RULES))
+
+    def test_domain(self):
+        self.assertEqual(self.filter.match('https://www.target.com/p/1').value, 'target.com')
+        self.assertEqual(self.filter.match('https://shop.example.co.uk').value, 'co.uk')
+        self.assertEqual(self.filter.match('http://example.cn/').value, 'cn')
+
+    def test_domain_is_not_a_substring_match(self):
+        self.assertIsNone(self.filter.match('https://mytarget.com'))
+        self.assertIsNone(self.filter.match('https://cnc-machines.com'))
+        self.assertIsNone(self.filter.match('https://example.co.uk.example.com'))
+
+    def test_keyword(self):
+        self.assertEqual(self.filter.match('https://news.example.com').value, 'news')
+        self.assertEqual(self.filter.match('https://www.tech-news.com').value, 'news')
+        self.assertEqual(self.filter.match('https://smile.amazon.de').value, 'amazon')
+
+    def test_keyword_matches_whole_parts_only(self):
+        self.assertIsNone(self.filter.match('https://newsprint-supplies.com'))
+        self.assertIsNone(self.filter.match('https://example.com/news/article'))
+
+    def test_invalid_url(self):
+        self.assertIsNone(self.filter.match('not a url'))
+
+    def test_default_rules(self):
+        self.assertGreater(len(URL_FILTER), 0)
+        self.assertTrue(URL_FILTER.is_excluded('https://www.medium.com/some-post'))
+        self.assertTrue(URL_FILTER.is_excluded('https://www.petlandflorida.com'))
+        self.assertFalse(URL_FILTER.is_excluded('https://www.acme-windows.com'))
+
+    def test_filter_results_logs_rule(self):
+        from db_builders.typedefs import SearchResultItem
+        from db_builders.utils import filter_results
+
+        results = [SearchResultItem(title='Medium', link='https://www.medium.com/some-post', snippet=''),
+                   SearchResultItem(title='Acme', link='https://www.acme-windows.com', snippet='')]
+        with self.assertLogs('db_builders.utils', level='DEBUG') as logs:
+            self.assertEqual(filter_results(results), results[1:])
+        rule = URL_FILTER.match('https://www.medium.com/some-post')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(f"'{rule}' (line {rule.line})", logs.output[0])
+        self.assertIn('medium.com/some-post', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()